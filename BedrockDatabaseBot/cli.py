@@ -0,0 +1,137 @@
+"""Command line entry point, which can be run from any directory.
+
+    python cli.py [--state-dir DIR] [--token-file FILE] [--metrics-port PORT] [--metrics-file FILE]
+                  [--query-port PORT] [--log-level [MODULE=]LEVEL] [--compact] [--memory-db] [--no-archive]
+                  {poll,daemon,rebuild,verify} ...
+
+Modules are imported by the subcommands that use them, so that `poll` gets to its first SOAP request without loading
+PyGithub, natsort or asyncio, and the GitHub client is only created once a cycle needs it.
+"""
+from typing import Sequence
+import argparse
+import os
+import sys
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = _parse_args(argv)
+
+    import main as bot
+    import metrics
+
+    bot.configure(args.state_dir, args.token_file, not args.no_archive)
+    if args.metrics_port is not None or args.metrics_file:
+        metrics.enable()
+    if args.metrics_port is not None:
+        metrics.start_server(args.metrics_port)
+    bot.metrics_path = args.metrics_file
+    bot.is_output_compact = args.compact
+    bot.is_db_in_memory = args.memory_db
+    default_level, levels = args.log_levels
+    if default_level is not None:
+        bot.log_level = default_level
+    bot.log_levels |= levels
+    if args.query_port is not None:
+        bot.setup_timed_rotating_logger()
+        bot.start_query_server(args.query_port)
+
+    if args.command is None:  # the flags of `python main.py` before the subcommands were added
+        args.command = 'daemon' if args.daemon else 'poll'
+        args.cycles, args.interval = 3, 600
+    return _COMMANDS[args.command](bot, args)
+
+
+def _poll(bot, args: argparse.Namespace) -> int:
+    bot.main(args.cycles, args.interval)
+    return 0
+
+
+def _daemon(bot, _: argparse.Namespace) -> int:
+    bot.main_daemon()
+    return 0
+
+
+def _rebuild(bot, args: argparse.Namespace) -> int:
+    import json
+
+    bot.setup_timed_rotating_logger()
+    beta_strings = None
+    if args.betas:
+        with open(args.betas) as f:
+            beta_strings = json.load(f)
+    bot.rebuild(args.output, args.archive, beta_strings, args.workers)
+    return 0
+
+
+def _verify(bot, _: argparse.Namespace) -> int:
+    import logging
+
+    bot.setup_timed_rotating_logger()
+    problems = bot.verify()
+    for problem in problems:
+        logging.error(problem)
+    if not problems:
+        logging.info('Verify: No problems have been found.')
+    return 1 if problems else 0
+
+
+_COMMANDS = {'poll': _poll, 'daemon': _daemon, 'rebuild': _rebuild, 'verify': _verify}
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    from env import ARCHIVE_PATH
+    import logpipeline
+
+    argument_parser = argparse.ArgumentParser(description='Keeps the Minecraft Bedrock version database up to date.')
+    argument_parser.add_argument(
+        '--state-dir', default='.', help='where the local DB, cookie, sync state, caches, archive and logs are kept'
+    )
+    argument_parser.add_argument('--token-file', help='the GitHub token, STATE_DIR/token.txt by default')
+    argument_parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics at localhost:PORT/metrics')
+    argument_parser.add_argument('--metrics-file', help='write Prometheus metrics to this file after every cycle')
+    argument_parser.add_argument('--query-port', type=int, help='serve the query API at localhost:PORT')
+    argument_parser.add_argument('--compact', action='store_true', help='write the shards without indentation')
+    argument_parser.add_argument(
+        '--memory-db', action='store_true',
+        help='keep the local DB in memory, filled from the remote repository at start, instead of in an SQLite file'
+    )
+    argument_parser.add_argument(
+        '--log-level', action='append', metavar='[MODULE=]LEVEL',
+        help='the level of all records or of one module, e.g. INFO or requester=WARNING; can be repeated'
+    )
+    argument_parser.add_argument('--no-archive', action='store_true', help="don't archive the SyncUpdates responses")
+    argument_parser.add_argument('--daemon', action='store_true', help=argparse.SUPPRESS)
+
+    subparsers = argument_parser.add_subparsers(dest='command')
+
+    poll_parser = subparsers.add_parser('poll', help='run one or more cycles and exit, e.g. from cron')
+    poll_parser.add_argument('--cycles', type=int, default=1)
+    poll_parser.add_argument('--interval', type=float, default=600, help='seconds between the cycles')
+
+    subparsers.add_parser('daemon', help='poll on an adaptive schedule until SIGINT or SIGTERM')
+
+    rebuild_parser = subparsers.add_parser(
+        'rebuild', help='write every output file again, from the local DB or the archived responses'
+    )
+    rebuild_parser.add_argument('--output', default='rebuild', help='the directory the files are written to')
+    rebuild_parser.add_argument(
+        '--archive', nargs='?', const='', metavar='ARCHIVE',
+        help='replay the archived SyncUpdates responses, STATE_DIR/responses by default'
+    )
+    rebuild_parser.add_argument('--betas', help='the betas.json to replay with instead of the betas of the local DB')
+    rebuild_parser.add_argument('--workers', type=int, help='the number of processes the archive is parsed with')
+
+    subparsers.add_parser('verify', help='check the remote files against each other and the local DB')
+
+    args = argument_parser.parse_args(argv)
+    try:
+        args.log_levels = logpipeline.parse_levels(args.log_level or [])
+    except ValueError as e:
+        argument_parser.error(str(e))
+    if getattr(args, 'archive', None) == '':
+        args.archive = os.path.join(args.state_dir, ARCHIVE_PATH)
+    return args
+
+
+if __name__ == '__main__':
+    sys.exit(main())
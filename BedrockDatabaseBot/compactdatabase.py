@@ -0,0 +1,131 @@
+from typing import Iterable
+
+from net.structs import UpdateInfo
+from database import Database
+from recordstore import RecordStore
+import dbparser
+import metrics
+
+
+class CompactDatabase:
+    """The Database API over RecordStores, which take a fraction of the memory of lists of update strings.
+
+    The update strings are only built again when the *_strings properties are read, e.g. to serialize them. Like
+    SQLiteDatabase, changes made by update()/merge() can be rolled back until commit() is called, but nothing outlives
+    the process.
+    """
+
+    def __init__(
+            self,
+            release_strings: Iterable[str] = (),
+            beta_strings: Iterable[str] = (),
+            preview_strings: Iterable[str] = ()
+    ):
+        self.release_records = RecordStore(release_strings)
+        self.beta_records = RecordStore(beta_strings)
+        self.preview_records = RecordStore(preview_strings)
+        self._committed_lengths = self._get_lengths()
+        # GUID -> (revision number, file digests), of the updates synced by this process
+        self._update_metadata: dict[str, tuple[int, tuple[str, ...]]] = {}
+        self._uncommitted_update_metadata: dict[str, tuple[int, tuple[str, ...]]] = {}
+
+    @property
+    def release_strings(self) -> list[str]:
+        return self.release_records.to_strings()
+
+    @property
+    def beta_strings(self) -> list[str]:
+        return self.beta_records.to_strings()
+
+    @property
+    def preview_strings(self) -> list[str]:
+        return self.preview_records.to_strings()
+
+    def is_empty(self) -> bool:
+        return not any(self._get_lengths())
+
+    @metrics.timed('database_load')
+    def load(self, release_strings: list[str], beta_strings: list[str], preview_strings: list[str]):
+        """Adds the missing strings of all slots and commits, e.g. to fill the store from the JSON files."""
+        for records, update_strings in zip(self._get_records(), (release_strings, beta_strings, preview_strings)):
+            records.extend(update_strings)
+        self.commit()
+
+    @metrics.timed('database_update')
+    def update(self, new_release_strings: list[str], new_preview_strings: list[str]) -> Database.UpdateResult:
+        """Returns whether the DB was updated."""
+        return Database.make_update_result(self.merge(new_release_strings, new_preview_strings))
+
+    def merge(self, new_release_strings: list[str], new_preview_strings: list[str]) -> Database.MergeResult:
+        """Appends the update strings that are not in the DB yet and returns them."""
+        return Database.MergeResult(
+            self.release_records.extend(new_release_strings),
+            self.preview_records.extend(new_preview_strings)
+        )
+
+    def commit(self):
+        self._committed_lengths = self._get_lengths()
+        self._update_metadata |= self._uncommitted_update_metadata
+        self._uncommitted_update_metadata.clear()
+
+    def rollback(self):
+        # records are only ever appended, so dropping those after the last commit undoes every change
+        for records, length in zip(self._get_records(), self._committed_lengths):
+            records.truncate(length)
+        self._uncommitted_update_metadata.clear()
+
+    def set_update_metadata(self, update_infos: Iterable[UpdateInfo]):
+        """Keeps the revision numbers and file digests of the updates, so that their GUIDs can be resolved in batches.
+
+        Like update(), the change is only kept by commit().
+        """
+        for update_info in update_infos:
+            if update_info.file_digests:
+                self._uncommitted_update_metadata[update_info.update_id] = (
+                    update_info.revision_number, update_info.file_digests
+                )
+
+    def get_update_infos(self, guids: Iterable[str]) -> list[UpdateInfo]:
+        """Returns the UpdateInfo items of the known GUIDs, with the metadata kept by set_update_metadata()."""
+        update_infos = []
+        for guid in guids:
+            update_string = self.get_update_string(guid)
+            if update_string is not None:
+                revision_number, file_digests = self._uncommitted_update_metadata.get(guid) \
+                    or self._update_metadata.get(guid, (1, ()))
+                update_infos.append(UpdateInfo(
+                    guid, update_string.split(' ', 1)[1], revision_number=revision_number, file_digests=file_digests
+                ))
+        return update_infos
+
+    def get_update_string(self, guid: str) -> str | None:
+        for records in self.preview_records, self.beta_records, self.release_records:
+            index = records.find_last(guid)
+            if index is not None:
+                return records[index]
+        return None
+
+    def get_guids(self, package_moniker: str) -> list[str]:
+        return [
+            records.get_guid(index)
+            for records in (self.release_records, self.beta_records, self.preview_records)
+            for index in records.find_all(package_moniker)
+        ]
+
+    @metrics.timed('database_export')
+    def export_versions(self) -> list[dict]:
+        """Returns the same list as dbparser.run() on the three slots."""
+        return dbparser.run_records(*self._get_records())
+
+    def count_versioned_guids(self) -> int:
+        """Returns the number of GUIDs in the list returned by export_versions()."""
+        return dbparser.count_record_guids(*self._get_records())
+
+    def close(self):
+        pass
+
+    def _get_records(self) -> tuple[RecordStore, RecordStore, RecordStore]:
+        return self.release_records, self.beta_records, self.preview_records
+
+    def _get_lengths(self) -> tuple[int, int, int]:
+        return len(self.release_records), len(self.beta_records), len(self.preview_records)
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import os
+import threading
+
+from net.structs import Cookie
+from net import envelope_factories, parsers, soap
+import metrics
+
+
+_REFRESHES = metrics.Counter('bdb_cookie_refreshes_total', 'GetCookie refreshes, by result.', ('result',))
+
+
+class CookieManager:
+    """Keeps the cookie and the config LastChange in memory and refreshes the cookie before it expires.
+
+    A cookie that is about to expire is refreshed in the background while the current one is still used, an expired or
+    missing one is refreshed right away. The cookie is persisted atomically so that a restart can reuse it.
+    """
+
+    def __init__(self, url: str, path: str = 'last_cookie.json', refresh_margin: timedelta = timedelta(minutes=10)):
+        self._url = url
+        self._path = path
+        self._refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        # serializes GetConfig/GetCookie so that concurrent callers don't refresh the same cookie twice
+        self._refresh_lock = threading.RLock()
+        self._cookie: Cookie | None = None
+        self._is_cookie_loaded = False
+        self._config_last_change: str | None = None
+        self._refresh_thread: threading.Thread | None = None
+
+    def get_cookie(self) -> Cookie:
+        with self._lock:
+            if not self._is_cookie_loaded:
+                self._cookie = self._load()
+                self._is_cookie_loaded = True
+            cookie = self._cookie
+
+        if cookie is None or self._get_time_left(cookie) <= timedelta():
+            return self.refresh(cookie)
+
+        if self._get_time_left(cookie) <= self._refresh_margin:
+            self._refresh_in_background(cookie)
+        return cookie
+
+    def set_cookie(self, cookie: Cookie):
+        with self._lock:
+            self._cookie = cookie
+            self._is_cookie_loaded = True
+            self._save(cookie)
+
+    def refresh(self, stale_cookie: Cookie | None) -> Cookie:
+        """Replaces `stale_cookie` using GetCookie, getting the config LastChange first if it's not known yet.
+
+        If another thread has already replaced `stale_cookie` with a valid cookie, that one is returned instead.
+        """
+        with self._refresh_lock:
+            with self._lock:
+                current_cookie = self._cookie
+            if current_cookie is not None and current_cookie != stale_cookie and \
+                    self._get_time_left(current_cookie) > timedelta():
+                return current_cookie
+
+            try:
+                try:
+                    cookie = self._get_new_cookie(self._get_config_last_change())
+                except soap.SOAPError as e:
+                    # the cached LastChange may be outdated
+                    logging.error(str(e) + ' Trying again with a new config.')
+                    self._config_last_change = None
+                    cookie = self._get_new_cookie(self._get_config_last_change())
+            except Exception:
+                _REFRESHES.inc(result='error')
+                raise
+            _REFRESHES.inc(result='ok')
+
+            self.set_cookie(cookie)
+            logging.info(f'A new cookie expiring at {cookie.expiration} has been received.')
+            return cookie
+
+    @staticmethod
+    def _get_time_left(cookie: Cookie) -> timedelta:
+        return _parse_expiration(cookie.expiration) - datetime.now(timezone.utc)
+
+    def _refresh_in_background(self, stale_cookie: Cookie):
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_quietly, args=(stale_cookie,), name='CookieRefresh', daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _refresh_quietly(self, stale_cookie: Cookie):
+        try:
+            self.refresh(stale_cookie)
+        except Exception as e:
+            logging.error('Could not refresh the cookie in the background. ' + str(e))
+
+    def _get_config_last_change(self) -> str:
+        if self._config_last_change is None:
+            get_config_response_envelope = soap.post_envelope(
+                self._url, envelope_factories.render_get_config_envelope(self._url)
+            )
+            self._config_last_change = parsers.parse_get_config_response_envelope(
+                get_config_response_envelope
+            ).last_change
+        return self._config_last_change
+
+    def _get_new_cookie(self, config_last_change: str) -> Cookie:
+        get_cookie_response_envelope = soap.post_envelope(
+            self._url, envelope_factories.render_get_cookie_envelope(self._url, config_last_change)
+        )
+        return parsers.parse_get_cookie_response_envelope(get_cookie_response_envelope)
+
+    def _load(self) -> Cookie | None:
+        try:
+            with open(self._path) as f:
+                cookie_data = json.load(f)
+            return Cookie(cookie_data['encrypted_data'], cookie_data['expiration'])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save(self, cookie: Cookie):
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'encrypted_data': cookie.encrypted_data, 'expiration': cookie.expiration}, f, indent=4)
+        os.replace(temp_path, self._path)
+
+
+def _parse_expiration(expiration: str) -> datetime:
+    """Parses timestamps such as 2023-01-01T12:00:00.1234567Z, treating unparsable ones as already expired."""
+    date_time, _, fraction = expiration.strip().removesuffix('Z').partition('.')
+    try:
+        parsed = datetime.fromisoformat(date_time + ('.' + fraction[:6] if fraction else ''))
+    except ValueError:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
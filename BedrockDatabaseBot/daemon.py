@@ -0,0 +1,92 @@
+from typing import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import asyncio
+import logging
+import random
+import signal
+
+
+@dataclass(slots=True)
+class PollingPolicy:
+    min_interval: float = 120
+    base_interval: float = 600
+    max_interval: float = 3600
+    backoff_factor: float = 1.5
+    # fraction of the interval added or subtracted at random so that several instances don't poll in lockstep
+    jitter: float = 0.1
+    # polls at min_interval after a new build, since more architectures or a hotfix usually follow shortly
+    fast_polls_after_update: int = 6
+    # Mojang usually ships on Tuesdays to Thursdays in the (UTC) afternoon
+    release_window_weekdays: frozenset[int] = field(default_factory=lambda: frozenset({1, 2, 3}))
+    release_window_hours: range = range(14, 21)
+    release_window_interval: float = 300
+
+
+class PollingScheduler:
+    """Adapts the polling interval: fast after new builds and in release windows, exponential backoff otherwise."""
+
+    def __init__(self, policy: PollingPolicy):
+        self._policy = policy
+        self._interval = policy.base_interval
+        self._fast_polls_left = 0
+
+    def get_next_interval(self, did_update: bool, now: datetime | None = None) -> float:
+        now = now or datetime.now(timezone.utc)
+
+        if did_update:
+            self._fast_polls_left = self._policy.fast_polls_after_update
+            self._interval = self._policy.base_interval
+
+        if self._fast_polls_left > 0:
+            self._fast_polls_left -= 1
+            interval = self._policy.min_interval
+        else:
+            interval = self._interval
+            self._interval = min(self._interval * self._policy.backoff_factor, self._policy.max_interval)
+            if self._is_release_window(now):
+                interval = min(interval, self._policy.release_window_interval)
+
+        interval *= random.uniform(1 - self._policy.jitter, 1 + self._policy.jitter)
+        return max(interval, self._policy.min_interval * (1 - self._policy.jitter))
+
+    def _is_release_window(self, now: datetime) -> bool:
+        return now.weekday() in self._policy.release_window_weekdays and now.hour in self._policy.release_window_hours
+
+
+async def run(run_one_cycle: Callable[[], bool], policy: PollingPolicy | None = None):
+    """Runs cycles until SIGINT or SIGTERM in one process, so clients, caches and the cookie stay warm in between.
+
+    `run_one_cycle` returns whether the DB was updated.
+    """
+    scheduler = PollingScheduler(policy or PollingPolicy())
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in signal.SIGINT, signal.SIGTERM:
+        try:
+            loop.add_signal_handler(signal_number, stop_event.set)
+        except NotImplementedError:
+            # the event loops on Windows have no signal handlers, so a plain one wakes the loop up instead
+            signal.signal(signal_number, lambda *_: loop.call_soon_threadsafe(stop_event.set))
+
+    while not stop_event.is_set():
+        try:
+            # a running cycle is always allowed to finish, so a shutdown never leaves a half-written update behind
+            did_update = await asyncio.to_thread(run_one_cycle)
+        except Exception as e:
+            logging.error(str(e))
+            did_update = False
+
+        if stop_event.is_set():
+            break
+
+        interval = scheduler.get_next_interval(did_update)
+        logging.info(f'Sleeping for {interval:.0f} s...')
+        try:
+            await asyncio.wait_for(stop_event.wait(), interval)
+        except asyncio.TimeoutError:
+            logging.info('Sleep ended.\n')
+
+    logging.info('Shutting down.')
+
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass(slots=True)
@@ -7,39 +7,95 @@ class Database:
     beta_strings: list[str]
     preview_strings: list[str]
 
+    # dicts are used as order-preserving sets mirroring the lists above
+    _release_index: dict[str, None] = field(init=False, repr=False)
+    _beta_index: dict[str, None] = field(init=False, repr=False)
+    _preview_index: dict[str, None] = field(init=False, repr=False)
+    _guid_index: dict[str, str] = field(init=False, repr=False)
+    _moniker_index: dict[str, list[str]] = field(init=False, repr=False)
+
     @dataclass(frozen=True, slots=True)
     class UpdateResult:
         did_update: bool
         commit_message: str
+        added_release_strings: list[str]
+        added_preview_strings: list[str]
+
+    @dataclass(frozen=True, slots=True)
+    class MergeResult:
+        added_release_strings: list[str]
+        added_preview_strings: list[str]
+
+    def __post_init__(self):
+        self._guid_index = {}
+        self._moniker_index = {}
+        self._release_index = self._build_slot_index(self.release_strings)
+        self._beta_index = self._build_slot_index(self.beta_strings)
+        self._preview_index = self._build_slot_index(self.preview_strings)
 
     def update(self, new_release_strings: list[str], new_preview_strings: list[str]) -> UpdateResult:
         """Returns whether the DB was updated."""
-        releases_update_result = self._update_slot(self.release_strings, new_release_strings)
-        previews_update_result = self._update_slot(self.preview_strings, new_preview_strings)
+        return self.make_update_result(self.merge(new_release_strings, new_preview_strings))
+
+    def merge(self, new_release_strings: list[str], new_preview_strings: list[str]) -> MergeResult:
+        """Appends the update strings that are not in the DB yet and returns them."""
+        return self.MergeResult(
+            self._merge_slot(self.release_strings, self._release_index, new_release_strings),
+            self._merge_slot(self.preview_strings, self._preview_index, new_preview_strings)
+        )
 
-        did_update = releases_update_result[0] or previews_update_result[0]
-        commit_message = ' | '.join([msg for msg in (releases_update_result[1], previews_update_result[1]) if msg])
+    def get_update_string(self, guid: str) -> str | None:
+        return self._guid_index.get(guid)
 
-        return self.UpdateResult(did_update, commit_message)
+    def get_guids(self, package_moniker: str) -> list[str]:
+        return list(self._moniker_index.get(package_moniker, []))
 
-    def _update_slot(self, slot: list[str], new_update_strings) -> tuple[bool, str]:
-        """Returns whether the slot was updated."""
-        did_update = False
-        commit_message = ''
+    def _build_slot_index(self, slot: list[str]) -> dict[str, None]:
+        slot_index = {}
+        for update_string in slot:
+            if update_string not in slot_index:
+                slot_index[update_string] = None
+                self._add_to_secondary_indexes(update_string)
+        return slot_index
+
+    def _merge_slot(self, slot: list[str], slot_index: dict[str, None], new_update_strings) -> list[str]:
+        added_update_strings = []
         for new_update_string in new_update_strings:
-            if new_update_string in slot:
+            if new_update_string in slot_index:
                 continue
+            slot_index[new_update_string] = None
             slot.append(new_update_string)
-            did_update = True
-            commit_message = self._get_commit_message(new_update_string)
-        return did_update, commit_message
+            self._add_to_secondary_indexes(new_update_string)
+            added_update_strings.append(new_update_string)
+        return added_update_strings
+
+    def _add_to_secondary_indexes(self, update_string: str):
+        guid, package_moniker = update_string.split(' ', 1)
+        self._guid_index[guid] = update_string
+        self._moniker_index.setdefault(package_moniker, []).append(guid)
+
+    @classmethod
+    def make_update_result(cls, merge_result: MergeResult) -> UpdateResult:
+        commit_message = ' | '.join([
+            cls._get_commit_message(added_update_strings[-1])
+            for added_update_strings in (merge_result.added_release_strings, merge_result.added_preview_strings)
+            if added_update_strings
+        ])
+
+        return cls.UpdateResult(
+            bool(merge_result.added_release_strings or merge_result.added_preview_strings),
+            commit_message,
+            merge_result.added_release_strings,
+            merge_result.added_preview_strings
+        )
 
     @staticmethod
     def _get_commit_message(update_string: str) -> str:
-        version_name = update_string.split()[1].removesuffix('__8wekyb3d8bbwe').split('_')[1]
-        if update_string.split()[1].startswith('Microsoft.MinecraftUWP_'):
+        package_moniker = update_string.split()[1]
+        version_name = package_moniker.removesuffix('__8wekyb3d8bbwe').split('_')[1]
+        if package_moniker.startswith('Microsoft.MinecraftUWP_'):
             type_ = 'Release'
-        elif update_string.split()[1].startswith('Microsoft.MinecraftWindowsBeta_'):
+        elif package_moniker.startswith('Microsoft.MinecraftWindowsBeta_'):
             type_ = 'Preview'
         else:  # should never happen
             class InvalidUpdateStringError(ValueError):
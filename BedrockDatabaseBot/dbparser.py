@@ -1,113 +1,203 @@
+from typing import Iterable, Iterator, TYPE_CHECKING
 from dataclasses import dataclass
 from operator import itemgetter
-from copy import deepcopy
+from bisect import bisect_left
 
-from natsort import natsorted
+from natsort import natsorted, natsort_keygen
+
+import metrics
+
+if TYPE_CHECKING:
+    from recordstore import RecordStore
 
 
 AVAILABLE_ARCHITECTURES = ['x64', 'x86', 'arm']
+VERSION_TYPES = ['release', 'beta', 'preview']
+
+_natsort_key = natsort_keygen()
 
 
+@metrics.timed('dbparser_run')
 def run(release_strings: list[str], beta_strings: list[str], preview_strings: list[str]) -> list[dict]:
     release_parsed_lines = _parse_lines(release_strings, 'release')
     beta_parsed_lines = _parse_lines(beta_strings, 'beta')
     preview_parsed_lines = _parse_lines(preview_strings, 'preview')
 
-    version_info_list = _get_version_info_list(release_parsed_lines + beta_parsed_lines + preview_parsed_lines)
+    return build(release_parsed_lines + beta_parsed_lines + preview_parsed_lines)
+
+
+@metrics.timed('dbparser_run')
+def run_records(
+        release_records: 'RecordStore', beta_records: 'RecordStore', preview_records: 'RecordStore'
+) -> list[dict]:
+    """Same as run(), for records that have been parsed once when they were packed into RecordStores."""
+    grouped_guids = {}
+    for name, version_type, architecture, guid in _iter_record_versions(release_records, beta_records, preview_records):
+        grouped_guids.setdefault((name, version_type), {}).setdefault(architecture, []).append(guid)
+
+    return natsorted(_get_version_dict_list(grouped_guids), key=itemgetter('name'))
+
+
+def count_record_guids(
+        release_records: 'RecordStore', beta_records: 'RecordStore', preview_records: 'RecordStore'
+) -> int:
+    """Returns the number of GUIDs in the list returned by run_records(), without building it."""
+    return sum(
+        1 for _, _, architecture, _ in _iter_record_versions(release_records, beta_records, preview_records)
+        if architecture in AVAILABLE_ARCHITECTURES
+    )
+
+
+def build(parsed_lines: Iterable['ParsedLine']) -> list[dict]:
+    """Builds the versions list from lines already parsed with parse_line(), ordered by type, then as stored."""
+    grouped_guids = _group_parsed_lines(parsed_lines)
 
-    version_dict_list = _get_version_dict_list(version_info_list)
+    version_dict_list = _get_version_dict_list(grouped_guids)
     version_dict_list = natsorted(version_dict_list, key=itemgetter(*['name']))
 
     return version_dict_list
 
 
+@metrics.timed('dbparser_update')
+def update(version_dict_list: list[dict], new_release_strings: list[str], new_preview_strings: list[str]) -> list[dict]:
+    """Merges new update strings into a list returned by run(), giving the same result as a full rebuild.
+
+    Returns a new list that shares the unchanged versions, while the given list and its versions are left as they are,
+    e.g. for the query API that still serves them. GUIDs already listed under their version and architecture are
+    skipped, so merging the same strings twice is a no-op.
+    """
+    new_parsed_lines = _parse_lines(new_release_strings, 'release') + _parse_lines(new_preview_strings, 'preview')
+
+    version_dict_list = list(version_dict_list)
+    # ids of the versions that belong to the new list only, which can be changed in place
+    new_version_dict_ids = set()
+    for parsed_line in new_parsed_lines:
+        index = bisect_left(
+            version_dict_list, _get_sort_key(parsed_line.name, parsed_line.type), key=_get_version_dict_sort_key
+        )
+        if index == len(version_dict_list) or \
+                (version_dict_list[index]['name'], version_dict_list[index]['type']) != \
+                (parsed_line.name, parsed_line.type):
+            version_dict_list.insert(
+                index,
+                {
+                    'name': parsed_line.name,
+                    'type': parsed_line.type,
+                    'guids': {architecture: [] for architecture in AVAILABLE_ARCHITECTURES}
+                }
+            )
+            new_version_dict_ids.add(id(version_dict_list[index]))
+
+        if parsed_line.architecture not in AVAILABLE_ARCHITECTURES:
+            continue
+        version_dict = version_dict_list[index]
+        if parsed_line.guid in version_dict['guids'][parsed_line.architecture]:
+            continue
+        if id(version_dict) not in new_version_dict_ids:
+            version_dict = version_dict_list[index] = dict(
+                version_dict, guids={architecture: list(guids) for architecture, guids in version_dict['guids'].items()}
+            )
+            new_version_dict_ids.add(id(version_dict))
+        version_dict['guids'][parsed_line.architecture].append(parsed_line.guid)
+
+    return version_dict_list
+
+
+def count_guids(version_dict_list: list[dict]) -> int:
+    return sum(len(guids) for version_dict in version_dict_list for guids in version_dict['guids'].values())
+
+
+def get_shards(version_dict_list: list[dict]) -> dict[str, list[dict]]:
+    """Splits a list returned by run() by type and major.minor line, e.g. into 'release/1.20', keeping the order."""
+    shards = {}
+    for version_dict in version_dict_list:
+        shards.setdefault(get_shard_name(version_dict), []).append(version_dict)
+    return shards
+
+
+def get_shard_name(version_dict: dict) -> str:
+    major_minor = '.'.join(version_dict['name'].split('.')[:2])
+    return f'{version_dict["type"]}/{major_minor}'
+
+
+def get_latest(version_dict_list: list[dict]) -> dict[str, dict]:
+    """Returns the latest version of every type that has at least one GUID."""
+    latest = {}
+    for version_dict in version_dict_list:
+        if any(version_dict['guids'].values()):
+            latest[version_dict['type']] = version_dict
+    return {version_type: latest[version_type] for version_type in VERSION_TYPES if version_type in latest}
+
+
 @dataclass(slots=True)
-class _ParsedLine:
+class ParsedLine:
     name: str
     architecture: str
     type: str
     guid: str
 
 
-@dataclass(slots=True)
-class _VersionInfo:
-    name: str
-    architecture: str
-    type: str
-    guids: list[str]
+def parse_line(line: str, version_type: str) -> ParsedLine | None:
+    """Returns None for lines that are left out of the versions list."""
+    if '.EAppx' in line:
+        return None
+    parsed_line = _parse_line(line, version_type)
+    return None if parsed_line.name.endswith('.70') else parsed_line
 
 
-def _parse_line(line: str, version_type: str) -> _ParsedLine:
+def _parse_line(line: str, version_type: str) -> ParsedLine:
     line = line.removesuffix('__8wekyb3d8bbwe')
 
     guid, rest = line.split(' ')
 
     _, name, architecture = rest.split('_')
 
-    return _ParsedLine(name, architecture, version_type, guid)
+    return ParsedLine(name, architecture, version_type, guid)
 
 
-def _parse_lines(lines: list[str], version_type: str) -> list[_ParsedLine]:
+def _parse_lines(lines: list[str], version_type: str) -> list[ParsedLine]:
     parsed_lines = [_parse_line(line, version_type) for line in lines if '.EAppx' not in line]
     return [parsed_line for parsed_line in parsed_lines if not parsed_line.name.endswith('.70')]
 
 
-def _get_version_info_list(parsed_lines: list[_ParsedLine]) -> list[_VersionInfo]:
-    parsed_lines = deepcopy(parsed_lines)
-
-    version_info_list = []
-
-    while parsed_lines:
-        base_parsed_line = parsed_lines.pop(0)
-        parsed_lines_to_squash = [
-            parsed_line for parsed_line in parsed_lines
-            if (parsed_line.name, parsed_line.architecture, parsed_line.type) ==
-               (base_parsed_line.name, base_parsed_line.architecture, base_parsed_line.type)
-        ]
-
-        version_info_list.append(
-            _VersionInfo(
-                base_parsed_line.name,
-                base_parsed_line.architecture,
-                base_parsed_line.type,
-                [base_parsed_line.guid] + [parsed_line.guid for parsed_line in parsed_lines_to_squash]
-            )
-        )
-
-        for parsed_line_to_squash in parsed_lines_to_squash:
-            parsed_lines.remove(parsed_line_to_squash)
+def _iter_record_versions(*records_by_type: 'RecordStore') -> Iterator[tuple[str, str, str, str]]:
+    """Yields (name, type, architecture, guid) of the records that are part of the versions list."""
+    for version_type, records in zip(VERSION_TYPES, records_by_type):
+        for name, architecture, guid in records.iter_versions():
+            if name is None:  # not packed, so it's parsed like in run()
+                parsed_line = parse_line(guid, version_type)
+                if parsed_line is None:
+                    continue
+                name, architecture, guid = parsed_line.name, parsed_line.architecture, parsed_line.guid
+            elif name.endswith('.70'):
+                continue
+            yield name, version_type, architecture, guid
 
-    return version_info_list
 
+def _get_sort_key(name: str, version_type: str) -> tuple:
+    # run() concatenates releases, betas and previews before a stable natsort,
+    # so entries sharing a name are ordered by type
+    return _natsort_key(name), VERSION_TYPES.index(version_type)
 
-def _get_version_dict_list(version_info_list: list[_VersionInfo]) -> list[dict]:
-    version_info_list = deepcopy(version_info_list)
 
-    version_dict_list = []
+def _get_version_dict_sort_key(version_dict: dict) -> tuple:
+    return _get_sort_key(version_dict['name'], version_dict['type'])
 
-    while version_info_list:
-        base_version_info = version_info_list.pop(0)
-        version_infos_to_squash = [
-            version_info for version_info in version_info_list
-            if (version_info.name, version_info.type) == (base_version_info.name, base_version_info.type)
-        ]
 
-        guids_dict = {}
-        for architecture in AVAILABLE_ARCHITECTURES:
-            guids_dict[architecture] = base_version_info.guids if base_version_info.architecture == architecture else []
-            for version_info_to_squash in version_infos_to_squash:
-                guids_dict[architecture] += version_info_to_squash.guids if version_info_to_squash.architecture ==\
-                                                                            architecture else []
+def _group_parsed_lines(parsed_lines: Iterable[ParsedLine]) -> dict[tuple[str, str], dict[str, list[str]]]:
+    grouped_guids = {}
+    for parsed_line in parsed_lines:
+        guids_dict = grouped_guids.setdefault((parsed_line.name, parsed_line.type), {})
+        guids_dict.setdefault(parsed_line.architecture, []).append(parsed_line.guid)
+    return grouped_guids
 
-        version_dict_list.append(
-            {
-                'name': base_version_info.name,
-                'type': base_version_info.type,
-                'guids': guids_dict
-            }
-        )
 
-        for version_info_to_squash in version_infos_to_squash:
-            version_info_list.remove(version_info_to_squash)
-
-    return version_dict_list
+def _get_version_dict_list(grouped_guids: dict[tuple[str, str], dict[str, list[str]]]) -> list[dict]:
+    return [
+        {
+            'name': name,
+            'type': type_,
+            'guids': {architecture: guids_dict.get(architecture, []) for architecture in AVAILABLE_ARCHITECTURES}
+        }
+        for (name, type_), guids_dict in grouped_guids.items()
+    ]
@@ -3,3 +3,18 @@ BETAS_PATH = 'betas.json'
 PREVIEWS_PATH = 'previews.json'
 
 VERSIONS_PATH = 'versions.json'
+
+# versions.json split by type and major.minor line, e.g. versions/release/1.20.json
+SHARDS_PATH = 'versions'
+LATEST_PATH = 'latest.json'
+MANIFEST_PATH = 'manifest.json'
+
+# local state, relative to the state directory (see cli.py)
+DATABASE_PATH = 'bedrockdb.sqlite3'
+TOKEN_PATH = 'token.txt'
+COOKIE_PATH = 'last_cookie.json'
+SYNC_STATE_PATH = 'sync_state.json'
+READ_CACHE_PATH = 'read_cache.json'
+LOGS_PATH = 'logs'
+# raw SyncUpdates responses, replayed with `cli.py rebuild --archive` when the parsing rules change
+ARCHIVE_PATH = 'responses'
@@ -0,0 +1,99 @@
+from typing import Callable
+from dataclasses import dataclass
+from collections import deque
+import logging
+import threading
+import time
+
+
+class RateLimitDeferred(Exception):
+    """Raised instead of waiting out a GitHub rate limit that would take too long."""
+
+
+@dataclass(slots=True)
+class BudgetPolicy:
+    # GitHub asks integrators to leave at least a second between content-creating requests
+    write_interval: float = 1
+    writes_per_minute: int = 60
+    # optional reads are skipped while fewer requests than this are left, keeping the rest for commits
+    read_reserve: int = 100
+    # delays up to this long are waited out, longer ones are deferred to a later cycle
+    max_wait: float = 60
+    # used when GitHub signals a secondary rate limit without a Retry-After header
+    default_retry_after: float = 60
+
+
+class GitHubBudget:
+    """Spaces out GitHub requests according to the primary and secondary rate limits.
+
+    The primary limit is tracked from the X-RateLimit-* headers, which are shared by every client of the token, so
+    several instances automatically see each other's usage. Secondary limits are only announced by 403/429 responses,
+    after which all requests are held back for Retry-After seconds. Writes are serialized and spaced out.
+    """
+
+    def __init__(self, policy: BudgetPolicy | None = None, sleep: Callable[[float], None] = time.sleep):
+        self._policy = policy or BudgetPolicy()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._remaining: int | None = None
+        self._reset_time = 0.0
+        self._blocked_until = 0.0
+        self._last_write_times: deque[float] = deque()
+
+    @property
+    def remaining(self) -> int | None:
+        return self._remaining
+
+    def update(self, remaining: int, reset_time: float):
+        """Takes X-RateLimit-Remaining and X-RateLimit-Reset (a Unix time) of the last response."""
+        if remaining < 0:  # no response with rate limit headers yet
+            return
+        with self._lock:
+            self._remaining = remaining
+            self._reset_time = reset_time
+
+    def back_off(self, retry_after: float | None):
+        if retry_after is None:
+            retry_after = self._policy.default_retry_after
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.time() + retry_after)
+
+    def can_read_optional(self) -> bool:
+        with self._lock:
+            return self._remaining is None or self._remaining > self._policy.read_reserve
+
+    def acquire_read(self):
+        self._wait(self._get_delay())
+
+    def acquire_write(self):
+        with self._write_lock:
+            self._wait(max(self._get_delay(), self._get_write_delay()))
+            self._last_write_times.append(time.time())
+
+    def _get_delay(self) -> float:
+        with self._lock:
+            now = time.time()
+            delay = self._blocked_until - now
+            if self._remaining == 0:
+                delay = max(delay, self._reset_time - now)
+            return max(delay, 0)
+
+    def _get_write_delay(self) -> float:
+        now = time.time()
+        while self._last_write_times and self._last_write_times[0] <= now - 60:
+            self._last_write_times.popleft()
+        if not self._last_write_times:
+            return 0
+        delay = self._last_write_times[-1] + self._policy.write_interval - now
+        if len(self._last_write_times) >= self._policy.writes_per_minute:
+            delay = max(delay, self._last_write_times[0] + 60 - now)
+        return max(delay, 0)
+
+    def _wait(self, delay: float):
+        if delay <= 0:
+            return
+        if delay > self._policy.max_wait:
+            raise RateLimitDeferred(f'GitHub: The rate limit allows the next request in {delay:.0f} s.')
+        logging.info(f'GitHub: Waiting {delay:.1f} s for the rate limit.')
+        self._sleep(delay)
@@ -0,0 +1,136 @@
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import queue
+
+import metrics
+
+
+DEFAULT_MAX_MESSAGE_LENGTH = 4000
+DEFAULT_QUEUE_SIZE = 10_000
+
+_DROPPED_RECORDS = metrics.Counter('bdb_log_records_dropped_total', 'Log records dropped because the queue was full.')
+
+
+def truncate(message: str, max_length: int) -> str:
+    if len(message) <= max_length:
+        return message
+    return message[:max_length] + f'... ({len(message) - max_length} more characters)'
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one JSON line, with the message cut at `max_message_length` characters."""
+
+    def __init__(self, max_message_length: int = DEFAULT_MAX_MESSAGE_LENGTH):
+        super().__init__()
+        self._max_message_length = max_message_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': truncate(record.getMessage(), self._max_message_length)
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """A logging.Formatter that cuts messages at `max_message_length` characters, e.g. for the console."""
+
+    def __init__(self, fmt: str, max_message_length: int = DEFAULT_MAX_MESSAGE_LENGTH):
+        super().__init__(fmt)
+        self._max_message_length = max_message_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        # a copy, since the other handlers get the same record
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg, record.args = truncate(record.getMessage(), self._max_message_length), None
+        return super().format(record)
+
+
+class ModuleLevelFilter(logging.Filter):
+    """Drops records below the level set for their module (e.g. 'requester') or logger (e.g. 'github'), else below
+    `default_level`.
+
+    The modules log through the root logger, so logger levels alone can't tell them apart.
+    """
+
+    def __init__(self, default_level: int = logging.DEBUG, levels: dict[str, int] | None = None):
+        super().__init__()
+        self._default_level = default_level
+        self._levels = dict(levels or {})
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        level = self._levels.get(record.module)
+        if level is None:
+            name = record.name
+            while level is None and name:
+                level = self._levels.get(name)
+                name = name.rpartition('.')[0]
+        return record.levelno >= (self._default_level if level is None else level)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Hands records over to the listener thread as they are, without formatting them first.
+
+    Messages are formatted from their arguments in the listener thread, so those must not be changed after the call.
+    Records are dropped and counted when the queue is full rather than blocking the caller.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DROPPED_RECORDS.inc()
+
+
+def start(
+        handlers: list[logging.Handler],
+        default_level: int = logging.DEBUG,
+        levels: dict[str, int] | None = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE
+) -> QueueListener:
+    """Routes the records of the root logger through a queue to `handlers`, which run in a listener thread.
+
+    Records are filtered by level before they're queued, so the calling thread never formats messages or waits for I/O.
+    The listener is stopped at exit, after the queued records have been handled.
+    """
+    levels = dict(levels or {})
+    queue_handler = _NonBlockingQueueHandler(queue.Queue(queue_size))
+    queue_handler.addFilter(ModuleLevelFilter(default_level, levels))
+
+    root_logger = logging.getLogger()
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(min([default_level, *levels.values()]))
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def parse_levels(specs: list[str]) -> tuple[int | None, dict[str, int]]:
+    """Parses 'LEVEL' and 'MODULE=LEVEL' specs into the default level, if given, and the levels by module."""
+    default_level = None
+    levels = {}
+    for spec in specs:
+        name, _, level_name = spec.rpartition('=')
+        level = logging.getLevelName(level_name.upper())
+        if not isinstance(level, int):
+            raise ValueError(f'Unknown log level: {level_name}.')
+        if name:
+            levels[name] = level
+        else:
+            default_level = level
+    return default_level, levels
@@ -1,83 +1,410 @@
-from typing import TypedDict
+from typing import TypedDict, TYPE_CHECKING
+import hashlib
 import json
 import os
 import logging
 from logging.handlers import TimedRotatingFileHandler
 import time
 
-from env import RELEASES_PATH, BETAS_PATH, PREVIEWS_PATH, VERSIONS_PATH
+from env import RELEASES_PATH, BETAS_PATH, PREVIEWS_PATH, VERSIONS_PATH, SHARDS_PATH, LATEST_PATH, MANIFEST_PATH, \
+    DATABASE_PATH, TOKEN_PATH, READ_CACHE_PATH, LOGS_PATH
 import requester
 from database import Database
-import dbparser
-from remoterepomanager import RemoteRepositoryManager
+import metrics
+import logpipeline
+from githubbudget import RateLimitDeferred
 
+# PyGithub, natsort (through dbparser), sqlite3 and asyncio are imported where they're first used, so that a cycle
+# starts its first SOAP request without waiting for them
+if TYPE_CHECKING:
+    from remoterepomanager import RemoteRepositoryManager
+    from sqlitedatabase import SQLiteDatabase
+    from compactdatabase import CompactDatabase
+    from queryapi import QueryServer
 
-repo_manager = RemoteRepositoryManager()
 
+# the directory of the state files and the token file, set by configure()
+state_path = '.'
+token_path = TOKEN_PATH
+# created on first use by get_repo_manager() and get_local_db(), unless set beforehand
+repo_manager: 'RemoteRepositoryManager | None' = None
+local_db: 'SQLiteDatabase | CompactDatabase | None' = None
+# set by start_query_server() and given the new versions after every update
+query_server: 'QueryServer | None' = None
+# set by --log-level, the levels apply to modules (e.g. 'requester') or loggers (e.g. 'github')
+log_level = logging.DEBUG
+log_levels: dict[str, int] = {'github.Requester': logging.WARNING}
+
+# set by --metrics-file
+metrics_path: str | None = None
+# set by --compact, applies to the shards, latest.json and the manifest
+is_output_compact = False
+# set by --memory-db, the local DB is then filled from the remote repository by every process
+is_db_in_memory = False
+# versions.json is built from scratch every this many updates, and whenever it has drifted from the local DB
+full_rebuild_interval = 24
+updates_since_full_rebuild = 0
+# the versions last committed, so that versions.json is only downloaded by the first update of a process
+committed_versions: list[dict] | None = None
+
+_CYCLES = metrics.Counter('bdb_cycles_total', 'Cycles run, by result.', ('result',))
+_LAST_SUCCESS = metrics.Gauge('bdb_last_success_timestamp_seconds', 'When the last cycle finished without errors.')
+
+
+def configure(new_state_path: str = '.', new_token_path: str | None = None, is_archiving: bool = True):
+    """Keeps every state file under `new_state_path`, where the token is read from unless `new_token_path` is given."""
+    global state_path, token_path, repo_manager, local_db, committed_versions
+    os.makedirs(new_state_path, exist_ok=True)
+    state_path = new_state_path
+    token_path = new_token_path or os.path.join(new_state_path, TOKEN_PATH)
+    if local_db is not None:
+        local_db.close()
+    repo_manager = None
+    local_db = None
+    committed_versions = None
+    requester.configure(new_state_path, is_archiving)
+
+
+def get_repo_manager() -> 'RemoteRepositoryManager':
+    global repo_manager
+    if repo_manager is None:
+        from remoterepomanager import RemoteRepositoryManager
+        from readcache import ReadCache
+
+        repo_manager = RemoteRepositoryManager(
+            read_cache=ReadCache(os.path.join(state_path, READ_CACHE_PATH)), token_path=token_path
+        )
+    return repo_manager
+
+
+def get_local_db() -> 'SQLiteDatabase | CompactDatabase':
+    global local_db
+    if local_db is None and is_db_in_memory:
+        from compactdatabase import CompactDatabase
+
+        local_db = CompactDatabase()
+    elif local_db is None:
+        from sqlitedatabase import SQLiteDatabase
+
+        local_db = SQLiteDatabase(os.path.join(state_path, DATABASE_PATH))
+    return local_db
+
+
+def start_query_server(port: int, host: str = '127.0.0.1'):
+    """Serves the versions of the local DB over HTTP, see queryapi.QueryServer."""
+    global query_server
+    from queryapi import QueryServer
+
+    query_server = QueryServer(load_database().export_versions()).start(port, host)
+    logging.info(f'Serving {len(query_server.index)} versions at http://{host}:{port}/.')
+
+
+def setup_timed_rotating_logger(log_path: str | None = None, base_filename: str = 'bdb'):
+    if logging.getLogger().handlers:  # already set up, e.g. before starting the query API
+        return
 
-def setup_timed_rotating_logger(log_path: str = 'logs', base_filename: str = 'bdb'):
     def namer(name: str) -> str:
         parent_dir_path, filename = os.path.split(name)
         filename = (filename.replace('.log', '') + '.log').lstrip('.')
         return os.path.join(parent_dir_path, filename)
 
+    log_path = log_path or os.path.join(state_path, LOGS_PATH)
     os.makedirs(log_path, exist_ok=True)
 
     log_filename = os.path.join(log_path, base_filename + '.log')
 
     handler = TimedRotatingFileHandler(log_filename, when="midnight", backupCount=30)
-    handler.setLevel(logging.DEBUG)
     handler.suffix = "%Y-%m-%d"
     handler.namer = namer
+    handler.setFormatter(logpipeline.JSONFormatter())
 
-    logging.basicConfig(
-        handlers=[handler, logging.StreamHandler()],
-        format='%(asctime)s | %(threadName)-10s | %(levelname)-5s | %(name)-22s | %(lineno)06d | %(message)s',
-        level=logging.DEBUG
-    )
-    logging.getLogger('github.Requester').setLevel(logging.WARNING)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logpipeline.TextFormatter(
+        '%(asctime)s | %(threadName)-10s | %(levelname)-5s | %(module)-22s | %(lineno)06d | %(message)s'
+    ))
 
+    # the handlers run in a thread of their own, so a slow disk or console never holds up a cycle
+    logpipeline.start([handler, stream_handler], log_level, log_levels)
 
-def main():
+
+def main(number_of_cycles: int = 3, interval: float = 600):
     setup_timed_rotating_logger()
 
     logging.info('--------------------START--------------------')
 
-    number_of_cycles = 3
     for i in range(number_of_cycles):
         try:
-            run_one_cycle()
+            run_instrumented_cycle()
         except Exception as e:
             logging.error(str(e))
         if i < number_of_cycles - 1:
             logging.info('Sleeping...')
-            time.sleep(600)
+            time.sleep(interval)
             logging.info('Sleep ended.\n')
 
     logging.info('---------------------END---------------------')
 
 
-def run_one_cycle():
+def main_daemon():
+    import asyncio
+    import daemon
+
+    setup_timed_rotating_logger()
+
+    logging.info('-----------------DAEMON START-----------------')
+
+    asyncio.run(daemon.run(run_instrumented_cycle))
+
+    logging.info('------------------DAEMON END------------------')
+
+
+def run_instrumented_cycle() -> bool:
+    """Runs run_one_cycle(), records its outcome and exports the metrics."""
+    try:
+        with metrics.STAGE_SECONDS.time(stage='cycle'):
+            did_update = run_one_cycle()
+    except RateLimitDeferred as e:
+        # nothing has been stored, so the next cycle syncs the same updates again and commits them with any newer ones
+        logging.info(str(e) + ' Deferring the cycle.')
+        _CYCLES.inc(result='deferred')
+        return False
+    except Exception:
+        _CYCLES.inc(result='error')
+        raise
+    else:
+        _CYCLES.inc(result='updated' if did_update else 'not_updated')
+        _LAST_SUCCESS.set(time.time())
+        return did_update
+    finally:
+        if metrics_path:
+            metrics.write(metrics_path)
+
+
+def run_one_cycle() -> bool:
+    """Returns whether the DB was updated."""
+    global committed_versions
     new_updates = requester.run()
+
+    if not any(new_updates.values()):
+        logging.info('Did not receive any UpdateInfo items.')
+        requester.mark_as_stored(new_updates)
+        return False
+
     new_update_strings = get_new_update_strings(new_updates)
 
-    db = Database(
-        json.loads(repo_manager.get_text(RELEASES_PATH)),
-        json.loads(repo_manager.get_text(BETAS_PATH)),
-        json.loads(repo_manager.get_text(PREVIEWS_PATH)),
-    )
+    db = load_database()
 
     update_result = db.update(new_update_strings['release'], new_update_strings['preview'])
 
     if not update_result.did_update:
         logging.info('Did not receive any brand new UpdateInfo items.')
-        return
+        # ends any transaction, so that the DB file isn't locked until the next cycle
+        db.rollback()
+        requester.mark_as_stored(new_updates)
+        return False
+
+    # the revision numbers and file digests let the download URLs of the GUIDs be resolved in batches later
+    db.set_update_metadata(
+        update_info for update_info_list in new_updates.values() for update_info in update_info_list
+    )
+
+    try:
+        parsed_db = get_parsed_db(db, update_result)
+
+        with metrics.STAGE_SECONDS.time(stage='json_serialization'):
+            new_texts = get_texts(db, parsed_db)
+        are_all_files_valid = get_repo_manager().update_files(
+            new_texts, update_result.commit_message, replaceable_paths=get_replaceable_paths(new_texts)
+        )
+    except Exception:
+        # keep the local DB in step with the remote repository so that the updates are retried next cycle
+        db.rollback()
+        raise
 
+    if not are_all_files_valid:
+        # nothing has been committed, so the updates aren't marked as stored either
+        logging.error('The remote files have not been updated, since some of them would have been invalid.')
+        db.rollback()
+        return False
+
+    db.commit()
+    requester.mark_as_stored(new_updates)
+    committed_versions = parsed_db
+    if query_server is not None:
+        query_server.update(parsed_db)
+    return True
+
+
+def load_database() -> 'SQLiteDatabase | CompactDatabase':
+    """Returns the local DB, filling it from the remote repository the first time.
+
+    Delete the local DB file to pick up changes made to the remote repository by hand.
+    """
+    db = get_local_db()
+    if db.is_empty():
+        logging.info('Filling the local database from the remote repository.')
+        manager = get_repo_manager()
+        db.load(
+            manager.get_json(RELEASES_PATH),
+            manager.get_json(BETAS_PATH),
+            manager.get_json(PREVIEWS_PATH)
+        )
+    return db
+
+
+def get_parsed_db(db: 'SQLiteDatabase | CompactDatabase', update_result: Database.UpdateResult) -> list[dict]:
+    """Merges only the added update strings into the current versions.json, falling back to a full rebuild.
+
+    The versions committed last are reused, so versions.json is only downloaded, and checked against the local DB, by
+    the first update of a process.
+    """
+    import dbparser
+    global updates_since_full_rebuild
+
+    updates_since_full_rebuild += 1
+    if updates_since_full_rebuild >= full_rebuild_interval:
+        logging.info('Rebuilding versions from scratch.')
+        updates_since_full_rebuild = 0
+        return db.export_versions()
+
+    if committed_versions is not None:
+        return dbparser.update(
+            committed_versions, update_result.added_release_strings, update_result.added_preview_strings
+        )
+
+    try:
+        parsed_db = get_repo_manager().get_json(VERSIONS_PATH, is_optional=True)
+    except Exception as e:
+        logging.error(str(e) + ' Rebuilding versions from scratch.')
+        return db.export_versions()
+
+    parsed_db = dbparser.update(parsed_db, update_result.added_release_strings, update_result.added_preview_strings)
+    if dbparser.count_guids(parsed_db) != db.count_versioned_guids():
+        logging.error(f'{VERSIONS_PATH} has drifted from the local DB. Rebuilding versions from scratch.')
+        updates_since_full_rebuild = 0
+        return db.export_versions()
+    return parsed_db
+
+
+def rebuild(
+        output_path: str,
+        archive_path: str | None = None,
+        beta_strings: list[str] | None = None,
+        max_workers: int | None = None
+):
+    """Writes every output file to `output_path`, built again from the local DB or from the archived responses.
+
+    Betas aren't synced anymore, so a replay takes them from the local DB unless they're given.
+    """
+    import dbparser
+
+    if archive_path is None:
+        db = load_database()
+    else:
+        import replay
+        from responsearchive import ResponseArchive
+
+        db = replay.replay(
+            ResponseArchive(archive_path),
+            requester.CHANNELS,
+            beta_strings if beta_strings is not None else load_database().beta_strings,
+            max_workers
+        )
     parsed_db = dbparser.run(db.release_strings, db.beta_strings, db.preview_strings)
 
-    repo_manager.update_file(json.dumps(db.release_strings, indent=4), RELEASES_PATH, update_result.commit_message)
-    repo_manager.update_file(json.dumps(db.preview_strings, indent=4), PREVIEWS_PATH, update_result.commit_message)
-    repo_manager.update_file(json.dumps(parsed_db, indent=4), VERSIONS_PATH, update_result.commit_message)
+    texts = get_texts(db, parsed_db)
+    texts[BETAS_PATH] = json.dumps(db.beta_strings, indent=4)
+    for path, text in texts.items():
+        file_path = os.path.join(output_path, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as f:
+            f.write(text)
+    logging.info(
+        f'Rebuild: {len(db.release_strings)} release and {len(db.preview_strings)} preview update strings, '
+        f'{len(parsed_db)} versions, {len(texts)} files written to {output_path}.'
+    )
+
+
+def verify() -> list[str]:
+    """Checks that the remote files agree with each other and with the local DB, and returns the problems found."""
+    import dbparser
+
+    manager = get_repo_manager()
+    remote_strings = {
+        path: manager.get_json(path) for path in (RELEASES_PATH, BETAS_PATH, PREVIEWS_PATH)
+    }
+    parsed_db = dbparser.run(*remote_strings.values())
+
+    problems = []
+    if manager.get_json(VERSIONS_PATH) != parsed_db:
+        problems.append(f'{VERSIONS_PATH} doesn\'t match {RELEASES_PATH}, {BETAS_PATH} and {PREVIEWS_PATH}.')
+
+    try:
+        manifest = manager.get_json(MANIFEST_PATH)
+    except Exception as e:
+        problems.append(f'{MANIFEST_PATH} could not be read. ' + str(e))
+    else:
+        expected_manifest = json.loads(get_sharded_texts(parsed_db, is_output_compact)[MANIFEST_PATH])
+        for path in sorted(set(manifest.get('files', {})) | set(expected_manifest['files'])):
+            if manifest.get('files', {}).get(path) != expected_manifest['files'].get(path):
+                problems.append(f'{MANIFEST_PATH} is out of date for {path}.')
+
+    db = get_local_db()
+    if not db.is_empty():
+        for path, strings in zip(remote_strings, (db.release_strings, db.beta_strings, db.preview_strings)):
+            if strings != remote_strings[path]:
+                problems.append(
+                    f'The local DB has {len(strings)} update strings where {path} has {len(remote_strings[path])}, '
+                    'or they differ.'
+                )
+    return problems
+
+
+def get_texts(db: 'Database | SQLiteDatabase | CompactDatabase', parsed_db: list[dict]) -> dict[str, str]:
+    """Returns the files written by a cycle, by remote path."""
+    texts = {
+        RELEASES_PATH: json.dumps(db.release_strings, indent=4),
+        PREVIEWS_PATH: json.dumps(db.preview_strings, indent=4),
+        VERSIONS_PATH: json.dumps(parsed_db, indent=4)
+    }
+    texts.update(get_sharded_texts(parsed_db, is_output_compact))
+    return texts
+
+
+def get_replaceable_paths(texts: dict[str, str]) -> list[str]:
+    """Returns the paths of the files that may shrink, e.g. when --compact is turned on.
+
+    The shards only have to be valid JSON, since versions.json, which they're split from, still has to grow.
+    """
+    return [LATEST_PATH, MANIFEST_PATH] + [path for path in texts if path.startswith(SHARDS_PATH + '/')]
+
+
+def get_sharded_texts(parsed_db: list[dict], compact: bool = False) -> dict[str, str]:
+    """Returns the shards of versions.json, latest.json and a manifest with the SHA-256 of both.
+
+    Unchanged shards render to the same text, so only the shards of new builds end up in a commit and consumers can
+    compare the manifest hashes to download just those.
+    """
+    import dbparser
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, separators=(',', ':')) if compact else json.dumps(obj, indent=4)
+
+    texts = {
+        f'{SHARDS_PATH}/{shard_name}.json': dumps(version_dict_list)
+        for shard_name, version_dict_list in dbparser.get_shards(parsed_db).items()
+    }
+    texts[LATEST_PATH] = dumps({
+        version_type: dict(version_dict, shard=f'{SHARDS_PATH}/{dbparser.get_shard_name(version_dict)}.json')
+        for version_type, version_dict in dbparser.get_latest(parsed_db).items()
+    })
+    texts[MANIFEST_PATH] = dumps({
+        'files': {
+            path: {'sha256': hashlib.sha256(text.encode()).hexdigest(), 'size': len(text.encode())}
+            for path, text in texts.items()
+        }
+    })
+    return texts
 
 
 # Mojang seems to have stopped releasing betas for Windows.
@@ -90,19 +417,14 @@ class NewUpdateStrings(TypedDict):
     preview: list[str]
 
 
-def get_new_update_strings(new_updates: list[requester.UpdateInfo]) -> NewUpdateStrings:
-    split_new_updates = {}
-    for type_, prefix in ('release', 'Microsoft.MinecraftUWP_'), ('preview', 'Microsoft.MinecraftWindowsBeta_'):
-        split_new_updates[type_] = [
-            new_update for new_update in new_updates if new_update.package_moniker.startswith(prefix)
-        ]
-
-    new_update_strings = {}
-    for type_ in 'release', 'preview':
-        new_update_strings[type_] = [str(new_update) for new_update in split_new_updates[type_]]
-
-    return new_update_strings
+def get_new_update_strings(new_updates: dict[str, list[requester.UpdateInfo]]) -> NewUpdateStrings:
+    """Returns the update strings of the new items by the DB slot of their channel."""
+    return requester.get_update_strings_by_slot(new_updates)
 
 
 if __name__ == '__main__':
-    main()
+    # kept for existing setups, see cli.py
+    import sys
+    import cli
+
+    sys.exit(cli.main())
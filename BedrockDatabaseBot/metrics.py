@@ -0,0 +1,195 @@
+from typing import Callable, Iterator, TYPE_CHECKING
+from contextlib import contextmanager
+from bisect import bisect_left
+import functools
+import os
+import threading
+import time
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# checked before any work is done, so that instrumented code costs a single global lookup while metrics are off
+_enabled = False
+_lock = threading.Lock()
+_metrics: list['_Metric'] = []
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _Metric:
+    type_ = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], object] = {}
+        _metrics.append(self)
+
+    def _get_key(self, labels: dict[str, object]) -> tuple[str, ...]:
+        return tuple(str(labels[label_name]) for label_name in self.label_names)
+
+    def _format_labels(self, key: tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{label_name}="{_escape(value)}"' for label_name, value in zip(self.label_names, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_}']
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{self._format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    type_ = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not _enabled:
+            return
+        key = self._get_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_ = 'gauge'
+
+    def set(self, value: float, **labels):
+        if not _enabled:
+            return
+        key = self._get_key(labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_ = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        if not _enabled:
+            return
+        key = self._get_key(labels)
+        with _lock:
+            # per-bucket (not cumulative) counts with an extra one for +Inf, followed by the sum
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        if not _enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_}']
+        for key, counts in sorted(self._values.items()):
+            cumulative_count = 0
+            for upper_bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative_count += count
+                le = '+Inf' if upper_bound == float('inf') else _format_value(upper_bound)
+                le_label = f'le="{le}"'
+                lines.append(f'{self.name}_bucket{self._format_labels(key, le_label)} {cumulative_count}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {_format_value(counts[-1])}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {cumulative_count}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('bdb_stage_duration_seconds', 'Time spent in each stage of a cycle.', ('stage',))
+
+
+def timed(stage: str) -> Callable:
+    """Records the duration of every call of the decorated function under `stage`."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with STAGE_SECONDS.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_bytes(chunks: Iterator[bytes], counter: Counter, **labels) -> Iterator[bytes]:
+    """Passes `chunks` through, adding their size to `counter`."""
+    if not _enabled:
+        return chunks
+    return _count_bytes(chunks, counter, labels)
+
+
+def _count_bytes(chunks: Iterator[bytes], counter: Counter, labels: dict) -> Iterator[bytes]:
+    for chunk in chunks:
+        counter.inc(len(chunk), **labels)
+        yield chunk
+
+
+def render() -> str:
+    """Returns all metrics in the Prometheus text exposition format."""
+    with _lock:
+        lines = [line for metric in _metrics for line in metric.render()]
+    return '\n'.join(lines) + '\n'
+
+
+def write(path: str):
+    """Writes the metrics atomically, e.g. for the node_exporter textfile collector."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(render())
+    os.replace(temp_path, path)
+
+
+def start_server(port: int, host: str = '127.0.0.1') -> 'ThreadingHTTPServer':
+    """Serves the metrics at /metrics from a background thread."""
+    # imported here since it takes longer than the rest of the module and most runs don't serve metrics
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            data = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='Metrics', daemon=True).start()
+    return server
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
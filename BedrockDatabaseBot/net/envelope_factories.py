@@ -1,5 +1,6 @@
-from xml.etree.ElementTree import Element, SubElement
+from xml.etree.ElementTree import Element, SubElement, tostring
 from datetime import datetime, timedelta
+import re
 
 from net.structs import Cookie
 
@@ -16,8 +17,114 @@ def make_get_config_envelope(url: str) -> Element:
     return _Envelope(url, _ElementGetConfig())
 
 
-def make_sync_updates_envelope(url: str, cookie: Cookie, category_ids: list[str]) -> Element:
-    return _Envelope(url, _ElementSyncUpdates(cookie, category_ids))
+def make_sync_updates_envelope(
+        url: str, cookie: Cookie, category_ids: list[str], cached_update_ids: list[int] | None = None
+) -> Element:
+    return _Envelope(url, _ElementSyncUpdates(cookie, category_ids, cached_update_ids or []))
+
+
+def make_get_extended_update_info2_envelope(
+        url: str, update_ids: list[str], revision_numbers: list[int] | None = None
+) -> Element:
+    """`revision_numbers` are those of the update IDs at the same positions, 1 for all of them by default."""
+    return _Envelope(url, _ElementGetExtendedUpdateInfo2(update_ids, revision_numbers or [1] * len(update_ids)))
+
+
+def render_get_cookie_envelope(url: str, config_last_change: str) -> bytes:
+    """Same bytes as serializing make_get_cookie_envelope(), without building the element tree."""
+    if not (url and config_last_change):
+        return tostring(make_get_cookie_envelope(url, config_last_change))
+    return _GET_COOKIE_TEMPLATE.render(
+        {'last_change': _escape(config_last_change), 'current_time': _format_time(datetime.now())} |
+        _get_header_values(url)
+    )
+
+
+def render_get_config_envelope(url: str) -> bytes:
+    """Same bytes as serializing make_get_config_envelope(), without building the element tree."""
+    if not url:
+        return tostring(make_get_config_envelope(url))
+    return _GET_CONFIG_TEMPLATE.render(_get_header_values(url))
+
+
+def render_sync_updates_envelope(
+        url: str, cookie: Cookie, category_ids: list[str], cached_update_ids: list[int] | None = None
+) -> bytes:
+    """Same bytes as serializing make_sync_updates_envelope(), without building the element tree."""
+    # empty values serialize as self-closing elements, which the templates don't cover
+    if not (url and cookie.expiration and cookie.encrypted_data and category_ids and all(category_ids)):
+        return tostring(make_sync_updates_envelope(url, cookie, category_ids, cached_update_ids))
+    return _SYNC_UPDATES_TEMPLATE.render(
+        {
+            'expiration': _escape(cookie.expiration),
+            'encrypted_data': _escape(cookie.encrypted_data),
+            'cached_update_ids': (
+                '<OtherCachedUpdateIDs>' +
+                ''.join(f'<int>{int(cached_update_id)}</int>' for cached_update_id in cached_update_ids) +
+                '</OtherCachedUpdateIDs>'
+            ) if cached_update_ids else '',
+            'category_ids': ''.join(
+                f'<CategoryIdentifier><Id>{_escape(category_id)}</Id></CategoryIdentifier>'
+                for category_id in category_ids
+            )
+        } |
+        _get_header_values(url)
+    )
+
+
+def render_get_extended_update_info2_envelope(
+        url: str, update_ids: list[str], revision_numbers: list[int] | None = None
+) -> bytes:
+    """Same bytes as serializing make_get_extended_update_info2_envelope(), without building the element tree."""
+    if not (url and update_ids and all(update_ids)):
+        return tostring(make_get_extended_update_info2_envelope(url, update_ids, revision_numbers))
+    return _GET_EXTENDED_UPDATE_INFO2_TEMPLATE.render(
+        {
+            'update_identities': ''.join(
+                f'<UpdateIdentity><UpdateID>{_escape(update_id)}</UpdateID>'
+                f'<RevisionNumber>{int(revision_number)}</RevisionNumber></UpdateIdentity>'
+                for update_id, revision_number in zip(update_ids, revision_numbers or [1] * len(update_ids))
+            )
+        } |
+        _get_header_values(url)
+    )
+
+
+class _EnvelopeTemplate:
+    """An envelope serialized once, with the text (or the tail) of the given elements turned into slots."""
+
+    def __init__(self, envelope: Element, slot_names: dict[str, str], tail_slot_names: dict[str, str] | None = None):
+        for tag, slot_name in slot_names.items():
+            for element in envelope.iter(tag):
+                del element[:]
+                element.text = f'@@{slot_name}@@'
+        for tag, slot_name in (tail_slot_names or {}).items():
+            for element in envelope.iter(tag):
+                element.tail = f'@@{slot_name}@@'
+        self._parts = re.split(r'@@(\w+)@@', tostring(envelope).decode('ascii'))
+
+    def render(self, escaped_values: dict[str, str]) -> bytes:
+        parts = self._parts.copy()
+        parts[1::2] = [escaped_values[slot_name] for slot_name in parts[1::2]]
+        # the same way ElementTree serializes non-ASCII characters with its default encoding
+        return ''.join(parts).encode('ascii', 'xmlcharrefreplace')
+
+
+def _escape(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _format_time(time: datetime) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _get_header_values(url: str) -> dict[str, str]:
+    created_time = datetime.now()
+    return {
+        'url': _escape(url),
+        'created': _format_time(created_time),
+        'expires': _format_time(created_time + timedelta(minutes=5))
+    }
 
 
 class _ElementGetCookie(Element):
@@ -43,7 +150,7 @@ class _ElementGetConfig(Element):
 
 
 class _ElementSyncUpdates(Element):
-    def __init__(self, cookie: Cookie, category_ids: list[str]):
+    def __init__(self, cookie: Cookie, category_ids: list[str], cached_update_ids: list[int]):
         super().__init__('SyncUpdates')
 
         cookie_element = SubElement(self, 'cookie')
@@ -71,6 +178,13 @@ class _ElementSyncUpdates(Element):
             int_ = SubElement(installed_non_leaf_update_ids, 'int')
             int_.text = str(installed_non_leaf_update_id)
 
+        # revision IDs of updates the client already knows, which the service then leaves out of NewUpdates
+        if cached_update_ids:
+            other_cached_update_ids = SubElement(parameters, 'OtherCachedUpdateIDs')
+            for cached_update_id in cached_update_ids:
+                int_ = SubElement(other_cached_update_ids, 'int')
+                int_.text = str(cached_update_id)
+
         skip_software_sync = SubElement(parameters, 'SkipSoftwareSync')
         skip_software_sync.text = 'false'
 
@@ -134,6 +248,32 @@ class _ElementSyncUpdates(Element):
         products_parameters.append(Element('Products'))
 
 
+class _ElementGetExtendedUpdateInfo2(Element):
+    def __init__(self, update_ids: list[str], revision_numbers: list[int]):
+        super().__init__('GetExtendedUpdateInfo2')
+
+        update_ids_element = SubElement(self, 'updateIDs')
+        for update_id, revision_number in zip(update_ids, revision_numbers):
+            update_identity = SubElement(update_ids_element, 'UpdateIdentity')
+
+            update_id_element = SubElement(update_identity, 'UpdateID')
+            update_id_element.text = update_id
+
+            revision_number_element = SubElement(update_identity, 'RevisionNumber')
+            revision_number_element.text = str(revision_number)
+
+        info_types = SubElement(self, 'infoTypes')
+
+        xml_update_fragment_type1 = SubElement(info_types, 'XmlUpdateFragmentType')
+        xml_update_fragment_type1.text = 'FileUrl'
+
+        xml_update_fragment_type2 = SubElement(info_types, 'XmlUpdateFragmentType')
+        xml_update_fragment_type2.text = 'FileDecryption'
+
+        device_attributes = SubElement(self, 'deviceAttributes')
+        device_attributes.text = 'E:BranchReadinessLevel=CBB&DchuNvidiaGrfxExists=1&ProcessorIdentifier=Intel64%20Family%206%20Model%2063%20Stepping%202&CurrentBranch=rs4_release&DataVer_RS5=1942&FlightRing=Retail&AttrDataVer=57&InstallLanguage=en-US&DchuAmdGrfxExists=1&OSUILocale=en-US&InstallationType=Client&FlightingBranchName=&Version_RS5=10&UpgEx_RS5=Green&GStatus_RS5=2&OSSkuId=48&App=WU&InstallDate=1529700913&ProcessorManufacturer=GenuineIntel&AppVer=10.0.17134.471&OSArchitecture=AMD64&UpdateManagementGroup=2&IsDeviceRetailDemo=0&HidOverGattReg=C%3A%5CWINDOWS%5CSystem32%5CDriverStore%5CFileRepository%5Chidbthle.inf_amd64_467f181075371c89%5CMicrosoft.Bluetooth.Profiles.HidOverGatt.dll&IsFlightingEnabled=0&DchuIntelGrfxExists=1&TelemetryLevel=1&DefaultUserRegion=244&DeferFeatureUpdatePeriodInDays=365&Bios=Unknown&WuClientVer=10.0.17134.471&PausedFeatureStatus=1&Steam=URL%3Asteam%20protocol&Free=8to16&OSVersion=10.0.17134.472&DeviceFamily=Windows.Desktop'
+
+
 class _Envelope(Element):
     def __init__(self, url: str, element: Element):
         super().__init__(
@@ -190,3 +330,22 @@ class _Header(Element):
         # )
         #     user = ET.SubElement(ticket_type, 'User')
         #     user.text = 'some stuff that matters'
+
+
+_HEADER_SLOT_NAMES = {'a:To': 'url', 'Created': 'created', 'Expires': 'expires'}
+
+_GET_COOKIE_TEMPLATE = _EnvelopeTemplate(
+    make_get_cookie_envelope('-', '-'),
+    {'lastChange': 'last_change', 'currentTime': 'current_time'} | _HEADER_SLOT_NAMES
+)
+_GET_CONFIG_TEMPLATE = _EnvelopeTemplate(make_get_config_envelope('-'), _HEADER_SLOT_NAMES)
+_SYNC_UPDATES_TEMPLATE = _EnvelopeTemplate(
+    make_sync_updates_envelope('-', Cookie('-', '-'), ['-']),
+    {'Expiration': 'expiration', 'EncryptedData': 'encrypted_data', 'FilterAppCategoryIds': 'category_ids'} |
+    _HEADER_SLOT_NAMES,
+    {'InstalledNonLeafUpdateIDs': 'cached_update_ids'}
+)
+_GET_EXTENDED_UPDATE_INFO2_TEMPLATE = _EnvelopeTemplate(
+    make_get_extended_update_info2_envelope('-', ['-']),
+    {'updateIDs': 'update_identities'} | _HEADER_SLOT_NAMES
+)
@@ -1,12 +1,52 @@
-from xml.etree.ElementTree import Element, fromstring
+from typing import Iterable, Iterator
+from xml.etree.ElementTree import Element, XMLPullParser, fromstring
+import hashlib
+import re
 
-from net.structs import SyncUpdates, Cookie, UpdateInfo, Config
+from net.structs import SyncUpdates, Cookie, UpdateInfo, Config, FileLocation
+import metrics
+
+
+_UPDATE_INFOS = metrics.Counter(
+    'bdb_sync_updates_items_total', 'UpdateInfo items read from SyncUpdates responses, by whether they matched.',
+    ('result',)
+)
 
 
 class ParsingError(ValueError):
     pass
 
 
+# the most bytes handed to the XML parser at once
+FEED_SIZE = 64 * 1024
+
+_NEW_UPDATES_PATTERN = re.compile(rb'(<(?:\w+:)?NewUpdates>)(.*?)(</(?:\w+:)?NewUpdates>)', re.DOTALL)
+_UPDATE_INFO_PATTERN = re.compile(rb'<(?:\w+:)?UpdateInfo>.*?</(?:\w+:)?UpdateInfo>', re.DOTALL)
+_LAST_CHANGE_TIME_PATTERN = re.compile(rb'<(?:\w+:)?LastChangeTime>.*?</(?:\w+:)?LastChangeTime>', re.DOTALL)
+
+
+def get_new_updates_digest(response: bytes) -> str | None:
+    """Returns a digest of the NewUpdates items of a SyncUpdates response, found without parsing the XML.
+
+    It doesn't depend on the order of the items, their LastChangeTime or anything outside NewUpdates such as the new
+    cookie. Returns None if the response has no NewUpdates element with content.
+    """
+    match = _NEW_UPDATES_PATTERN.search(response)
+    if not match:
+        return None
+    digest = hashlib.sha256()
+    update_infos = (_LAST_CHANGE_TIME_PATTERN.sub(b'', item) for item in _UPDATE_INFO_PATTERN.findall(match[2]))
+    for update_info in sorted(update_infos):
+        digest.update(update_info)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def strip_new_updates(response: bytes) -> bytes:
+    """Empties the NewUpdates element, so that only the rest of the response, e.g. the new cookie, is parsed."""
+    return _NEW_UPDATES_PATTERN.sub(rb'\1\3', response, count=1)
+
+
 def parse_sync_updates_response_envelope(response: Element) -> SyncUpdates:
     new_updates_element = response.find(
         './{*}Body/{*}SyncUpdatesResponse/{*}SyncUpdatesResult/{*}NewUpdates'
@@ -32,6 +72,85 @@ def parse_sync_updates_response_envelope(response: Element) -> SyncUpdates:
     return SyncUpdates(new_updates, Cookie(new_encrypted_data, new_expiration))
 
 
+class SyncUpdatesResponseParser:
+    """Incrementally parses a SyncUpdates response body fed in chunks, yielding UpdateInfo items as they arrive.
+
+    Items whose package moniker doesn't start with `package_moniker_prefix` are dropped before their embedded Xml is
+    parsed. `new_cookie` is available once the iteration has finished.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], package_moniker_prefix: str = ''):
+        self._chunks = chunks
+        self._package_moniker_marker = 'PackageMoniker="' + package_moniker_prefix
+        self._package_moniker_prefix = package_moniker_prefix
+        self._new_cookie: Cookie | None = None
+
+    @property
+    def new_cookie(self) -> Cookie:
+        if self._new_cookie is None:
+            raise ParsingError('The response has not been fully parsed yet.')
+        return self._new_cookie
+
+    def __iter__(self) -> Iterator[UpdateInfo]:
+        path = []
+        has_new_updates = False
+        new_cookie_values = {}
+
+        for event, element in self._read_events():
+            tag = element.tag.rpartition('}')[2]
+            if event == 'start':
+                path.append(tag)
+                continue
+            path.pop()
+            parent_tag = path[-1] if path else None
+
+            if parent_tag == 'NewUpdates':
+                update_info = self._parse_update_info_element(element)
+                element.clear()
+                _UPDATE_INFOS.inc(result='matched' if update_info else 'skipped')
+                if update_info:
+                    yield update_info
+                continue
+            if 'NewUpdates' in path:  # part of an UpdateInfo element that is still being read
+                continue
+
+            if tag == 'NewUpdates':
+                has_new_updates = True
+            elif parent_tag == 'NewCookie':
+                new_cookie_values[tag] = element.text
+            # drop every finished element so that memory use doesn't grow with the response
+            element.clear()
+
+        if not has_new_updates:
+            raise ParsingError('No NewUpdates element has been found.')
+        if (not new_cookie_values.get('EncryptedData')) or (not new_cookie_values.get('Expiration')):
+            raise ParsingError('No NewCookie/EncryptedData or NewCookie/Expiration value has been found.')
+        self._new_cookie = Cookie(new_cookie_values['EncryptedData'], new_cookie_values['Expiration'])
+
+    def _read_events(self) -> Iterator[tuple[str, Element]]:
+        pull_parser = XMLPullParser(events=('start', 'end'))
+        for chunk in self._chunks:
+            # feed() builds the elements of all it's given before any of them can be cleared, so a whole buffered
+            # response is fed in slices to keep the memory use flat
+            chunk_view = memoryview(chunk)
+            for offset in range(0, len(chunk_view), FEED_SIZE):
+                pull_parser.feed(chunk_view[offset:offset + FEED_SIZE])
+                yield from pull_parser.read_events()
+        pull_parser.close()
+        yield from pull_parser.read_events()
+
+    def _parse_update_info_element(self, update_info_element: Element) -> UpdateInfo | None:
+        xml = update_info_element.findtext('./{*}Xml')
+        # a cheap substring check avoids the nested parse for unrelated packages
+        if (not xml) or (self._package_moniker_marker not in xml):
+            return None
+
+        update_info = _parse_update_info_xml(xml, _parse_revision_id(update_info_element))
+        if (not update_info) or (not update_info.package_moniker.startswith(self._package_moniker_prefix)):
+            return None
+        return update_info
+
+
 def parse_get_cookie_response_envelope(response: Element) -> Cookie:
     encrypted_data = response.findtext('./{*}Body/{*}GetCookieResponse/{*}GetCookieResult/{*}EncryptedData')
     expiration = response.findtext('./{*}Body/{*}GetCookieResponse/{*}GetCookieResult/{*}Expiration')
@@ -48,11 +167,34 @@ def parse_get_config_response_envelope(response: Element) -> Config:
     return Config(last_change)
 
 
+def parse_get_extended_update_info2_response_envelope(response: Element) -> list[FileLocation]:
+    file_locations_element = response.find(
+        './{*}Body/{*}GetExtendedUpdateInfo2Response/{*}GetExtendedUpdateInfo2Result/{*}FileLocations'
+    )
+    if file_locations_element is None:
+        raise ParsingError('No FileLocations element has been found.')
+
+    return [
+        FileLocation(file_location_element.findtext('./{*}Url'), file_location_element.findtext('./{*}FileDigest', ''))
+        for file_location_element in file_locations_element
+        if file_location_element.findtext('./{*}Url')
+    ]
+
+
 def _parse_update_info_element(update_info_element: Element) -> UpdateInfo | None:
     xml = update_info_element.findtext('./{*}Xml')
     if not xml:
         return None
 
+    return _parse_update_info_xml(xml, _parse_revision_id(update_info_element))
+
+
+def _parse_revision_id(update_info_element: Element) -> int | None:
+    revision_id = update_info_element.findtext('./{*}ID')
+    return int(revision_id) if revision_id and revision_id.isdigit() else None
+
+
+def _parse_update_info_xml(xml: str, revision_id: int | None = None) -> UpdateInfo | None:
     xml_element = fromstring('<Xml>' + xml + '</Xml>')
 
     update_identity = xml_element.find('./{*}UpdateIdentity')
@@ -65,4 +207,11 @@ def _parse_update_info_element(update_info_element: Element) -> UpdateInfo | Non
     if (not update_id) or (not package_moniker):
         return None
 
-    return UpdateInfo(update_id, package_moniker)
+    revision_number = update_identity.get('RevisionNumber', '')
+    file_digests = tuple(
+        file_element.get('Digest') for file_element in xml_element.iterfind('./{*}Files/{*}File')
+        if file_element.get('Digest')
+    )
+    return UpdateInfo(
+        update_id, package_moniker, revision_id, int(revision_number) if revision_number.isdigit() else 1, file_digests
+    )
@@ -1,25 +1,139 @@
+from typing import Iterator
 import xml.etree.ElementTree as ET
+import logging
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+
+# SOAP faults come back as 500 and are never retried
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504}
+
+_REQUESTS = metrics.Counter('bdb_soap_requests_total', 'SOAP requests by HTTP status, retries included.', ('status',))
+_RETRIES = metrics.Counter('bdb_soap_retries_total', 'SOAP requests retried after a transient error.')
+_REQUEST_SECONDS = metrics.Histogram(
+    'bdb_soap_request_duration_seconds', 'Time until the response headers of a SOAP request have arrived.'
+)
+_SENT_BYTES = metrics.Counter('bdb_soap_sent_bytes_total', 'Size of the sent envelopes.')
+_RECEIVED_BYTES = metrics.Counter('bdb_soap_received_bytes_total', 'Size of the decompressed responses.')
 
 
 class SOAPError(Exception):
     pass
 
 
-def post_envelope(url: str, envelope: ET.Element) -> ET.Element:
-    res = requests.post(
-        url,
-        data=ET.tostring(envelope),
-        headers={'content-type': 'application/soap+xml; charset=utf-8'},
-        verify=False
-    )
+class SOAPTransportError(Exception):
+    """The service couldn't be reached or kept answering with transient errors, so the envelope wasn't at fault."""
+
+
+class Transport:
+    """Posts envelopes over a pooled keep-alive session with timeouts and bounded retries."""
+
+    def __init__(
+            self,
+            connect_timeout: float = 10,
+            read_timeout: float = 60,
+            max_retries: int = 3,
+            backoff_factor: float = 0.5,
+            pool_maxsize: int = 4
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        self._session = requests.Session()
+        self._session.verify = False
+        self._session.headers.update({
+            'content-type': 'application/soap+xml; charset=utf-8',
+            'accept-encoding': 'gzip, deflate'
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def post_envelope(self, url: str, envelope: ET.Element | bytes) -> ET.Element:
+        res = self._post(url, self._serialize(envelope))
+
+        if res.status_code != 200:
+            raise SOAPError(self._get_error_message(res.content))
+
+        _RECEIVED_BYTES.inc(len(res.content))
+        return ET.fromstring(res.content)
+
+    def post_envelope_streamed(
+            self, url: str, envelope: ET.Element | bytes, chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """Returns the decompressed response body as an iterator of chunks instead of parsing it at once."""
+        res = self._post(url, self._serialize(envelope), stream=True)
+
+        if res.status_code != 200:
+            raise SOAPError(self._get_error_message(res.content))
 
-    if res.status_code != 200:
-        error_message = ET.fromstring(res.content).findtext('./{*}Body/{*}Fault/{*}Reason/{*}Text')
+        return metrics.count_bytes(res.iter_content(chunk_size), _RECEIVED_BYTES)
+
+    def close(self):
+        self._session.close()
+
+    def _post(self, url: str, data: bytes, stream: bool = False) -> requests.Response:
+        """Raises SOAPTransportError once the retries are used up."""
+        attempt = 0
+        while True:
+            _SENT_BYTES.inc(len(data))
+            error = None
+            try:
+                with _REQUEST_SECONDS.time():
+                    res = self._session.post(
+                        url, data=data, timeout=(self.connect_timeout, self.read_timeout), stream=stream
+                    )
+                _REQUESTS.inc(status=res.status_code)
+                if res.status_code not in TRANSIENT_STATUS_CODES:
+                    return res
+                reason = f'HTTP {res.status_code}'
+                res.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                _REQUESTS.inc(status='error')
+                reason, error = str(e), e
+            if attempt >= self.max_retries:
+                raise SOAPTransportError(f'SOAP: {reason}. Giving up after {attempt + 1} attempts.') from error
+
+            delay = self.backoff_factor * 2 ** attempt
+            logging.warning(f'SOAP: {reason}. Retrying in {delay} s.')
+            _RETRIES.inc()
+            time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _serialize(envelope: ET.Element | bytes) -> bytes:
+        return envelope if isinstance(envelope, bytes) else ET.tostring(envelope)
+
+    @staticmethod
+    def _get_error_message(content: bytes) -> str:
+        try:
+            error_message = ET.fromstring(content).findtext('./{*}Body/{*}Fault/{*}Reason/{*}Text')
+        except ET.ParseError:
+            error_message = None
         error_message = error_message if error_message else 'An unknown error has occurred'
         error_message = error_message.strip()
-        error_message = error_message + '.' if not error_message.endswith('.') else error_message
-        raise SOAPError(error_message)
+        return error_message + '.' if not error_message.endswith('.') else error_message
+
+
+_default_transport: Transport | None = None
+
+
+def get_default_transport() -> Transport:
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = Transport()
+    return _default_transport
+
+
+def post_envelope(url: str, envelope: ET.Element | bytes) -> ET.Element:
+    return get_default_transport().post_envelope(url, envelope)
+
 
-    return ET.fromstring(res.content)
+def post_envelope_streamed(url: str, envelope: ET.Element | bytes) -> Iterator[bytes]:
+    return get_default_transport().post_envelope_streamed(url, envelope)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass(frozen=True, slots=True)
@@ -11,6 +11,12 @@ class Cookie:
 class UpdateInfo:
     update_id: str
     package_moniker: str
+    # the UpdateInfo/ID the service assigned to this revision, sent back to it as a cached update ID
+    revision_id: int | None = field(default=None, compare=False)
+    # the UpdateIdentity/RevisionNumber, sent with the update ID to GetExtendedUpdateInfo2
+    revision_number: int = field(default=1, compare=False)
+    # the digests of the files of the update, which the file locations returned by GetExtendedUpdateInfo2 are matched on
+    file_digests: tuple[str, ...] = field(default=(), compare=False, repr=False)
 
     def __str__(self):
         return f'{self.update_id} {self.package_moniker}'
@@ -25,3 +31,9 @@ class SyncUpdates:
 @dataclass(frozen=True, slots=True)
 class Config:
     last_change: str
+
+
+@dataclass(frozen=True, slots=True)
+class FileLocation:
+    url: str
+    digest: str
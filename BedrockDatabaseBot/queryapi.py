@@ -0,0 +1,232 @@
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit, parse_qsl, unquote
+from bisect import bisect_left
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+
+import dbparser
+import metrics
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+_REQUESTS = metrics.Counter(
+    'bdb_query_requests_total', 'Query API requests, by endpoint and status.', ('endpoint', 'status')
+)
+
+
+class QueryError(ValueError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class VersionIndex:
+    """Indexes of a versions list returned by dbparser.run(), which is never modified once it's indexed.
+
+    Versions are referred to by their position in the list, so that the results of every query keep its order.
+    Rendered responses are cached per query until the index is replaced.
+    """
+
+    def __init__(self, version_dict_list: list[dict], max_cached_responses: int = 1024):
+        self._version_dict_list = version_dict_list
+        self._max_cached_responses = max_cached_responses
+        self._positions_by_name: dict[str, list[int]] = {}
+        self._positions_by_type: dict[str, list[int]] = {}
+        self._positions_by_architecture: dict[str, list[int]] = {}
+        # GUID -> (position, architecture)
+        self._versions_by_guid: dict[str, tuple[int, str]] = {}
+        for position, version_dict in enumerate(version_dict_list):
+            self._positions_by_name.setdefault(version_dict['name'], []).append(position)
+            self._positions_by_type.setdefault(version_dict['type'], []).append(position)
+            for architecture, guids in version_dict['guids'].items():
+                if guids:
+                    self._positions_by_architecture.setdefault(architecture, []).append(position)
+                for guid in guids:
+                    self._versions_by_guid[guid.lower()] = (position, architecture)
+        # for name prefix lookups
+        self._sorted_names = sorted(self._positions_by_name)
+        self._latest = dbparser.get_latest(version_dict_list)
+
+        self._lock = threading.Lock()
+        self._cached_responses: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        for query in '/versions', '/latest':
+            self.get_response(query)
+
+    def __len__(self) -> int:
+        return len(self._version_dict_list)
+
+    def get_response(self, query: str) -> tuple[bytes, str]:
+        """Returns the JSON body answering a path with its query string, and its ETag.
+
+        Raises QueryError for unknown paths, bad parameters and missing versions.
+        """
+        with self._lock:
+            cached_response = self._cached_responses.get(query)
+            if cached_response is not None:
+                self._cached_responses.move_to_end(query)
+                return cached_response
+
+        body = json.dumps(self._answer(query), separators=(',', ':')).encode()
+        response = body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        with self._lock:
+            self._cached_responses[query] = response
+            while len(self._cached_responses) > self._max_cached_responses:
+                self._cached_responses.popitem(last=False)
+        return response
+
+    def find_versions(
+            self,
+            name: str | None = None,
+            name_prefix: str | None = None,
+            type_: str | None = None,
+            architecture: str | None = None
+    ) -> list[dict]:
+        """Returns the versions matching every given filter, with only the GUIDs of `architecture` if it's given."""
+        position_lists = []
+        if name is not None:
+            position_lists.append(self._positions_by_name.get(name, []))
+        if name_prefix is not None:
+            position_lists.append(self._find_positions_by_name_prefix(name_prefix))
+        if type_ is not None:
+            position_lists.append(self._positions_by_type.get(type_, []))
+        if architecture is not None:
+            position_lists.append(self._positions_by_architecture.get(architecture, []))
+
+        # only the smallest candidate list is walked, the other filters are checked on its versions
+        positions = min(position_lists, key=len) if position_lists else range(len(self._version_dict_list))
+        version_dicts = [
+            version_dict for version_dict in (self._version_dict_list[position] for position in positions)
+            if (name is None or version_dict['name'] == name) and
+            (name_prefix is None or version_dict['name'].startswith(name_prefix)) and
+            (type_ is None or version_dict['type'] == type_) and
+            (architecture is None or version_dict['guids'].get(architecture))
+        ]
+        if architecture is not None:
+            version_dicts = [
+                dict(version_dict, guids={architecture: version_dict['guids'][architecture]})
+                for version_dict in version_dicts
+            ]
+        return version_dicts
+
+    def find_version_by_guid(self, guid: str) -> dict | None:
+        """Returns the name, type and architecture of the version the GUID belongs to."""
+        found = self._versions_by_guid.get(guid.lower())
+        if found is None:
+            return None
+        position, architecture = found
+        version_dict = self._version_dict_list[position]
+        return {
+            'guid': guid.lower(),
+            'name': version_dict['name'],
+            'type': version_dict['type'],
+            'architecture': architecture
+        }
+
+    def get_latest(self, type_: str | None = None) -> dict | None:
+        return self._latest if type_ is None else self._latest.get(type_)
+
+    def _find_positions_by_name_prefix(self, name_prefix: str) -> list[int]:
+        positions = []
+        for i in range(bisect_left(self._sorted_names, name_prefix), len(self._sorted_names)):
+            if not self._sorted_names[i].startswith(name_prefix):
+                break
+            positions += self._positions_by_name[self._sorted_names[i]]
+        return sorted(positions)
+
+    def _answer(self, query: str) -> object:
+        url = urlsplit(query)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        parameters = dict(parse_qsl(url.query))
+
+        if parts == ['versions']:
+            unknown_parameters = set(parameters) - {'name', 'prefix', 'type', 'architecture'}
+            if unknown_parameters:
+                raise QueryError(400, f'Unknown parameters: {", ".join(sorted(unknown_parameters))}.')
+            return self.find_versions(
+                parameters.get('name'), parameters.get('prefix'), parameters.get('type'), parameters.get('architecture')
+            )
+        if parts[0] == 'latest' and len(parts) <= 2:
+            latest = self.get_latest(parts[1] if len(parts) == 2 else None)
+            if latest is None:
+                raise QueryError(404, f'No {parts[1]} version has been found.')
+            return latest
+        if parts[0] == 'guids' and len(parts) == 2:
+            version = self.find_version_by_guid(parts[1])
+            if version is None:
+                raise QueryError(404, f'The GUID {parts[1]} has not been found.')
+            return version
+        raise QueryError(404, f'Unknown path: {url.path}.')
+
+
+class QueryServer:
+    """Read-only HTTP API over the latest versions list, served from a background thread.
+
+        GET /versions[?name=&prefix=&type=&architecture=]
+        GET /latest[/<type>]
+        GET /guids/<guid>
+
+    Responses carry an ETag and requests with a matching If-None-Match get 304 Not Modified. update() builds the indexes
+    of a new versions list aside and swaps them in at once, so every request sees either the old or the new list.
+    """
+
+    def __init__(self, version_dict_list: list[dict] | None = None):
+        self._index = VersionIndex(version_dict_list or [])
+        self._server: 'ThreadingHTTPServer | None' = None
+
+    @property
+    def index(self) -> VersionIndex:
+        return self._index
+
+    def update(self, version_dict_list: list[dict]):
+        self._index = VersionIndex(version_dict_list)
+
+    def start(self, port: int, host: str = '127.0.0.1') -> 'QueryServer':
+        # imported here like in metrics.start_server(), since most runs don't serve queries
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        query_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                endpoint = self.path.split('?', 1)[0].strip('/').split('/', 1)[0]
+                try:
+                    body, etag = query_server.index.get_response(self.path)
+                except QueryError as e:
+                    _REQUESTS.inc(endpoint=endpoint, status=e.status)
+                    self._send(e.status, json.dumps({'error': str(e)}).encode())
+                    return
+
+                if etag in [value.strip() for value in self.headers.get('If-None-Match', '').split(',')]:
+                    _REQUESTS.inc(endpoint=endpoint, status=304)
+                    self._send(304, b'', etag)
+                    return
+                _REQUESTS.inc(endpoint=endpoint, status=200)
+                self._send(200, body, etag)
+
+            def _send(self, status: int, body: bytes, etag: str | None = None):
+                self.send_response(status)
+                if etag:
+                    self.send_header('ETag', etag)
+                    # clients may keep responses but have to revalidate them, which costs them no body
+                    self.send_header('Cache-Control', 'no-cache')
+                if status != 304:
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name='Query', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,78 @@
+from dataclasses import dataclass, asdict
+from copy import deepcopy
+import json
+import os
+import time
+
+
+@dataclass(slots=True)
+class _Entry:
+    etag: str
+    sha: str
+    value: object
+    last_used: float
+
+
+class ReadCache:
+    """On-disk cache of parsed remote files, revalidated with conditional requests.
+
+    Entries not used for `max_age` seconds are evicted, and the least recently used ones are evicted once there are
+    more than `max_entries`. An entry is invalidated whenever its file is committed.
+    """
+
+    def __init__(self, path: str = 'read_cache.json', max_entries: int = 16, max_age: float = 7 * 24 * 60 * 60):
+        self._path = path
+        self._max_entries = max_entries
+        self._max_age = max_age
+        self._entries = self._load()
+        self.hits = 0
+        self.misses = 0
+
+    def get_etag(self, remote_path: str) -> str | None:
+        self._evict()
+        entry = self._entries.get(remote_path)
+        return entry.etag if entry else None
+
+    def hit(self, remote_path: str) -> tuple[object, str]:
+        """Returns a copy of the cached value and its blob SHA after the server has answered 304 Not Modified."""
+        entry = self._entries[remote_path]
+        entry.last_used = time.time()
+        self.hits += 1
+        return deepcopy(entry.value), entry.sha
+
+    def put(self, remote_path: str, etag: str | None, sha: str, value: object):
+        self.misses += 1
+        if etag:
+            self._entries[remote_path] = _Entry(etag, sha, deepcopy(value), time.time())
+        else:
+            self._entries.pop(remote_path, None)
+        self._evict()
+        self._save()
+
+    def invalidate(self, remote_path: str):
+        if self._entries.pop(remote_path, None):
+            self._save()
+
+    def _evict(self):
+        min_last_used = time.time() - self._max_age
+        for remote_path in [
+            remote_path for remote_path, entry in self._entries.items() if entry.last_used < min_last_used
+        ]:
+            del self._entries[remote_path]
+
+        while len(self._entries) > self._max_entries:
+            del self._entries[min(self._entries, key=lambda remote_path: self._entries[remote_path].last_used)]
+
+    def _load(self) -> dict[str, _Entry]:
+        try:
+            with open(self._path) as f:
+                return {remote_path: _Entry(**entry_data) for remote_path, entry_data in json.load(f).items()}
+        except (FileNotFoundError, ValueError, TypeError):
+            return {}
+
+    def _save(self):
+        # write to a temporary file first so that a crash never leaves a truncated cache behind
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({remote_path: asdict(entry) for remote_path, entry in self._entries.items()}, f)
+        os.replace(temp_path, self._path)
@@ -0,0 +1,237 @@
+from typing import Iterable, Iterator
+from array import array
+import hashlib
+
+
+PACKAGE_MONIKER_SUFFIX = '__8wekyb3d8bbwe'
+
+
+class _InternTable:
+    """Gives every distinct string a small integer code."""
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self._codes: dict[str, int] = {}
+
+    def get_code(self, string: str) -> int:
+        code = self._codes.get(string)
+        if code is None:
+            code = self._codes[string] = len(self.strings)
+            self.strings.append(string)
+        return code
+
+    def find_code(self, string: str) -> int | None:
+        return self._codes.get(string)
+
+
+class RecordStore:
+    """Update strings ("<guid> <package moniker>") packed into arrays, in insertion order and without duplicates.
+
+    A GUID takes 16 bytes of one buffer and a package moniker of the form <prefix>_<name>_<architecture>__8wekyb3d8bbwe
+    is split into codes of interned prefixes, names and architectures, so that only the few distinct parts are Python
+    strings. Records of any other form are kept as they are. Strings are only built again on access.
+    """
+
+    def __init__(self, update_strings: Iterable[str] = ()):
+        self._guids = bytearray()
+        self._prefix_codes = array('H')
+        self._name_codes = array('I')
+        self._architecture_codes = array('B')
+        self._prefixes = _InternTable()
+        self._names = _InternTable()
+        self._architectures = _InternTable()
+        # record index -> update string, for the records that don't fit the packed form
+        self._irregular_update_strings: dict[int, str] = {}
+        # open addressing hash table keyed by GUID, holding record indexes + 1 with 0 marking empty slots
+        self._table = array('I', bytes(4 * 8))
+        self.extend(update_strings)
+
+    def __len__(self) -> int:
+        return len(self._name_codes)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[index] for index in range(len(self)))
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        irregular_update_string = self._irregular_update_strings.get(index)
+        if irregular_update_string is not None:
+            return irregular_update_string
+        return f'{self.get_guid(index)} {self.get_package_moniker(index)}'
+
+    def __contains__(self, update_string: str) -> bool:
+        return self._find(*self._pack(update_string, intern=False)) is not None
+
+    def get_guid(self, index: int) -> str:
+        if index in self._irregular_update_strings:
+            return self._irregular_update_strings[index].split(' ', 1)[0]
+        return _format_guid(self._guids[index * 16:index * 16 + 16])
+
+    def get_package_moniker(self, index: int) -> str:
+        if index in self._irregular_update_strings:
+            return self._irregular_update_strings[index].split(' ', 1)[1]
+        return (
+            f'{self._prefixes.strings[self._prefix_codes[index]]}_{self._names.strings[self._name_codes[index]]}_'
+            f'{self._architectures.strings[self._architecture_codes[index]]}{PACKAGE_MONIKER_SUFFIX}'
+        )
+
+    def to_strings(self) -> list[str]:
+        return list(self)
+
+    def append(self, update_string: str) -> bool:
+        """Returns False if the record is already stored."""
+        guid_bytes, codes, irregular_update_string = self._pack(update_string, intern=True)
+        if self._find(guid_bytes, codes, irregular_update_string) is not None:
+            return False
+
+        index = len(self)
+        self._guids += guid_bytes
+        self._prefix_codes.append(codes[0])
+        self._name_codes.append(codes[1])
+        self._architecture_codes.append(codes[2])
+        if irregular_update_string is not None:
+            self._irregular_update_strings[index] = irregular_update_string
+
+        if (index + 1) * 2 > len(self._table):
+            self._rehash(len(self._table) * 2)
+        else:
+            self._insert(index)
+        return True
+
+    def extend(self, update_strings: Iterable[str]) -> list[str]:
+        """Appends the records that aren't stored yet and returns them."""
+        return [update_string for update_string in update_strings if self.append(update_string)]
+
+    def truncate(self, length: int):
+        """Drops the records from `length` on, e.g. to undo the last appends."""
+        if length >= len(self):
+            return
+        del self._guids[length * 16:]
+        del self._prefix_codes[length:]
+        del self._name_codes[length:]
+        del self._architecture_codes[length:]
+        for index in [index for index in self._irregular_update_strings if index >= length]:
+            del self._irregular_update_strings[index]
+        # entries can't be removed from an open addressing table one by one
+        self._rehash(len(self._table))
+
+    def find_last(self, guid: str) -> int | None:
+        """Returns the index of the last record with the GUID."""
+        guid_bytes = _get_guid_bytes(guid)
+        last_index = None
+        for index in self._probe(guid_bytes):
+            if self._guids[index * 16:index * 16 + 16] == guid_bytes and self.get_guid(index) == guid:
+                last_index = index if last_index is None else max(last_index, index)
+        return last_index
+
+    def find_all(self, package_moniker: str) -> list[int]:
+        """Returns the indexes of the records with the package moniker, in order."""
+        codes = self._split_package_moniker(package_moniker, intern=False)
+        if codes is None:
+            return [
+                index for index, update_string in self._irregular_update_strings.items()
+                if update_string.split(' ', 1)[1] == package_moniker
+            ]
+        prefix_code, name_code, architecture_code = codes
+        return [
+            index for index in range(len(self))
+            if self._name_codes[index] == name_code and self._prefix_codes[index] == prefix_code and
+            self._architecture_codes[index] == architecture_code and index not in self._irregular_update_strings
+        ]
+
+    def iter_versions(self) -> Iterator[tuple[str | None, str | None, str]]:
+        """Yields (name, architecture, guid) of every record, or (None, None, update string) for the irregular ones."""
+        names = self._names.strings
+        architectures = self._architectures.strings
+        for index in range(len(self)):
+            irregular_update_string = self._irregular_update_strings.get(index)
+            if irregular_update_string is not None:
+                yield None, None, irregular_update_string
+            else:
+                yield (
+                    names[self._name_codes[index]], architectures[self._architecture_codes[index]],
+                    _format_guid(self._guids[index * 16:index * 16 + 16])
+                )
+
+    def _pack(self, update_string: str, intern: bool) -> tuple[bytes, tuple[int, int, int], str | None]:
+        guid, _, package_moniker = update_string.partition(' ')
+        guid_bytes = _get_guid_bytes(guid)
+        codes = None
+        if '.EAppx' not in package_moniker and _format_guid(guid_bytes) == guid:
+            codes = self._split_package_moniker(package_moniker, intern)
+        if codes is None:
+            return guid_bytes, (0, 0, 0), update_string
+        return guid_bytes, codes, None
+
+    def _split_package_moniker(self, package_moniker: str, intern: bool) -> tuple[int, int, int] | None:
+        if not package_moniker.endswith(PACKAGE_MONIKER_SUFFIX):
+            return None
+        parts = package_moniker.removesuffix(PACKAGE_MONIKER_SUFFIX).split('_')
+        if len(parts) != 3 or ' ' in package_moniker:
+            return None
+        if intern:
+            codes = (
+                self._prefixes.get_code(parts[0]),
+                self._names.get_code(parts[1]),
+                self._architectures.get_code(parts[2])
+            )
+            # codes that don't fit the arrays are kept as irregular records instead
+            return codes if codes[0] < 2 ** 16 and codes[2] < 2 ** 8 else None
+        codes = (
+            self._prefixes.find_code(parts[0]),
+            self._names.find_code(parts[1]),
+            self._architectures.find_code(parts[2])
+        )
+        if (codes[0] or 0) >= 2 ** 16 or (codes[2] or 0) >= 2 ** 8:
+            return None
+        # a part that has never been interned can't be part of a stored record, so -1 matches nothing
+        return tuple(-1 if code is None else code for code in codes)
+
+    def _find(self, guid_bytes: bytes, codes: tuple[int, int, int], irregular_update_string: str | None) -> int | None:
+        for index in self._probe(guid_bytes):
+            if self._guids[index * 16:index * 16 + 16] != guid_bytes:
+                continue
+            if irregular_update_string is not None:
+                if self._irregular_update_strings.get(index) == irregular_update_string:
+                    return index
+            elif index not in self._irregular_update_strings and codes == (
+                    self._prefix_codes[index], self._name_codes[index], self._architecture_codes[index]
+            ):
+                return index
+        return None
+
+    def _probe(self, guid_bytes: bytes) -> Iterator[int]:
+        mask = len(self._table) - 1
+        slot = int.from_bytes(guid_bytes[:8], 'little') & mask
+        while self._table[slot]:
+            yield self._table[slot] - 1
+            slot = (slot + 1) & mask
+
+    def _insert(self, index: int):
+        mask = len(self._table) - 1
+        slot = int.from_bytes(self._guids[index * 16:index * 16 + 8], 'little') & mask
+        while self._table[slot]:
+            slot = (slot + 1) & mask
+        self._table[slot] = index + 1
+
+    def _rehash(self, size: int):
+        self._table = array('I', bytes(4 * size))
+        for index in range(len(self)):
+            self._insert(index)
+
+
+def _get_guid_bytes(guid: str) -> bytes:
+    try:
+        guid_bytes = bytes.fromhex(guid.replace('-', ''))
+    except ValueError:
+        guid_bytes = b''
+    if len(guid_bytes) == 16:
+        return guid_bytes
+    # only used for hashing, the record keeps the original string
+    return hashlib.blake2b(guid.encode(), digest_size=16).digest()
+
+
+def _format_guid(guid_bytes: bytes | bytearray) -> str:
+    hex_ = guid_bytes.hex()
+    return f'{hex_[:8]}-{hex_[8:12]}-{hex_[12:16]}-{hex_[16:20]}-{hex_[20:]}'
@@ -1,38 +1,209 @@
+from typing import Callable, Collection, TypeVar
 import logging
 
 import json
-from github import Github
+import base64
+import hashlib
+import time
+from github import Github, GithubException, RateLimitExceededException, InputGitTreeElement
+from github.Repository import Repository
+
+from readcache import ReadCache
+from githubbudget import GitHubBudget, RateLimitDeferred
+import metrics
+
+
+DEFAULT_BASE_URL = 'https://api.github.com'
+
+_REQUESTS = metrics.Counter('bdb_github_requests_total', 'GitHub API requests, by endpoint.', ('endpoint',))
+_FILES = metrics.Counter('bdb_github_files_total', 'Files passed to update_files(), by result.', ('result',))
+_READ_CACHE = metrics.Counter('bdb_github_read_cache_total', 'Conditional reads of files, by result.', ('result',))
+_RATE_LIMIT_REMAINING = metrics.Gauge('bdb_github_rate_limit_remaining', 'The last seen X-RateLimit-Remaining.')
+
+T = TypeVar('T')
 
 
 class RemoteRepositoryManager:
-    def __init__(self):
-        self._repo = Github(self._get_token()).get_user().get_repo('BedrockDB')
+    """Reads and commits the DB files, with every request going through a GitHubBudget.
+
+    When a rate limit would take too long to wait out, RateLimitDeferred is raised so that the work can be retried
+    and coalesced with newer changes in a later cycle.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, read_cache: ReadCache | None = None,
+                 budget: GitHubBudget | None = None, token_path: str = 'token.txt'):
+        # no request is made until the user's login is needed
+        self._user = Github(self._get_token(token_path), base_url=base_url).get_user()
+        self._read_cache = read_cache if read_cache is not None else ReadCache()
+        self._budget = budget if budget is not None else GitHubBudget()
+        self._lazy_repo: Repository | None = None
+        # the last known Git blob SHA of every file, used to skip files that would not change
+        self._blob_shas: dict[str, str] = {}
+
+    @property
+    def _repo(self) -> Repository:
+        # looked up on first use rather than on construction, so that creating a manager costs no requests
+        if self._lazy_repo is None:
+            self._lazy_repo = self._request(
+                ('user', 'repos'), False, lambda: self._user.get_repo('BedrockDB')
+            )
+        return self._lazy_repo
 
     def get_text(self, remote_path: str) -> str:
-        return self._repo.get_contents(remote_path).decoded_content.decode().replace('\r', '')
+        contents = self._request(('contents',), False, lambda: self._repo.get_contents(remote_path))
+        self._blob_shas[remote_path] = contents.sha
+        return contents.decoded_content.decode().replace('\r', '')
 
-    def update_file(self, new_text: str, remote_path: str, message: str):
-        new_text = new_text.replace('\r', '')
+    def get_json(self, remote_path: str, is_optional: bool = False) -> object:
+        """Returns the parsed file, reusing the cached copy when GitHub answers 304 Not Modified.
 
-        contents = self._repo.get_contents(remote_path)
+        Conditional requests that return 304 don't count against the rate limit. Optional reads raise
+        RateLimitDeferred while the remaining budget is kept for commits.
+        """
+        if is_optional and not self._budget.can_read_optional():
+            raise RateLimitDeferred(f'GitHub: Skipping the optional read of "{remote_path}" to save the rate limit.')
 
-        # don't use get_text() to avoid unnecessary API calls
-        old_text = contents.decoded_content.decode().replace('\r', '')
-        if old_text == new_text:
-            logging.info(
-                f'GitHub: Skipping the file "{remote_path}" - no difference in content with the received data.'
+        etag = self._read_cache.get_etag(remote_path)
+        repo = self._repo
+
+        def request_contents() -> tuple[int, dict, str]:
+            # PyGithub doesn't expose conditional requests for contents, so the requester is used directly
+            status, headers, output = repo._requester.requestJson(
+                'GET', f'{repo.url}/contents/{remote_path}', headers={'If-None-Match': etag} if etag else None
             )
-            return
+            if status >= 400:
+                raise GithubException(status, json.loads(output) if output else None, headers)
+            return status, headers, output
+
+        status, headers, output = self._request(('contents',), False, request_contents)
+
+        if status == 304 and etag:
+            _READ_CACHE.inc(result='hit')
+            value, self._blob_shas[remote_path] = self._read_cache.hit(remote_path)
+            return value
+        _READ_CACHE.inc(result='miss')
+
+        data = json.loads(output)
+        self._blob_shas[remote_path] = data['sha']
+        value = json.loads(base64.b64decode(data['content']).decode().replace('\r', ''))
+        self._read_cache.put(remote_path, headers.get('etag'), data['sha'], value)
+        return value
+
+    def update_file(self, new_text: str, remote_path: str, message: str):
+        self.update_files({remote_path: new_text}, message)
+
+    @metrics.timed('github_update_files')
+    def update_files(self, new_texts: dict[str, str], message: str, replaceable_paths: Collection[str] = ()) -> bool:
+        """Commits all changed files at once with a single tree, commit and ref update.
+
+        Files only ever grow, except for those in `replaceable_paths`. Missing files are created.
+        Nothing is committed if any file is invalid, so that the remote files never get out of step with each other.
+        Returns whether every file is up to date afterwards.
+        """
+        new_texts = {remote_path: new_text.replace('\r', '') for remote_path, new_text in new_texts.items()}
+        new_blob_shas = {remote_path: get_blob_sha(new_text) for remote_path, new_text in new_texts.items()}
+
+        # files whose last known blob is identical to the new content are skipped without any API calls
+        changed_paths = []
+        for remote_path in new_texts:
+            if self._blob_shas.get(remote_path) == new_blob_shas[remote_path]:
+                self._log_unchanged_file(remote_path)
+                _FILES.inc(result='unchanged')
+            else:
+                changed_paths.append(remote_path)
+        if not changed_paths:
+            return True
+
+        repo = self._repo
+        ref = self._request(('git/refs',), False, lambda: repo.get_git_ref('heads/' + repo.default_branch))
+        base_commit = self._request(('git/commits',), False, lambda: repo.get_git_commit(ref.object.sha))
+        base_tree = self._request(
+            ('git/trees',), False, lambda: repo.get_git_tree(base_commit.tree.sha, recursive=True)
+        )
+        base_blob_shas = {element.path: element.sha for element in base_tree.tree if element.type == 'blob'}
+        base_blob_sizes = {element.path: element.size for element in base_tree.tree if element.type == 'blob'}
 
-        if not self._is_new_file_valid(new_text, old_text):
-            logging.info(f'GitHub: Skipping the file "{remote_path}" - the received data is invalid.')
-            return
+        tree_elements = []
+        committed_paths = []
+        invalid_paths = []
+        for remote_path in changed_paths:
+            new_text = new_texts[remote_path]
 
-        self._repo.update_file(contents.path, message, new_text, contents.sha)
+            if base_blob_shas.get(remote_path) == new_blob_shas[remote_path]:
+                self._blob_shas[remote_path] = new_blob_shas[remote_path]
+                self._log_unchanged_file(remote_path)
+                _FILES.inc(result='unchanged')
+                continue
+
+            # the base tree has the size of every file, so growth is checked without downloading the old content
+            if remote_path in replaceable_paths:
+                old_size = 0
+            else:
+                old_size = base_blob_sizes.get(remote_path, 0)
+
+            if not self._is_new_file_valid(new_text, old_size):
+                logging.info(f'GitHub: The file "{remote_path}" is invalid - the received data is shorter or not JSON.')
+                _FILES.inc(result='invalid')
+                invalid_paths.append(remote_path)
+                continue
+
+            # the content is sent inline, so GitHub creates the blob as part of the tree request
+            tree_elements.append(InputGitTreeElement(remote_path, '100644', 'blob', content=new_text))
+            committed_paths.append(remote_path)
+
+        if invalid_paths:
+            logging.info(f'GitHub: Skipping the commit - {len(invalid_paths)} of the files are invalid.')
+            return False
+        if not tree_elements:
+            return True
+
+        tree = self._request(('git/trees',), True, lambda: repo.create_git_tree(tree_elements, base_commit.tree))
+        commit = self._request(('git/commits',), True, lambda: repo.create_git_commit(message, tree, [base_commit]))
+        self._request(('git/refs',), True, lambda: ref.edit(commit.sha))
+
+        _FILES.inc(len(committed_paths), result='written')
+        for remote_path in committed_paths:
+            self._blob_shas[remote_path] = new_blob_shas[remote_path]
+            self._read_cache.invalidate(remote_path)
+        return True
+
+    def _request(self, endpoints: tuple[str, ...], is_write: bool, func: Callable[[], T]) -> T:
+        """Calls `func` once the budget allows it, retrying once after a rate limit error."""
+        for attempt in range(2):
+            if is_write:
+                self._budget.acquire_write()
+            else:
+                self._budget.acquire_read()
+
+            try:
+                return func()
+            except GithubException as e:
+                if not _is_rate_limit_error(e):
+                    raise
+                logging.warning(f'GitHub: Rate limit error {e.status} on {"/".join(endpoints)}.')
+                self._budget.back_off(_get_retry_after(e))
+                if attempt > 0:
+                    raise RateLimitDeferred('GitHub: The rate limit has been exceeded again.') from e
+            finally:
+                self._record_requests(endpoints)
+
+    def _record_requests(self, endpoints: tuple[str, ...]):
+        for endpoint in endpoints:
+            _REQUESTS.inc(endpoint=endpoint)
+        # PyGithub keeps the rate limit headers of the last response
+        requester = self._user._requester
+        remaining = requester.rate_limiting[0]
+        self._budget.update(remaining, requester.rate_limiting_resettime)
+        if remaining >= 0:
+            _RATE_LIMIT_REMAINING.set(remaining)
+
+    @staticmethod
+    def _log_unchanged_file(remote_path: str):
+        logging.info(f'GitHub: Skipping the file "{remote_path}" - no difference in content with the received data.')
 
     @staticmethod
-    def _is_new_file_valid(new_text: str, old_text: str) -> bool:
-        if len(new_text) <= len(old_text):
+    def _is_new_file_valid(new_text: str, old_size: int) -> bool:
+        if len(new_text.encode()) <= old_size:
             return False
         try:
             _ = json.loads(new_text)
@@ -41,14 +212,37 @@ class RemoteRepositoryManager:
         return True
 
     @staticmethod
-    def _get_token() -> str:
-        with open('token.txt') as f:
+    def _get_token(token_path: str) -> str:
+        with open(token_path) as f:
             lines = f.readlines()
         if not lines:
             raise TokenNotFound
         return lines[0]
 
 
+def _is_rate_limit_error(e: GithubException) -> bool:
+    if isinstance(e, RateLimitExceededException) or e.status == 429:
+        return True
+    message = e.data.get('message', '') if isinstance(e.data, dict) else ''
+    # secondary rate limits come back as a generic 403
+    return e.status == 403 and 'rate limit' in message.lower()
+
+
+def _get_retry_after(e: GithubException) -> float | None:
+    headers = {name.lower(): value for name, value in (e.headers or {}).items()}
+    if headers.get('retry-after', '').isdigit():
+        return float(headers['retry-after'])
+    if headers.get('x-ratelimit-remaining') == '0' and headers.get('x-ratelimit-reset', '').isdigit():
+        return max(int(headers['x-ratelimit-reset']) - time.time(), 0)
+    return None
+
+
+def get_blob_sha(text: str) -> str:
+    """Returns the SHA-1 Git assigns to a blob with the given content."""
+    data = text.encode()
+    return hashlib.sha1(b'blob ' + str(len(data)).encode() + b'\0' + data).hexdigest()
+
+
 class TokenNotFound(Exception):
     def __init__(self, *args):
         super().__init__(*args if args else 'The token has not been found.')
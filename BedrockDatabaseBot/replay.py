@@ -0,0 +1,65 @@
+from typing import TYPE_CHECKING
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import os
+
+from net import parsers
+from database import Database
+from responsearchive import ResponseArchive, ArchivedResponse
+
+if TYPE_CHECKING:
+    from requester import Channel
+
+
+def replay(
+        archive: ResponseArchive,
+        channels: dict[str, 'Channel'],
+        beta_strings: list[str] | None = None,
+        max_workers: int | None = None
+) -> Database:
+    """Parses every archived response again and merges the update strings into a fresh DB.
+
+    The responses are parsed concurrently in worker processes, while the merge follows the archive order, so the result
+    doesn't depend on the number of workers. The update strings are merged into the DB slot of their channel, and
+    responses of channels missing from `channels` are skipped.
+    """
+    archived_responses = [
+        archived_response for archived_response in archive.get_responses()
+        if archived_response.channel_name in channels
+    ]
+    logging.info(f'Replaying {len(archived_responses)} archived SyncUpdates responses.')
+
+    db = Database([], list(beta_strings or []), [])
+    if not archived_responses:
+        return db
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(archived_responses))
+    jobs = [
+        (archived_response, channels[archived_response.channel_name].package_moniker_prefix)
+        for archived_response in archived_responses
+    ]
+    # bigger chunks amortize the inter-process overhead, while four chunks per worker keep them evenly loaded
+    chunksize = max(len(jobs) // (max_workers * 4), 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for archived_response, update_strings in zip(
+                archived_responses, executor.map(_parse_archived_response, jobs, chunksize=chunksize)
+        ):
+            if update_strings is None:
+                logging.error(f'The archived response {archived_response.path} could not be parsed. Skipping it.')
+                continue
+            slot = channels[archived_response.channel_name].slot
+            db.merge(update_strings if slot == 'release' else [], update_strings if slot == 'preview' else [])
+    return db
+
+
+def _parse_archived_response(job: tuple[ArchivedResponse, str]) -> list[str] | None:
+    archived_response, package_moniker_prefix = job
+    try:
+        response = ResponseArchive.read(archived_response)
+        return [
+            str(update_info)
+            for update_info in parsers.SyncUpdatesResponseParser([response], package_moniker_prefix)
+        ]
+    except (OSError, EOFError, parsers.ParsingError, SyntaxError):
+        # ParseError of ElementTree is a SyntaxError
+        return None
@@ -1,10 +1,16 @@
-from typing import Callable
-from xml.etree.ElementTree import Element
-import json
+from typing import Callable, Iterator
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
 
 from net.structs import UpdateInfo, Cookie
 from net import envelope_factories, parsers, soap
+from cookiemanager import CookieManager
+from syncstate import SyncStateStore
+from responsearchive import ResponseArchive
+from env import ARCHIVE_PATH, COOKIE_PATH, SYNC_STATE_PATH
+import metrics
 
 URL = 'https://fe3cr.delivery.mp.microsoft.com/ClientWebService/client.asmx'
 SECURED_URL = 'https://fe3cr.delivery.mp.microsoft.com/ClientWebService/client.asmx/secured'
@@ -22,56 +28,158 @@ CATEGORY_IDS = {
     'preview': '188f32fc-5eaa-45a8-9f78-7dde4322d131'
 }
 
+# the DB slots that synced updates are stored in, see Database.update()
+SLOTS = ['release', 'preview']
 
-def run() -> list[UpdateInfo]:
-    sync_updates_response_envelope = _get_sync_updates_response_envelope()
-    sync_updates = parsers.parse_sync_updates_response_envelope(sync_updates_response_envelope)
 
-    minecraft_update_info_list = [
-        update_info for update_info in sync_updates.new_updates
-        if update_info.package_moniker.startswith('Microsoft.Minecraft')
-    ]
+@dataclass(frozen=True, slots=True)
+class Channel:
+    name: str
+    # the Microsoft Store product ID of the app whose updates the channel returns
+    product_id: str
+    # the DB slot the update strings of this channel are stored in
+    slot: str
+    category_id: str
+    package_moniker_prefix: str
 
-    logging.info(
-        str(len(minecraft_update_info_list)) +
-        ' Minecraft UpdateInfo items have been returned. ' +
-        str(minecraft_update_info_list)
-    )
 
-    _save_last_cookie(sync_updates.new_cookie)
-    return minecraft_update_info_list
+# filled by register_channel()
+CHANNELS: dict[str, Channel] = {}
 
 
-def _load_last_cookie() -> Cookie:
-    with open('last_cookie.json') as f:
-        cookie_data = json.load(f)
-    return Cookie(cookie_data['encrypted_data'], cookie_data['expiration'])
+def register_channel(channel: Channel):
+    """Adds a channel to those synced by run(). Raises ValueError if its updates would have no DB slot."""
+    if channel.slot not in SLOTS:
+        raise ValueError(f'The {channel.name} channel has no DB slot - "{channel.slot}" is not one of {SLOTS}.')
+    CHANNELS[channel.name] = channel
 
 
-def _save_last_cookie(cookie: Cookie):
-    with open('last_cookie.json', 'w') as f:
-        json.dump({'encrypted_data': cookie.encrypted_data, 'expiration': cookie.expiration}, f, indent=4)
+# Mojang seems to have stopped releasing betas for Windows, so the beta channel is not synced.
+register_channel(Channel(
+    'release', PRODUCT_IDS['release'], 'release', CATEGORY_IDS['release'], 'Microsoft.MinecraftUWP_'
+))
+register_channel(Channel(
+    'preview', PRODUCT_IDS['preview'], 'preview', CATEGORY_IDS['preview'], 'Microsoft.MinecraftWindowsBeta_'
+))
 
+MAX_WORKERS = 4
 
-def _get_sync_updates_response_envelope():
-    func: Callable[[Cookie], Element] = lambda cookie: soap.post_envelope(
+_RECEIVED_UPDATE_INFOS = metrics.Counter(
+    'bdb_received_update_infos_total', 'Minecraft UpdateInfo items received, by channel.', ('channel',)
+)
+_UNCHANGED_RESPONSES = metrics.Counter(
+    'bdb_unchanged_sync_updates_responses_total',
+    'SyncUpdates responses skipped as unchanged, by channel.',
+    ('channel',)
+)
+
+
+cookie_manager = CookieManager(SECURED_URL, COOKIE_PATH)
+sync_state_store = SyncStateStore(SYNC_STATE_PATH)
+# set to None to stop archiving the responses
+response_archive: ResponseArchive | None = ResponseArchive(ARCHIVE_PATH)
+
+# NewUpdates digests of the last run by channel name, persisted by mark_as_stored()
+_received_digests: dict[str, str] = {}
+
+
+def configure(state_path: str, is_archiving: bool = True):
+    """Keeps the cookie, the sync state and the archived responses under `state_path`."""
+    global cookie_manager, sync_state_store, response_archive
+    cookie_manager = CookieManager(SECURED_URL, os.path.join(state_path, COOKIE_PATH))
+    sync_state_store = SyncStateStore(os.path.join(state_path, SYNC_STATE_PATH))
+    response_archive = ResponseArchive(os.path.join(state_path, ARCHIVE_PATH)) if is_archiving else None
+
+
+@metrics.timed('sync_updates')
+def run(channels: list[Channel] | None = None) -> dict[str, list[UpdateInfo]]:
+    """Syncs all channels concurrently and returns the received UpdateInfo items by channel name."""
+    channels = channels if channels is not None else list(CHANNELS.values())
+    for channel in channels:
+        if CHANNELS.get(channel.name) != channel:
+            raise ValueError(f'The {channel.name} channel has not been registered.')
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(channels)) or 1, thread_name_prefix='Sync') as executor:
+        update_info_lists = list(executor.map(_sync_channel, channels))
+
+    return {channel.name: update_info_list for channel, update_info_list in zip(channels, update_info_lists)}
+
+
+def get_update_strings_by_slot(update_info_lists: dict[str, list[UpdateInfo]]) -> dict[str, list[str]]:
+    """Returns the update strings of the items returned by run() by the DB slot of their channel."""
+    _check_channels_registered(update_info_lists)
+    update_strings = {slot: [] for slot in SLOTS}
+    for channel_name, update_info_list in update_info_lists.items():
+        update_strings[CHANNELS[channel_name].slot] += [str(update_info) for update_info in update_info_list]
+    return update_strings
+
+
+def mark_as_stored(update_info_lists: dict[str, list[UpdateInfo]]):
+    """Call once the items are in the DB, so that later syncs only return what's new."""
+    _check_channels_registered(update_info_lists)
+    for channel_name, update_info_list in update_info_lists.items():
+        sync_state_store.add_known_revision_ids(
+            channel_name,
+            [update_info.revision_id for update_info in update_info_list if update_info.revision_id is not None]
+        )
+        digest = _received_digests.pop(channel_name, None)
+        if digest is not None:
+            sync_state_store.set_digest(channel_name, digest)
+
+
+def _check_channels_registered(update_info_lists: dict[str, list[UpdateInfo]]):
+    # items of other channels would be synced and marked as known without ever being stored
+    unregistered_channel_names = [channel_name for channel_name in update_info_lists if channel_name not in CHANNELS]
+    if unregistered_channel_names:
+        raise ValueError(f'The channels {unregistered_channel_names} have not been registered.')
+
+
+def _sync_channel(channel: Channel) -> list[UpdateInfo]:
+    # read at once, since the digest has to be known before parsing
+    response = b''.join(_get_sync_updates_response_chunks(channel))
+
+    digest = parsers.get_new_updates_digest(response)
+    if digest is not None:
+        _received_digests[channel.name] = digest
+    if digest is not None and digest == sync_state_store.get_digest(channel.name):
+        logging.info(f'The {channel.name} SyncUpdates response is the same as the last stored one. Skipping it.')
+        _UNCHANGED_RESPONSES.inc(channel=channel.name)
+        # only the new cookie is parsed
+        sync_updates_parser = parsers.SyncUpdatesResponseParser([parsers.strip_new_updates(response)])
+        list(sync_updates_parser)
+        cookie_manager.set_cookie(sync_updates_parser.new_cookie)
+        return []
+
+    if response_archive is not None:
+        try:
+            response_archive.add(channel.name, response)
+        except OSError as e:
+            logging.error(str(e) + ' The response has not been archived.')
+
+    sync_updates_parser = parsers.SyncUpdatesResponseParser([response], channel.package_moniker_prefix)
+    update_info_list = list(sync_updates_parser)
+
+    # the list is only turned into a string if the record is emitted, and then in the logging thread
+    logging.info('%d %s UpdateInfo items have been returned. %s', len(update_info_list), channel.name, update_info_list)
+
+    _RECEIVED_UPDATE_INFOS.inc(len(update_info_list), channel=channel.name)
+    cookie_manager.set_cookie(sync_updates_parser.new_cookie)
+    return update_info_list
+
+
+def _get_sync_updates_response_chunks(channel: Channel) -> Iterator[bytes]:
+    cached_update_ids = sync_state_store.get_known_revision_ids(channel.name)
+    func: Callable[[Cookie], Iterator[bytes]] = lambda cookie: soap.post_envelope_streamed(
             SECURED_URL,
-            envelope_factories.make_sync_updates_envelope(
-                SECURED_URL, cookie, [CATEGORY_IDS['release'], CATEGORY_IDS['preview']]
+            envelope_factories.render_sync_updates_envelope(
+                SECURED_URL, cookie, [channel.category_id], cached_update_ids
             )
         )
 
+    cookie = cookie_manager.get_cookie()
     try:
-        return func(_load_last_cookie())
-    except (soap.SOAPError, FileNotFoundError) as e:
+        return func(cookie)
+    # a SOAPTransportError is raised as it is, since a new cookie doesn't help when the service can't be reached
+    except soap.SOAPError as e:
         logging.error(str(e) + ' Trying again.')
-
-        get_config_response_envelope = soap.post_envelope(
-            SECURED_URL, envelope_factories.make_get_config_envelope(SECURED_URL)
-        )
-        last_change = parsers.parse_get_config_response_envelope(get_config_response_envelope).last_change
-
-        get_cookie_response_envelope = soap.post_envelope(
-            SECURED_URL, envelope_factories.make_get_cookie_envelope(SECURED_URL, last_change)
-        )
-        return func(parsers.parse_get_cookie_response_envelope(get_cookie_response_envelope))
+        return func(cookie_manager.refresh(cookie))
@@ -0,0 +1,110 @@
+from typing import Iterator
+from dataclasses import dataclass
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+INDEX_FILENAME = 'index.jsonl'
+
+
+@dataclass(frozen=True, slots=True)
+class ArchivedResponse:
+    channel_name: str
+    sha256: str
+    path: str
+
+
+class ResponseArchive:
+    """Content-addressed store of raw SyncUpdates responses, gzipped by channel and SHA-256.
+
+    A response is stored at <path>/<channel>/<sha256[:2]>/<sha256>.xml.gz. The order in which responses have been
+    received is kept in an append-only index, so that replaying the archive inserts the update strings in the same
+    order as the cycles did. A response that is already archived isn't stored or indexed again.
+    """
+
+    def __init__(self, path: str = 'responses', compression_level: int = 6):
+        self._path = path
+        self._compression_level = compression_level
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def add(self, channel_name: str, response: bytes) -> str:
+        """Returns the SHA-256 of the response."""
+        sha256 = hashlib.sha256(response).hexdigest()
+        response_path = self._get_response_path(channel_name, sha256)
+        if os.path.exists(response_path):
+            return sha256
+
+        compressed_response = gzip.compress(response, self._compression_level, mtime=0)
+        with self._lock:
+            if os.path.exists(response_path):
+                return sha256
+            os.makedirs(os.path.dirname(response_path), exist_ok=True)
+            # the response is complete before it's indexed, so a crash leaves at most an unindexed file behind
+            temp_path = response_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(compressed_response)
+            os.replace(temp_path, response_path)
+            with open(os.path.join(self._path, INDEX_FILENAME), 'a') as f:
+                f.write(json.dumps({'time': round(time.time(), 3), 'channel': channel_name, 'sha256': sha256}) + '\n')
+        return sha256
+
+    def get_responses(self) -> list[ArchivedResponse]:
+        """Returns the archived responses in the order they have been received.
+
+        Responses missing from the index, e.g. copied over from another archive, follow in path order.
+        """
+        archived_responses = {}
+        for entry in self._read_index():
+            response_path = self._get_response_path(entry['channel'], entry['sha256'])
+            if os.path.exists(response_path) and response_path not in archived_responses:
+                archived_responses[response_path] = ArchivedResponse(entry['channel'], entry['sha256'], response_path)
+
+        unindexed_responses = sorted(
+            (
+                archived_response for archived_response in self._scan()
+                if archived_response.path not in archived_responses
+            ),
+            key=lambda archived_response: archived_response.path
+        )
+        return list(archived_responses.values()) + unindexed_responses
+
+    @staticmethod
+    def read(archived_response: ArchivedResponse) -> bytes:
+        with open(archived_response.path, 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def _get_response_path(self, channel_name: str, sha256: str) -> str:
+        return os.path.join(self._path, channel_name, sha256[:2], sha256 + '.xml.gz')
+
+    def _read_index(self) -> Iterator[dict]:
+        try:
+            with open(os.path.join(self._path, INDEX_FILENAME)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # a line cut short by a crash
+                        continue
+                    if isinstance(entry, dict) and 'channel' in entry and 'sha256' in entry:
+                        yield entry
+        except FileNotFoundError:
+            return
+
+    def _scan(self) -> Iterator[ArchivedResponse]:
+        for channel_name in sorted(os.listdir(self._path)) if os.path.isdir(self._path) else ():
+            channel_path = os.path.join(self._path, channel_name)
+            if not os.path.isdir(channel_path):
+                continue
+            for dir_path, _, filenames in os.walk(channel_path):
+                for filename in filenames:
+                    if filename.endswith('.xml.gz'):
+                        yield ArchivedResponse(
+                            channel_name, filename.removesuffix('.xml.gz'), os.path.join(dir_path, filename)
+                        )
@@ -0,0 +1,252 @@
+from typing import Iterable
+import sqlite3
+
+from net.structs import UpdateInfo
+import dbparser
+from database import Database
+import metrics
+
+
+SLOTS = ['release', 'beta', 'preview']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS type (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS architecture (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS version (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    type_id INTEGER NOT NULL REFERENCES type(id),
+    UNIQUE (name, type_id)
+);
+-- one row per update string; the rowid keeps the order of the JSON files,
+-- version_id and architecture_id are NULL for strings left out of versions.json,
+-- revision_number and file_digests (space-separated) are NULL until set_update_metadata() is called for the GUID
+CREATE TABLE IF NOT EXISTS guid (
+    id INTEGER PRIMARY KEY,
+    slot TEXT NOT NULL,
+    value TEXT NOT NULL,
+    package_moniker TEXT NOT NULL,
+    version_id INTEGER REFERENCES version(id),
+    architecture_id INTEGER REFERENCES architecture(id),
+    revision_number INTEGER,
+    file_digests TEXT,
+    UNIQUE (slot, value, package_moniker)
+);
+CREATE INDEX IF NOT EXISTS guid_value_index ON guid (value);
+CREATE INDEX IF NOT EXISTS guid_package_moniker_index ON guid (package_moniker);
+CREATE INDEX IF NOT EXISTS guid_version_architecture_index ON guid (version_id, architecture_id);
+CREATE INDEX IF NOT EXISTS version_type_index ON version (type_id);
+"""
+# columns added since the first schema, which files created before them are migrated to
+_ADDED_GUID_COLUMNS = {'revision_number': 'INTEGER', 'file_digests': 'TEXT'}
+
+
+class SQLiteDatabase:
+    """The Database API backed by an SQLite file, which keeps the history between runs.
+
+    Changes made by update()/merge() are only persisted by commit(), so that they can be rolled back when the
+    following GitHub commit fails.
+    """
+
+    def __init__(self, path: str = 'bedrockdb.sqlite3'):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._add_missing_columns()
+        self._type_ids: dict[str, int] = {}
+        self._architecture_ids: dict[str, int] = {}
+
+    @property
+    def release_strings(self) -> list[str]:
+        return self._get_slot_strings('release')
+
+    @property
+    def beta_strings(self) -> list[str]:
+        return self._get_slot_strings('beta')
+
+    @property
+    def preview_strings(self) -> list[str]:
+        return self._get_slot_strings('preview')
+
+    def is_empty(self) -> bool:
+        return self._connection.execute('SELECT NOT EXISTS (SELECT 1 FROM guid)').fetchone()[0] == 1
+
+    @metrics.timed('database_load')
+    def load(self, release_strings: list[str], beta_strings: list[str], preview_strings: list[str]):
+        """Adds the missing strings of all slots and commits, e.g. to fill the store from the JSON files."""
+        for slot, update_strings in zip(SLOTS, (release_strings, beta_strings, preview_strings)):
+            self._merge_slot(slot, update_strings)
+        self.commit()
+
+    @metrics.timed('database_update')
+    def update(self, new_release_strings: list[str], new_preview_strings: list[str]) -> Database.UpdateResult:
+        """Returns whether the DB was updated."""
+        return Database.make_update_result(self.merge(new_release_strings, new_preview_strings))
+
+    def merge(self, new_release_strings: list[str], new_preview_strings: list[str]) -> Database.MergeResult:
+        """Appends the update strings that are not in the DB yet and returns them."""
+        return Database.MergeResult(
+            self._merge_slot('release', new_release_strings),
+            self._merge_slot('preview', new_preview_strings)
+        )
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+        # ids of rolled back rows may be handed out again
+        self._type_ids.clear()
+        self._architecture_ids.clear()
+
+    def get_update_string(self, guid: str) -> str | None:
+        row = self._connection.execute(
+            'SELECT value, package_moniker FROM guid WHERE value = ? ORDER BY id DESC LIMIT 1', (guid,)
+        ).fetchone()
+        return f'{row[0]} {row[1]}' if row else None
+
+    def set_update_metadata(self, update_infos: Iterable[UpdateInfo]):
+        """Stores the revision numbers and file digests of the updates, so that their GUIDs can be resolved in batches.
+
+        Like update(), the change is only persisted by commit().
+        """
+        self._connection.executemany(
+            'UPDATE guid SET revision_number = ?, file_digests = ? WHERE value = ? AND package_moniker = ?',
+            [
+                (update_info.revision_number, ' '.join(update_info.file_digests), update_info.update_id,
+                 update_info.package_moniker)
+                for update_info in update_infos if update_info.file_digests
+            ]
+        )
+
+    def get_update_infos(self, guids: Iterable[str]) -> list[UpdateInfo]:
+        """Returns the UpdateInfo items of the known GUIDs, with the metadata stored by set_update_metadata()."""
+        update_infos = []
+        for guid in guids:
+            row = self._connection.execute(
+                'SELECT value, package_moniker, revision_number, file_digests FROM guid WHERE value = ? '
+                'ORDER BY file_digests IS NULL, id DESC LIMIT 1',
+                (guid,)
+            ).fetchone()
+            if row:
+                update_infos.append(UpdateInfo(
+                    row[0], row[1], revision_number=row[2] or 1, file_digests=tuple(row[3].split()) if row[3] else ()
+                ))
+        return update_infos
+
+    def get_guids(self, package_moniker: str) -> list[str]:
+        return [
+            row[0] for row in self._connection.execute(
+                'SELECT value FROM guid WHERE package_moniker = ? ORDER BY id', (package_moniker,)
+            )
+        ]
+
+    def find_guids(
+            self,
+            name_pattern: str = '*',
+            type_: str | None = None,
+            architecture: str | None = None
+    ) -> list[str]:
+        """Returns the GUIDs of versions whose name matches a GLOB pattern, e.g. all x64 GUIDs for '1.20.*'."""
+        query = (
+            'SELECT guid.value FROM guid '
+            'JOIN version ON version.id = guid.version_id '
+            'JOIN type ON type.id = version.type_id '
+            'JOIN architecture ON architecture.id = guid.architecture_id '
+            'WHERE version.name GLOB ?'
+        )
+        parameters = [name_pattern]
+        if type_ is not None:
+            query += ' AND type.name = ?'
+            parameters.append(type_)
+        if architecture is not None:
+            query += ' AND architecture.name = ?'
+            parameters.append(architecture)
+        return [row[0] for row in self._connection.execute(query + ' ORDER BY guid.id', parameters)]
+
+    @metrics.timed('database_export')
+    def export_versions(self) -> list[dict]:
+        """Returns the same list as dbparser.run() on the three slots."""
+        rows = self._connection.execute(
+            'SELECT version.name, architecture.name, type.name, guid.value FROM guid '
+            'JOIN version ON version.id = guid.version_id '
+            'JOIN type ON type.id = version.type_id '
+            'JOIN architecture ON architecture.id = guid.architecture_id '
+            "ORDER BY CASE guid.slot WHEN 'release' THEN 0 WHEN 'beta' THEN 1 ELSE 2 END, guid.id"
+        )
+        return dbparser.build(dbparser.ParsedLine(*row) for row in rows)
+
+    def count_versioned_guids(self) -> int:
+        """Returns the number of GUIDs in the list returned by export_versions()."""
+        placeholders = ', '.join('?' * len(dbparser.AVAILABLE_ARCHITECTURES))
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM guid '
+            'JOIN architecture ON architecture.id = guid.architecture_id '
+            f'WHERE guid.version_id IS NOT NULL AND architecture.name IN ({placeholders})',
+            dbparser.AVAILABLE_ARCHITECTURES
+        ).fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def _add_missing_columns(self):
+        columns = {row[1] for row in self._connection.execute('PRAGMA table_info(guid)')}
+        for column, type_ in _ADDED_GUID_COLUMNS.items():
+            if column not in columns:
+                self._connection.execute(f'ALTER TABLE guid ADD COLUMN {column} {type_}')
+        self._connection.commit()
+
+    def _get_slot_strings(self, slot: str) -> list[str]:
+        return [
+            f'{row[0]} {row[1]}' for row in self._connection.execute(
+                'SELECT value, package_moniker FROM guid WHERE slot = ? ORDER BY id', (slot,)
+            )
+        ]
+
+    def _merge_slot(self, slot: str, new_update_strings: list[str]) -> list[str]:
+        added_update_strings = []
+        for new_update_string in new_update_strings:
+            guid, package_moniker = new_update_string.split(' ', 1)
+            # a read doesn't open a write transaction, so a merge that adds nothing leaves the file unlocked
+            if self._connection.execute(
+                'SELECT 1 FROM guid WHERE slot = ? AND value = ? AND package_moniker = ?', (slot, guid, package_moniker)
+            ).fetchone():
+                continue
+
+            try:
+                parsed_line = dbparser.parse_line(new_update_string, slot)
+            except ValueError:
+                parsed_line = None
+            version_id = self._get_version_id(parsed_line.name, slot) if parsed_line else None
+            architecture_id = self._get_id('architecture', self._architecture_ids, parsed_line.architecture) \
+                if parsed_line else None
+
+            cursor = self._connection.execute(
+                'INSERT OR IGNORE INTO guid (slot, value, package_moniker, version_id, architecture_id) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (slot, guid, package_moniker, version_id, architecture_id)
+            )
+            if cursor.rowcount:
+                added_update_strings.append(new_update_string)
+        return added_update_strings
+
+    def _get_version_id(self, name: str, type_: str) -> int:
+        type_id = self._get_id('type', self._type_ids, type_)
+        row = self._connection.execute(
+            'SELECT id FROM version WHERE name = ? AND type_id = ?', (name, type_id)
+        ).fetchone()
+        if row:
+            return row[0]
+        return self._connection.execute('INSERT INTO version (name, type_id) VALUES (?, ?)', (name, type_id)).lastrowid
+
+    def _get_id(self, table: str, cache: dict[str, int], name: str) -> int:
+        if name not in cache:
+            row = self._connection.execute(f'SELECT id FROM {table} WHERE name = ?', (name,)).fetchone()
+            cache[name] = row[0] if row else \
+                self._connection.execute(f'INSERT INTO {table} (name) VALUES (?)', (name,)).lastrowid
+        return cache[name]
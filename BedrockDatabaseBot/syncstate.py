@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+
+
+class SyncStateStore:
+    """Persists the revision IDs already stored in the DB per channel, to be sent as cached update IDs, and the digest
+    of the last stored SyncUpdates response.
+
+    The service leaves cached updates out of NewUpdates, so IDs must only be added once their updates have been
+    committed, otherwise a failed commit would lose them for good. The same goes for the digest, since a response with
+    a known digest isn't parsed. The cookie is persisted by CookieManager.
+    """
+
+    def __init__(self, path: str = 'sync_state.json'):
+        self._path = path
+        self._lock = threading.Lock()
+        self._known_revision_ids, self._digests = self._load()
+
+    def get_known_revision_ids(self, channel_name: str) -> list[int]:
+        with self._lock:
+            return sorted(self._known_revision_ids.get(channel_name, ()))
+
+    def add_known_revision_ids(self, channel_name: str, revision_ids: list[int]):
+        with self._lock:
+            known_revision_ids = self._known_revision_ids.setdefault(channel_name, set())
+            if known_revision_ids.issuperset(revision_ids):
+                return
+            known_revision_ids.update(revision_ids)
+            self._save()
+
+    def get_digest(self, channel_name: str) -> str | None:
+        with self._lock:
+            return self._digests.get(channel_name)
+
+    def set_digest(self, channel_name: str, digest: str):
+        with self._lock:
+            if self._digests.get(channel_name) == digest:
+                return
+            self._digests[channel_name] = digest
+            self._save()
+
+    def reset(self):
+        """Makes the next syncs return every update again."""
+        with self._lock:
+            self._known_revision_ids = {}
+            self._digests = {}
+            self._save()
+
+    def _load(self) -> tuple[dict[str, set[int]], dict[str, str]]:
+        try:
+            with open(self._path) as f:
+                state = json.load(f)
+            return (
+                {channel_name: set(revision_ids) for channel_name, revision_ids in state['revision_ids'].items()},
+                dict(state.get('digests', {}))
+            )
+        except (FileNotFoundError, ValueError, KeyError, TypeError, AttributeError):
+            return {}, {}
+
+    def _save(self):
+        temp_path = self._path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(
+                {
+                    'revision_ids': {
+                        channel_name: sorted(revision_ids)
+                        for channel_name, revision_ids in self._known_revision_ids.items()
+                    },
+                    'digests': self._digests
+                },
+                f
+            )
+        os.replace(temp_path, self._path)
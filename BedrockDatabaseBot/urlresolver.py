@@ -0,0 +1,144 @@
+from typing import Callable, Iterable
+from urllib.parse import urlsplit, parse_qs
+import logging
+import threading
+import time
+
+from net.structs import UpdateInfo, FileLocation
+from net import envelope_factories, parsers, soap
+
+
+# the other file locations of an update are block maps and mirrors of the same package
+PACKAGE_URL_PREFIX = 'http://tlu.dl.delivery.mp.microsoft.com/'
+
+
+class URLResolver:
+    """Turns updates into package download URLs, many updates per secured GetExtendedUpdateInfo2 request.
+
+    Nothing guarantees the order of the returned file locations, so they're matched to the updates of a batch by the
+    file digests of the UpdateInfo items. Bare GUIDs are looked up with `get_update_infos`, e.g. the method of the local
+    DB, which has the digests and revision numbers stored at sync time. Updates whose digests are still unknown and
+    those whose digest isn't returned are resolved one per request instead. URLs are cached until shortly before the
+    expiry in their P1 parameter.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            batch_size: int = 50,
+            default_ttl: float = 3600,
+            max_ttl: float = 6 * 3600,
+            expiry_margin: float = 300,
+            get_update_infos: Callable[[list[str]], list[UpdateInfo]] | None = None
+    ):
+        self._url = url
+        self._batch_size = batch_size
+        self._default_ttl = default_ttl
+        self._max_ttl = max_ttl
+        self._expiry_margin = expiry_margin
+        self._get_update_infos = get_update_infos
+        self._lock = threading.Lock()
+        # GUID -> (URL, time it's cached until)
+        self._cache: dict[str, tuple[str, float]] = {}
+
+    def resolve(self, updates: Iterable[UpdateInfo | str]) -> dict[str, str]:
+        """Returns the download URL of every update the service knows, by GUID. Updates may be given as bare GUIDs."""
+        update_infos = {}
+        for update in updates:
+            update_info = UpdateInfo(update, '') if isinstance(update, str) else update
+            update_infos.setdefault(update_info.update_id, update_info)
+        now = time.time()
+
+        urls = {}
+        with self._lock:
+            for guid in update_infos:
+                cached = self._cache.get(guid)
+                if cached and cached[1] > now:
+                    urls[guid] = cached[0]
+        missing_update_infos = [update_info for guid, update_info in update_infos.items() if guid not in urls]
+        guids = [update_info.update_id for update_info in missing_update_infos if not update_info.file_digests]
+        if self._get_update_infos is not None and guids:
+            stored_update_infos = {update_info.update_id: update_info for update_info in self._get_update_infos(guids)}
+            missing_update_infos = [
+                stored_update_infos.get(update_info.update_id, update_info) for update_info in missing_update_infos
+            ]
+
+        batched_update_infos = [update_info for update_info in missing_update_infos if update_info.file_digests]
+        for i in range(0, len(batched_update_infos), self._batch_size):
+            urls |= self._resolve_batch(batched_update_infos[i:i + self._batch_size])
+        for update_info in missing_update_infos:
+            if not update_info.file_digests:
+                urls |= self._resolve_one(update_info)
+        return urls
+
+    def clear_expired(self):
+        now = time.time()
+        with self._lock:
+            self._cache = {guid: cached for guid, cached in self._cache.items() if cached[1] > now}
+
+    def _resolve_batch(self, update_infos: list[UpdateInfo]) -> dict[str, str]:
+        if len(update_infos) == 1:
+            return self._resolve_one(update_infos[0])
+
+        guids_by_digest = {
+            file_digest: update_info.update_id
+            for update_info in update_infos for file_digest in update_info.file_digests
+        }
+        urls = {}
+        for file_location in self._request_package_file_locations(update_infos):
+            guid = guids_by_digest.get(file_location.digest)
+            if guid is not None:
+                urls.setdefault(guid, file_location.url)
+        self._cache_urls(urls)
+
+        unmatched_update_infos = [update_info for update_info in update_infos if update_info.update_id not in urls]
+        if unmatched_update_infos:
+            logging.info(
+                f'No package URL with a known digest has been returned for {len(unmatched_update_infos)} of '
+                f'{len(update_infos)} updates. Resolving them one by one.'
+            )
+        for update_info in unmatched_update_infos:
+            urls |= self._resolve_one(update_info)
+        return urls
+
+    def _resolve_one(self, update_info: UpdateInfo) -> dict[str, str]:
+        package_urls = [
+            file_location.url for file_location in self._request_package_file_locations([update_info])
+            if (not update_info.file_digests) or file_location.digest in update_info.file_digests
+        ]
+        if len(package_urls) != 1:
+            logging.error(
+                f'{len(package_urls)} package URLs have been returned for the update {update_info.update_id}.'
+            )
+            return {}
+        urls = {update_info.update_id: package_urls[0]}
+        self._cache_urls(urls)
+        return urls
+
+    def _request_package_file_locations(self, update_infos: list[UpdateInfo]) -> list[FileLocation]:
+        response_envelope = soap.post_envelope(
+            self._url,
+            envelope_factories.render_get_extended_update_info2_envelope(
+                self._url,
+                [update_info.update_id for update_info in update_infos],
+                [update_info.revision_number for update_info in update_infos]
+            )
+        )
+        return [
+            file_location
+            for file_location in parsers.parse_get_extended_update_info2_response_envelope(response_envelope)
+            if file_location.url.startswith(PACKAGE_URL_PREFIX)
+        ]
+
+    def _cache_urls(self, urls: dict[str, str]):
+        now = time.time()
+        with self._lock:
+            for guid, url in urls.items():
+                self._cache[guid] = (url, now + self._get_ttl(url, now))
+
+    def _get_ttl(self, url: str, now: float) -> float:
+        # P1 is the Unix time the signed URL stops working at
+        expiry = parse_qs(urlsplit(url).query).get('P1', [''])[0]
+        if not expiry.isdigit():
+            return self._default_ttl
+        return max(min(int(expiry) - self._expiry_margin - now, self._max_ttl), 0)
@@ -0,0 +1,105 @@
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Callable
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BedrockDatabaseBot'))
+
+
+PREFIXES = {
+    'release': 'Microsoft.MinecraftUWP_',
+    'beta': 'Microsoft.MinecraftUWP_',
+    'preview': 'Microsoft.MinecraftWindowsBeta_'
+}
+ARCHITECTURES = ['x64', 'x86', 'arm']
+
+
+def make_update_strings(number_of_lines: int, type_: str, seed: int = 0) -> list[str]:
+    """Builds a synthetic history shaped like releases.json/previews.json."""
+    rng = random.Random(f'{seed}-{type_}')
+    update_strings = []
+    while len(update_strings) < number_of_lines:
+        version_name = f'1.{len(update_strings) // 300}.{rng.randrange(100)}.{rng.randrange(30)}'
+        for architecture in ARCHITECTURES:
+            guid = uuid.UUID(int=rng.getrandbits(128), version=4)
+            update_strings.append(f'{guid} {PREFIXES[type_]}{version_name}_{architecture}__8wekyb3d8bbwe')
+    return update_strings[:number_of_lines]
+
+
+def time_call(func: Callable, repeat: int = 3) -> float:
+    """Returns the best wall-clock time of `repeat` calls in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_sync_updates_response(number_of_updates: int, minecraft_share: float = 0.05, seed: int = 0) -> bytes:
+    """Builds a SyncUpdates response envelope shaped like the ones returned by the delivery service."""
+    rng = random.Random(seed)
+    update_infos = []
+    for i in range(number_of_updates):
+        if rng.random() < minecraft_share:
+            package_moniker = f'Microsoft.MinecraftUWP_1.{i % 30}.{i}.0_{rng.choice(ARCHITECTURES)}__8wekyb3d8bbwe'
+        else:
+            package_moniker = f'Microsoft.SomeOtherApp{i}_2.{i}.0.0_neutral__8wekyb3d8bbwe'
+        guid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        update_infos.append(_make_update_info(i, guid, package_moniker, rng))
+    return _make_sync_updates_response(update_infos)
+
+
+def make_sync_updates_response_for(update_strings: list[str], number_of_other_updates: int = 2_000,
+                                   seed: int = 0) -> bytes:
+    """Like make_sync_updates_response(), but the Minecraft items are the given update strings."""
+    rng = random.Random(seed)
+    update_infos = [
+        _make_update_info(i, *update_string.split(' ', 1), rng) for i, update_string in enumerate(update_strings)
+    ]
+    for i in range(len(update_strings), len(update_strings) + number_of_other_updates):
+        update_infos.append(_make_update_info(
+            i, str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            f'Microsoft.SomeOtherApp{i}_2.{i}.0.0_neutral__8wekyb3d8bbwe', rng
+        ))
+    return _make_sync_updates_response(update_infos)
+
+
+def _make_update_info(i: int, guid: str, package_moniker: str, rng: random.Random) -> str:
+    from xml.sax.saxutils import escape
+
+    xml = (
+        f'<UpdateIdentity UpdateID="{guid}" RevisionNumber="1" />'
+        f'<Properties UpdateType="Software" PackageRank="30000" />'
+        f'<Relationships><Prerequisites><AtLeastOne IsCategory="true"><UpdateIdentity UpdateID="'
+        f'{uuid.UUID(int=rng.getrandbits(128), version=4)}" /></AtLeastOne></Prerequisites></Relationships>'
+        f'<ApplicabilityRules><Metadata><AppxPackageMetadata><AppxMetadata PackageType="1" '
+        f'IsAppxFramework="false" PackageMoniker="{package_moniker}" PackageFamilyName="x_8wekyb3d8bbwe" />'
+        f'</AppxPackageMetadata></Metadata></ApplicabilityRules>'
+        # the stub SOAP server returns the GUID as the digest of the package file location
+        f'<Files><File FileName="{package_moniker}.appx" Digest="{guid}" DigestAlgorithm="SHA1" /></Files>'
+    )
+    return (
+        f'<UpdateInfo><ID>{100000000 + i}</ID><Deployment><ID>{200000 + i}</ID><Action>Install</Action>'
+        f'<IsAssigned>true</IsAssigned><LastChangeTime>2023-01-01</LastChangeTime></Deployment>'
+        f'<IsLeaf>true</IsLeaf><Xml>{escape(xml)}</Xml></UpdateInfo>'
+    )
+
+
+def _make_sync_updates_response(update_infos: list[str]) -> bytes:
+    return (
+        '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" xmlns:a="http://www.w3.org/2005/08/addressing">'
+        '<s:Body><SyncUpdatesResponse xmlns="http://www.microsoft.com/SoftwareDistribution/Server/ClientWebService">'
+        f'<SyncUpdatesResult><NewUpdates>{"".join(update_infos)}</NewUpdates><Truncated>false</Truncated>'
+        '<NewCookie><Expiration>2030-01-01T00:00:00Z</Expiration><EncryptedData>c2VjcmV0</EncryptedData></NewCookie>'
+        '<DriverSyncNotNeeded>false</DriverSyncNotNeeded></SyncUpdatesResult></SyncUpdatesResponse></s:Body>'
+        '</s:Envelope>'
+    ).encode()
+
+
+def iter_chunks(data: bytes, chunk_size: int = 64 * 1024):
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset:offset + chunk_size]
@@ -0,0 +1,76 @@
+"""Measures the time from starting `cli.py poll` to its first SOAP request, against a stub SOAP server.
+
+    python bench_cold_start.py [--repeat 5]
+
+The same is measured with PyGithub, natsort and asyncio imported up front, like main.py used to, and for a bare
+interpreter that exits right away. The stub returns no Minecraft updates, so the cycle ends without GitHub requests.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import make_sync_updates_response_for
+from stub_soap import StubSOAPServer
+
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'BedrockDatabaseBot')
+LAZY_MODULES = ('github', 'natsort', 'asyncio')
+
+CODE = '''
+import json, sys
+sys.path.insert(0, {bot_path!r})
+{imports}
+import requester
+requester.SECURED_URL = {url!r}
+import cli
+status = cli.main(['--state-dir', {state_path!r}, '--no-archive', 'poll'])
+print(json.dumps({{'status': status, 'loaded': [name for name in {lazy_modules!r} if name in sys.modules]}}))
+'''
+
+
+def run_once(code: str, stub: StubSOAPServer) -> tuple[float, float, dict | None]:
+    """Returns the seconds until the first SOAP request and until the process exited, and what it printed."""
+    stub.first_request_time = None
+    start = time.time()
+    completed_process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    exit_seconds = time.time() - start
+    first_request_seconds = stub.first_request_time - start if stub.first_request_time else float('nan')
+    output = json.loads(completed_process.stdout) if completed_process.stdout else None
+    return first_request_seconds, exit_seconds, output
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--repeat', type=int, default=5)
+    args = argument_parser.parse_args()
+
+    stub = StubSOAPServer(make_sync_updates_response_for([], number_of_other_updates=100)).start()
+    try:
+        for name, imports in ('lazy', ''), ('eager', 'import ' + ', '.join(LAZY_MODULES)), ('interpreter', None):
+            first_request_times, exit_times, output = [], [], None
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as state_path:
+                    code = 'pass' if imports is None else CODE.format(
+                        bot_path=BOT_PATH, imports=imports, url=stub.url, state_path=state_path,
+                        lazy_modules=LAZY_MODULES
+                    )
+                    first_request_seconds, exit_seconds, output = run_once(code, stub)
+                first_request_times.append(first_request_seconds)
+                exit_times.append(exit_seconds)
+            print(json.dumps({
+                'start': name,
+                'first_soap_request_seconds': round(statistics.median(first_request_times), 6),
+                'exit_seconds': round(statistics.median(exit_times), 6),
+                **(output or {})
+            }))
+    finally:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
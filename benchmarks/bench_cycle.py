@@ -0,0 +1,243 @@
+"""Times every stage of a cycle and whole cycles against a stub SOAP server and a fake GitHub.
+
+    python bench_cycle.py [--sizes 1000 10000] [--fixtures DIR] [--output results.json]
+                          [--baseline old_results.json] [--tolerance 1.25]
+
+--fixtures points to a directory with recorded get_config.xml, get_cookie.xml and sync_updates.xml responses, which
+replace the synthetic ones. With --baseline, the exit status is 1 if any stage got slower than `tolerance` times its
+baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import make_update_strings, make_sync_updates_response_for, iter_chunks, time_call
+from fake_github import FakeGitHub
+from stub_soap import StubSOAPServer
+
+from env import RELEASES_PATH, BETAS_PATH, PREVIEWS_PATH, VERSIONS_PATH
+from net import envelope_factories, parsers, soap
+from net.structs import Cookie
+from database import Database
+from readcache import ReadCache
+from githubbudget import GitHubBudget, BudgetPolicy
+from cookiemanager import CookieManager
+from syncstate import SyncStateStore
+from sqlitedatabase import SQLiteDatabase
+import remoterepomanager
+import requester
+import dbparser
+
+
+SIZES = [1_000, 10_000, 50_000]
+# the service keeps returning the latest builds, not the whole history
+RETURNED_BUILDS = 30
+# the fake has no secondary rate limits, so writes aren't spaced out
+UNLIMITED_POLICY = BudgetPolicy(write_interval=0)
+
+
+class History:
+    def __init__(self, size: int):
+        self.release_strings = make_update_strings(size // 2, 'release')
+        self.beta_strings = make_update_strings(size // 10, 'beta')
+        self.preview_strings = make_update_strings(size - size // 2 - size // 10, 'preview')
+        # one new build, three architectures
+        self.new_release_strings = make_update_strings(size // 2 + 3, 'release', seed=1)[-3:]
+
+        self.versions = dbparser.run(self.release_strings, self.beta_strings, self.preview_strings)
+
+    def get_files(self) -> dict[str, str]:
+        return {
+            RELEASES_PATH: json.dumps(self.release_strings, indent=4),
+            BETAS_PATH: json.dumps(self.beta_strings, indent=4),
+            PREVIEWS_PATH: json.dumps(self.preview_strings, indent=4),
+            VERSIONS_PATH: json.dumps(self.versions, indent=4)
+        }
+
+    def get_sync_updates_response(self) -> bytes:
+        return make_sync_updates_response_for(
+            self.release_strings[-RETURNED_BUILDS:] + self.new_release_strings + self.preview_strings[-RETURNED_BUILDS:]
+        )
+
+
+def load_fixtures(path: str) -> dict[str, bytes]:
+    fixtures = {}
+    for name in 'get_config', 'get_cookie', 'sync_updates':
+        with open(os.path.join(path, name + '.xml'), 'rb') as f:
+            fixtures[name] = f.read()
+    return fixtures
+
+
+def bench_stages(history: History, stub: StubSOAPServer, state_path: str) -> dict[str, float]:
+    channel = requester.CHANNELS['release']
+    cookie = Cookie('Y29va2ll', '2099-01-01T00:00:00Z')
+    cached_update_ids = list(range(100000000, 100000000 + RETURNED_BUILDS))
+
+    envelope = envelope_factories.render_sync_updates_envelope(
+        stub.url, cookie, [channel.category_id], cached_update_ids
+    )
+    response = b''.join(soap.post_envelope_streamed(stub.url, envelope))
+    new_release_strings = [
+        str(update_info) for update_info in
+        parsers.SyncUpdatesResponseParser(iter_chunks(response), channel.package_moniker_prefix)
+    ]
+
+    files = history.get_files()
+    fake_github = FakeGitHub(files).start()
+    try:
+        repo_manager = remoterepomanager.RemoteRepositoryManager(
+            fake_github.base_url, ReadCache(os.path.join(state_path, 'stages_read_cache.json')),
+            GitHubBudget(UNLIMITED_POLICY)
+        )
+        new_files = dict(files, **{RELEASES_PATH: json.dumps(history.release_strings + new_release_strings, indent=4)})
+        # a commit can't be repeated, so the GitHub writes are timed once
+        github_writes = time_call(lambda: repo_manager.update_files(new_files, 'Benchmark'), repeat=1)
+    finally:
+        fake_github.stop()
+
+    return {
+        'envelope_build': time_call(lambda: envelope_factories.render_sync_updates_envelope(
+            stub.url, cookie, [channel.category_id], cached_update_ids
+        )),
+        'soap_round_trip': time_call(lambda: b''.join(soap.post_envelope_streamed(stub.url, envelope))),
+        'parse': time_call(lambda: list(
+            parsers.SyncUpdatesResponseParser(iter_chunks(response), channel.package_moniker_prefix)
+        )),
+        'database_update': time_call(lambda: Database(
+            list(history.release_strings), list(history.beta_strings), list(history.preview_strings)
+        ).update(new_release_strings, [])),
+        'dbparser_run': time_call(lambda: dbparser.run(
+            history.release_strings + new_release_strings, history.beta_strings, history.preview_strings
+        )),
+        'json_serialization': time_call(history.get_files),
+        'github_writes': github_writes
+    }
+
+
+def bench_cycles(history: History, stub: StubSOAPServer, state_path: str) -> dict[str, float | int]:
+    """Runs main.run_one_cycle() three times.
+
+    A cold cycle stores the new build, a steady one finds nothing new and an unchanged one gets the same response again.
+    """
+    import main
+
+    fake_github = FakeGitHub(history.get_files()).start()
+    try:
+        main.repo_manager = remoterepomanager.RemoteRepositoryManager(
+            fake_github.base_url, ReadCache(os.path.join(state_path, 'read_cache.json')), GitHubBudget(UNLIMITED_POLICY)
+        )
+        main.local_db = SQLiteDatabase(os.path.join(state_path, 'bedrockdb.sqlite3'))
+        requester.SECURED_URL = stub.url
+        requester.cookie_manager = CookieManager(stub.url, os.path.join(state_path, 'last_cookie.json'))
+        requester.sync_state_store = SyncStateStore(os.path.join(state_path, 'sync_state.json'))
+
+        results = {}
+        for name, expected_did_update in ('cold_cycle', True), ('steady_cycle', False), ('unchanged_cycle', False):
+            soap_calls, github_calls = sum(stub.calls.values()), len(fake_github.calls)
+            start = time.perf_counter()
+            did_update = main.run_one_cycle()
+            results[name] = time.perf_counter() - start
+            assert did_update == expected_did_update, name
+            results[name + '_soap_requests'] = sum(stub.calls.values()) - soap_calls
+            results[name + '_github_requests'] = len(fake_github.calls) - github_calls
+        main.local_db.close()
+        return results
+    finally:
+        fake_github.stop()
+
+
+def get_metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+
+
+def find_regressions(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    baseline_by_size = {result['size']: result for result in baseline}
+    regressions = []
+    for result in results:
+        baseline_result = baseline_by_size.get(result['size'])
+        if baseline_result is None:
+            continue
+        for stage, seconds in result['seconds'].items():
+            baseline_seconds = baseline_result['seconds'].get(stage)
+            if baseline_seconds and seconds > baseline_seconds * tolerance:
+                regressions.append(f'{stage} at size {result["size"]}: {baseline_seconds:.6f} s -> {seconds:.6f} s')
+    return regressions
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    argument_parser.add_argument('--fixtures')
+    argument_parser.add_argument('--output')
+    argument_parser.add_argument('--baseline')
+    argument_parser.add_argument('--tolerance', type=float, default=1.25)
+    args = argument_parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else {}
+
+    with tempfile.TemporaryDirectory() as state_path:
+        # the modules create their default state files in the working directory, and the fake GitHub takes any token
+        os.chdir(state_path)
+        with open('token.txt', 'w') as f:
+            f.write('token')
+
+        results = []
+        for size in args.sizes:
+            history = History(size)
+            stub = StubSOAPServer(
+                fixtures.get('sync_updates') or history.get_sync_updates_response(),
+                fixtures.get('get_cookie'), fixtures.get('get_config')
+            ).start()
+            try:
+                size_path = os.path.join(state_path, str(size))
+                os.mkdir(size_path)
+                stages = bench_stages(history, stub, size_path)
+                cycles = bench_cycles(history, stub, size_path)
+            finally:
+                stub.stop()
+
+            result = {
+                'size': size,
+                'seconds': {
+                    name: round(seconds, 6) for name, seconds in (stages | cycles).items() if '_requests' not in name
+                },
+                'requests': {name: count for name, count in cycles.items() if '_requests' in name}
+            }
+            print(json.dumps(result))
+            results.append(result)
+
+        soap.get_default_transport().close()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': get_metadata(), 'results': results}, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f)['results'], args.tolerance)
+        for regression in regressions:
+            print('Regression: ' + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
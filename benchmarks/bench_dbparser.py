@@ -0,0 +1,37 @@
+import json
+import sys
+
+from _common import make_update_strings, time_call
+
+import dbparser
+
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    for size in sizes:
+        release_strings = make_update_strings(size // 2, 'release')
+        beta_strings = make_update_strings(size // 10, 'beta')
+        preview_strings = make_update_strings(size - size // 2 - size // 10, 'preview')
+
+        seconds = time_call(lambda: dbparser.run(release_strings, beta_strings, preview_strings))
+        versions = dbparser.run(release_strings, beta_strings, preview_strings)
+
+        # one new build, three architectures
+        new_release_strings = make_update_strings(size // 2 + 3, 'release', seed=1)[-3:]
+        update_seconds = time_call(
+            lambda: dbparser.update(versions, new_release_strings, []), repeat=1
+        )
+
+        print(json.dumps({
+            'lines': size,
+            'versions': len(versions),
+            'seconds': round(seconds, 6),
+            'update_seconds': round(update_seconds, 6)
+        }))
+
+
+if __name__ == '__main__':
+    main()
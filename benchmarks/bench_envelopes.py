@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+from xml.etree.ElementTree import tostring
+
+from _common import time_call
+
+from net import envelope_factories
+from net.structs import Cookie
+
+
+URL = 'https://fe3cr.delivery.mp.microsoft.com/ClientWebService/client.asmx/secured'
+COOKIE = Cookie('c2VjcmV0 & <more>' * 40, '2030-01-01T00:00:00Z')
+CATEGORY_IDS = ['d25480ca-36aa-46e6-b76b-39608d49558c', '188f32fc-5eaa-45a8-9f78-7dde4322d131']
+
+ENVELOPES = {
+    'GetConfig': (
+        lambda: tostring(envelope_factories.make_get_config_envelope(URL)),
+        lambda: envelope_factories.render_get_config_envelope(URL)
+    ),
+    'GetCookie': (
+        lambda: tostring(envelope_factories.make_get_cookie_envelope(URL, '2015-10-21T17:01:07.1472913Z')),
+        lambda: envelope_factories.render_get_cookie_envelope(URL, '2015-10-21T17:01:07.1472913Z')
+    ),
+    'SyncUpdates': (
+        lambda: tostring(envelope_factories.make_sync_updates_envelope(URL, COOKIE, CATEGORY_IDS)),
+        lambda: envelope_factories.render_sync_updates_envelope(URL, COOKIE, CATEGORY_IDS)
+    )
+}
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2023, 1, 1, 12, 0, 0)
+
+
+def check_output():
+    real_datetime = envelope_factories.datetime
+    envelope_factories.datetime = _FrozenDatetime
+    try:
+        for name, (make, render) in ENVELOPES.items():
+            assert make() == render(), f'{name} envelopes differ'
+        assert envelope_factories.render_sync_updates_envelope(URL, COOKIE, []) == \
+               tostring(envelope_factories.make_sync_updates_envelope(URL, COOKIE, []))
+        assert envelope_factories.render_sync_updates_envelope(URL, Cookie('é中', 'x'), ['é']) == \
+               tostring(envelope_factories.make_sync_updates_envelope(URL, Cookie('é中', 'x'), ['é']))
+        assert envelope_factories.render_sync_updates_envelope(URL, COOKIE, CATEGORY_IDS, [5, 123456789]) == \
+               tostring(envelope_factories.make_sync_updates_envelope(URL, COOKIE, CATEGORY_IDS, [5, 123456789]))
+    finally:
+        envelope_factories.datetime = real_datetime
+
+
+def main():
+    check_output()
+    for name, (make, render) in ENVELOPES.items():
+        number = 1000
+        print(json.dumps({
+            'envelope': name,
+            'element_tree_us': round(time_call(lambda: [make() for _ in range(number)]) / number * 1e6, 2),
+            'template_us': round(time_call(lambda: [render() for _ in range(number)]) / number * 1e6, 2)
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compares the memory taken by Database and CompactDatabase holding the same history, and by the versions list built
+from each of them.
+
+    python bench_memory.py [NUMBER_OF_RECORDS]
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from typing import Callable
+
+from _common import make_update_strings, time_call
+
+from compactdatabase import CompactDatabase
+from database import Database
+import dbparser
+
+
+def make_files(size: int) -> tuple[str, str, str]:
+    return (
+        json.dumps(make_update_strings(size // 2, 'release')),
+        json.dumps(make_update_strings(size // 10, 'beta')),
+        json.dumps(make_update_strings(size - size // 2 - size // 10, 'preview'))
+    )
+
+
+def measure(load: Callable, run: Callable) -> dict:
+    """Returns the memory retained by what load() returns and the peak while run() builds the versions list."""
+    gc.collect()
+    tracemalloc.start()
+    db = load()
+    gc.collect()
+    retained_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    run(db)
+    peak_bytes = tracemalloc.get_traced_memory()[1] - retained_bytes
+    tracemalloc.stop()
+    return {'retained_bytes': retained_bytes, 'run_peak_bytes': peak_bytes, 'db': db}
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('number_of_records', type=int, nargs='?', default=100_000)
+    args = argument_parser.parse_args()
+
+    files = make_files(args.number_of_records)
+
+    implementations = {
+        'database': (
+            lambda: Database(*(json.loads(text) for text in files)),
+            lambda db: dbparser.run(db.release_strings, db.beta_strings, db.preview_strings)
+        ),
+        'compact_database': (
+            lambda: CompactDatabase(*(json.loads(text) for text in files)),
+            lambda db: dbparser.run_records(db.release_records, db.beta_records, db.preview_records)
+        )
+    }
+
+    versions = {}
+    for name, (load, run) in implementations.items():
+        result = measure(load, run)
+        db = result.pop('db')
+        versions[name] = run(db)
+        print(json.dumps({
+            'db': name,
+            'records': args.number_of_records,
+            **result,
+            'load_seconds': round(time_call(load, repeat=1), 6),
+            'run_seconds': round(time_call(lambda: run(db)), 6),
+            'serialization_seconds': round(time_call(lambda: json.dumps(db.release_strings, indent=4)), 6)
+        }))
+        del db
+
+    assert versions['database'] == versions['compact_database']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compares answering common questions by scanning versions.json with the indexes of the query API.
+
+    python bench_query_api.py [--sizes 10000 100000]
+"""
+import argparse
+import json
+import random
+
+from _common import make_update_strings, time_call
+
+from queryapi import VersionIndex
+import dbparser
+
+
+def scan(versions_text: str, predicate) -> list[dict]:
+    """What a client of the GitHub repository does today."""
+    return [version_dict for version_dict in json.loads(versions_text) if predicate(version_dict)]
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = argument_parser.parse_args()
+
+    for size in args.sizes:
+        version_dict_list = dbparser.run(
+            make_update_strings(size // 2, 'release'), [], make_update_strings(size - size // 2, 'preview')
+        )
+        versions_text = json.dumps(version_dict_list)
+        rng = random.Random(0)
+        version_dict = rng.choice(version_dict_list)
+        guid = version_dict['guids']['x64'][0]
+
+        index = VersionIndex(version_dict_list)
+        uncached_index = VersionIndex(version_dict_list, max_cached_responses=0)
+        queries = {
+            'latest_preview': (
+                '/latest/preview',
+                lambda: scan(versions_text, lambda v: v['type'] == 'preview')[-1]
+            ),
+            'guids_on_arm': (
+                f'/versions?name={version_dict["name"]}&architecture=arm',
+                lambda: scan(versions_text, lambda v: v['name'] == version_dict['name'])
+            ),
+            'version_of_guid': (
+                f'/guids/{guid}',
+                lambda: scan(versions_text, lambda v: guid in v['guids']['x64'])
+            )
+        }
+
+        result = {
+            'size': size,
+            'versions': len(version_dict_list),
+            'index_build_seconds': round(time_call(lambda: VersionIndex(version_dict_list)), 6)
+        }
+        for name, (query, scan_query) in queries.items():
+            result[name] = {
+                'scan_seconds': round(time_call(scan_query), 6),
+                'uncached_seconds': round(time_call(lambda: uncached_index.get_response(query)), 6),
+                'cached_seconds': round(time_call(lambda: index.get_response(query)), 9)
+            }
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Times replaying an archive of SyncUpdates responses with an increasing number of worker processes.
+
+    python bench_replay.py [NUMBER_OF_RESPONSES] [--workers 1 2 4 8]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from _common import make_update_strings, make_sync_updates_response_for
+
+from responsearchive import ResponseArchive
+import replay
+import requester
+
+
+# every cycle that found something new archived a response with a few builds and the rest of the catalog
+UPDATE_STRINGS_PER_RESPONSE = 9
+OTHER_UPDATES_PER_RESPONSE = 300
+
+
+def make_archive(path: str, number_of_responses: int) -> ResponseArchive:
+    archive = ResponseArchive(path)
+    update_strings = {
+        channel_name: make_update_strings(number_of_responses * UPDATE_STRINGS_PER_RESPONSE, channel_name)
+        for channel_name in requester.CHANNELS
+    }
+    for i in range(number_of_responses):
+        channel_name = list(requester.CHANNELS)[i % len(requester.CHANNELS)]
+        archive.add(channel_name, make_sync_updates_response_for(
+            update_strings[channel_name][i * UPDATE_STRINGS_PER_RESPONSE:(i + 1) * UPDATE_STRINGS_PER_RESPONSE],
+            OTHER_UPDATES_PER_RESPONSE, seed=i
+        ))
+    return archive
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('number_of_responses', type=int, nargs='?', default=2_000)
+    argument_parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count() or 1}))
+    args = argument_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as archive_path:
+        archive = make_archive(archive_path, args.number_of_responses)
+
+        results = {}
+        for workers in args.workers:
+            start = time.perf_counter()
+            db = replay.replay(archive, requester.CHANNELS, max_workers=workers)
+            seconds = time.perf_counter() - start
+            results[workers] = db.release_strings, db.preview_strings
+            print(json.dumps({
+                'responses': args.number_of_responses,
+                'workers': workers,
+                'update_strings': len(db.release_strings) + len(db.preview_strings),
+                'seconds': round(seconds, 6)
+            }))
+
+    # the merge follows the archive order whatever the number of workers
+    assert len({json.dumps(result) for result in results.values()}) == 1
+
+
+if __name__ == '__main__':
+    main()
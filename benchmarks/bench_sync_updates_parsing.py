@@ -0,0 +1,62 @@
+import json
+import sys
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from _common import make_sync_updates_response, iter_chunks, time_call
+
+from net import parsers
+
+
+SIZES = [1_000, 10_000]
+
+
+def parse_dom(response: bytes) -> list:
+    sync_updates = parsers.parse_sync_updates_response_envelope(ET.fromstring(response))
+    return [
+        update_info for update_info in sync_updates.new_updates
+        if update_info.package_moniker.startswith('Microsoft.Minecraft')
+    ]
+
+
+def parse_streamed(response: bytes) -> list:
+    return list(parsers.SyncUpdatesResponseParser(iter_chunks(response), 'Microsoft.Minecraft'))
+
+
+def parse_buffered(response: bytes) -> list:
+    """What requester and replay do, since the digest of the whole response is needed before parsing it."""
+    return list(parsers.SyncUpdatesResponseParser([response], 'Microsoft.Minecraft'))
+
+
+def measure_peak_memory(func) -> int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    """Pass paths of recorded SyncUpdates responses to benchmark them instead of synthetic ones."""
+    if sys.argv[1:]:
+        responses = {}
+        for path in sys.argv[1:]:
+            with open(path, 'rb') as f:
+                responses[path] = f.read()
+    else:
+        responses = {f'synthetic-{size}': make_sync_updates_response(size) for size in SIZES}
+
+    for name, response in responses.items():
+        assert parse_dom(response) == parse_streamed(response) == parse_buffered(response)
+        for parser_name, parse in ('dom', parse_dom), ('streamed', parse_streamed), ('buffered', parse_buffered):
+            print(json.dumps({
+                'response': name,
+                'bytes': len(response),
+                'parser': parser_name,
+                'seconds': round(time_call(lambda: parse(response)), 6),
+                'peak_memory_bytes': measure_peak_memory(lambda: parse(response))
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compares resolving download URLs in batches, matched by file digest, with one request per bare GUID.
+
+Bare GUIDs are batched too when their digests have been stored in the local DB at sync time.
+
+    python bench_url_resolver.py [NUMBER_OF_GUIDS] [--fixture RECORDED_GET_EXTENDED_UPDATE_INFO2_RESPONSE]
+"""
+import argparse
+import json
+
+from _common import make_update_strings, time_call
+from stub_soap import StubSOAPServer
+
+from net.structs import UpdateInfo
+from net import soap
+from sqlitedatabase import SQLiteDatabase
+from urlresolver import URLResolver
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('number_of_guids', type=int, nargs='?', default=300)
+    argument_parser.add_argument('--fixture')
+    args = argument_parser.parse_args()
+
+    fixture = None
+    if args.fixture:
+        with open(args.fixture, 'rb') as f:
+            fixture = f.read()
+
+    # the stub SOAP server returns the GUID as the digest of the package file location
+    update_infos = [
+        UpdateInfo(*update_string.split(), file_digests=(update_string.split()[0],))
+        for update_string in make_update_strings(args.number_of_guids, 'release')
+    ]
+    guids = [update_info.update_id for update_info in update_infos]
+    db = SQLiteDatabase(':memory:')
+    db.update([str(update_info) for update_info in update_infos], [])
+    db.set_update_metadata(update_infos)
+    db.commit()
+    stub = StubSOAPServer(b'', get_extended_update_info2_response=fixture).start()
+    try:
+        for name, updates, get_update_infos in (
+                ('batched', update_infos, None),
+                ('one_per_guid', guids, None),
+                ('guids_with_stored_digests', guids, db.get_update_infos)
+        ):
+            requests_before = stub.calls['GetExtendedUpdateInfo2']
+            resolver = URLResolver(stub.url, get_update_infos=get_update_infos)
+            seconds = time_call(lambda: resolver.resolve(updates), repeat=1)
+            urls = resolver.resolve(updates)
+            print(json.dumps({
+                'resolver': name,
+                'guids': len(guids),
+                'resolved': len(urls),
+                'requests': stub.calls['GetExtendedUpdateInfo2'] - requests_before,
+                'seconds': round(seconds, 6),
+                'cached_seconds': round(time_call(lambda: resolver.resolve(updates)), 6)
+            }))
+    finally:
+        stub.stop()
+        db.close()
+        soap.get_default_transport().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+import base64
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+OWNER = 'bot'
+REPO = 'BedrockDB'
+BRANCH = 'main'
+
+
+def get_blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b'blob ' + str(len(data)).encode() + b'\0' + data).hexdigest()
+
+
+class FakeGitHub:
+    """A small in-memory subset of the GitHub REST API, enough for RemoteRepositoryManager.
+
+    Every request is recorded in `calls` as a (method, path) tuple. The next `secondary_rate_limited_requests`
+    requests are answered with a secondary rate limit error asking to retry after `retry_after` seconds.
+    """
+
+    def __init__(self, files: dict[str, str]):
+        self.calls: list[tuple[str, str]] = []
+        self.blobs: dict[str, bytes] = {}
+        self.trees: dict[str, dict[str, str]] = {}
+        self.commits: dict[str, dict] = {}
+        self.rate_limit_remaining = 5000
+        self.secondary_rate_limited_requests = 0
+        self.retry_after = 60
+
+        tree_sha = self._store_tree({path: self._store_blob(text.encode()) for path, text in files.items()})
+        self.head = self._store_commit('Initial commit', tree_sha, [])
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self) -> 'FakeGitHub':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_text(self, path: str, commit_sha: str | None = None) -> str:
+        tree = self.trees[self.commits[commit_sha or self.head]['tree']]
+        return self.blobs[tree[path]].decode()
+
+    def _store_blob(self, data: bytes) -> str:
+        sha = get_blob_sha(data)
+        self.blobs[sha] = data
+        return sha
+
+    def _store_tree(self, entries: dict[str, str]) -> str:
+        sha = hashlib.sha1(json.dumps(sorted(entries.items())).encode()).hexdigest()
+        self.trees[sha] = entries
+        return sha
+
+    def _store_commit(self, message: str, tree_sha: str, parents: list[str]) -> str:
+        sha = hashlib.sha1(json.dumps([message, tree_sha, parents, len(self.commits)]).encode()).hexdigest()
+        self.commits[sha] = {'message': message, 'tree': tree_sha, 'parents': parents}
+        return sha
+
+    # JSON representations
+
+    def _repo_url(self) -> str:
+        return f'{self.base_url}/repos/{OWNER}/{REPO}'
+
+    def _repo_json(self) -> dict:
+        return {
+            'id': 1, 'name': REPO, 'full_name': f'{OWNER}/{REPO}', 'default_branch': BRANCH, 'url': self._repo_url(),
+            'owner': {'login': OWNER, 'url': f'{self.base_url}/users/{OWNER}'}
+        }
+
+    def _ref_json(self) -> dict:
+        return {
+            'ref': f'refs/heads/{BRANCH}', 'url': f'{self._repo_url()}/git/refs/heads/{BRANCH}',
+            'object': {'sha': self.head, 'type': 'commit', 'url': f'{self._repo_url()}/git/commits/{self.head}'}
+        }
+
+    def _commit_json(self, sha: str) -> dict:
+        commit = self.commits[sha]
+        return {
+            'sha': sha, 'url': f'{self._repo_url()}/git/commits/{sha}', 'message': commit['message'],
+            'tree': {'sha': commit['tree'], 'url': f'{self._repo_url()}/git/trees/{commit["tree"]}'},
+            'parents': [
+                {'sha': parent, 'url': f'{self._repo_url()}/git/commits/{parent}'} for parent in commit['parents']
+            ]
+        }
+
+    def _tree_json(self, sha: str) -> dict:
+        return {
+            'sha': sha, 'url': f'{self._repo_url()}/git/trees/{sha}', 'truncated': False,
+            'tree': [
+                {'path': path, 'mode': '100644', 'type': 'blob', 'sha': blob_sha, 'size': len(self.blobs[blob_sha])}
+                for path, blob_sha in self.trees[sha].items()
+            ]
+        }
+
+    def _contents_json(self, path: str, commit_sha: str) -> dict | None:
+        blob_sha = self.trees[self.commits[commit_sha]['tree']].get(path)
+        if blob_sha is None:
+            return None
+        return {
+            'type': 'file', 'encoding': 'base64', 'path': path, 'name': path.rsplit('/', 1)[-1], 'sha': blob_sha,
+            'size': len(self.blobs[blob_sha]), 'content': base64.b64encode(self.blobs[blob_sha]).decode(),
+            'url': f'{self._repo_url()}/contents/{path}'
+        }
+
+    # request handling
+
+    def _handle(self, method: str, path: str, query: str, body: dict, headers) -> tuple[int, dict | None, dict]:
+        self.calls.append((method, path))
+        if self.secondary_rate_limited_requests > 0:
+            self.secondary_rate_limited_requests -= 1
+            return 403, {'message': 'You have exceeded a secondary rate limit.'}, {'Retry-After': str(self.retry_after)}
+        self.rate_limit_remaining -= 1
+        repo_prefix = f'/repos/{OWNER}/{REPO}'
+
+        if (method, path) == ('GET', '/user'):
+            return 200, {'login': OWNER, 'url': f'{self.base_url}/users/{OWNER}'}, {}
+        if (method, path) == ('GET', repo_prefix):
+            return 200, self._repo_json(), {}
+        if not path.startswith(repo_prefix):
+            return 404, {'message': 'Not Found'}, {}
+        path = path.removeprefix(repo_prefix)
+
+        if match := re.fullmatch(r'/contents/(.+)', path):
+            ref = dict(part.split('=', 1) for part in query.split('&') if '=' in part).get('ref', self.head)
+            if method == 'GET':
+                contents = self._contents_json(match[1], self.commits.get(ref) and ref or self.head)
+                if contents is None:
+                    return 404, {'message': 'Not Found'}, {}
+                etag = f'"{contents["sha"]}"'
+                if headers.get('If-None-Match') == etag:
+                    # like GitHub, 304 responses don't count against the rate limit
+                    self.rate_limit_remaining += 1
+                    return 304, None, {'ETag': etag}
+                return 200, contents, {'ETag': etag}
+            if method == 'PUT':
+                tree = dict(self.trees[self.commits[self.head]['tree']])
+                tree[match[1]] = self._store_blob(base64.b64decode(body['content']))
+                self.head = self._store_commit(body['message'], self._store_tree(tree), [self.head])
+                return 200, {
+                    'content': self._contents_json(match[1], self.head), 'commit': self._commit_json(self.head)
+                }, {}
+        if match := re.fullmatch(r'/git/refs/heads/(.+)', path):
+            if method == 'PATCH':
+                if not body.get('force') and self.head not in self._ancestors(body['sha']):
+                    return 422, {'message': 'Update is not a fast forward'}, {}
+                self.head = body['sha']
+            return 200, self._ref_json(), {}
+        if match := re.fullmatch(r'/git/commits/([0-9a-f]+)', path):
+            return 200, self._commit_json(match[1]), {}
+        if match := re.fullmatch(r'/git/trees/([0-9a-f]+)', path):
+            return 200, self._tree_json(match[1]), {}
+        if match := re.fullmatch(r'/git/blobs/([0-9a-f]+)', path):
+            data = self.blobs[match[1]]
+            return 200, {'sha': match[1], 'encoding': 'base64', 'content': base64.b64encode(data).decode()}, {}
+        if (method, path) == ('POST', '/git/blobs'):
+            data = base64.b64decode(body['content']) if body.get('encoding') == 'base64' else body['content'].encode()
+            sha = self._store_blob(data)
+            return 201, {'sha': sha, 'url': f'{self._repo_url()}/git/blobs/{sha}'}, {}
+        if (method, path) == ('POST', '/git/trees'):
+            tree = dict(self.trees[body['base_tree']]) if body.get('base_tree') else {}
+            for element in body['tree']:
+                if 'sha' in element:
+                    tree[element['path']] = element['sha']
+                else:
+                    tree[element['path']] = self._store_blob(element['content'].encode())
+            return 201, self._tree_json(self._store_tree(tree)), {}
+        if (method, path) == ('POST', '/git/commits'):
+            return 201, self._commit_json(self._store_commit(body['message'], body['tree'], body['parents'])), {}
+
+        return 404, {'message': 'Not Found'}, {}
+
+    def _ancestors(self, sha: str) -> set[str]:
+        ancestors, stack = set(), [sha]
+        while stack:
+            ancestors.add(current := stack.pop())
+            stack.extend(self.commits[current]['parents'])
+        return ancestors
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                status, payload, headers = fake._handle(self.command, url.path, url.query, body, self.headers)
+                data = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('X-RateLimit-Limit', '5000')
+                self.send_header('X-RateLimit-Remaining', str(fake.rate_limit_remaining))
+                self.send_header('X-RateLimit-Reset', '0')
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,124 @@
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+WUCLIENT = 'http://www.microsoft.com/SoftwareDistribution/Server/ClientWebService'
+
+
+def _envelope(body: str) -> bytes:
+    return (
+        '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body>' + body + '</s:Body></s:Envelope>'
+    ).encode()
+
+
+class StubSOAPServer:
+    """Serves canned GetConfig/GetCookie/SyncUpdates responses, e.g. recorded ones, on a local port.
+
+    `calls` counts the requests per method and `first_request_time` is the time.time() the first one arrived at.
+    Setting `expired_cookies` makes SyncUpdates fail with a SOAP fault for those cookies, like the real service does
+    for expired ones. UpdateInfo items whose ID is sent in OtherCachedUpdateIDs are left out of the response. Without a
+    recorded GetExtendedUpdateInfo2 response, one with a block map and a package URL per requested update ID is made up.
+    """
+
+    def __init__(self, sync_updates_response: bytes, get_cookie_response: bytes | None = None,
+                 get_config_response: bytes | None = None, get_extended_update_info2_response: bytes | None = None):
+        self.sync_updates_response = sync_updates_response
+        self.get_cookie_response = get_cookie_response or _envelope(
+            f'<GetCookieResponse xmlns="{WUCLIENT}"><GetCookieResult><Expiration>2099-01-01T00:00:00Z</Expiration>'
+            '<EncryptedData>Y29va2ll</EncryptedData></GetCookieResult></GetCookieResponse>'
+        )
+        self.get_config_response = get_config_response or _envelope(
+            f'<GetConfigResponse xmlns="{WUCLIENT}"><GetConfigResult><LastChange>2015-10-21T17:01:07.1472913Z'
+            '</LastChange></GetConfigResult></GetConfigResponse>'
+        )
+        self.get_extended_update_info2_response = get_extended_update_info2_response
+        self.expired_cookies: set[str] = set()
+        self.calls: dict[str, int] = {'GetConfig': 0, 'GetCookie': 0, 'SyncUpdates': 0, 'GetExtendedUpdateInfo2': 0}
+        self.connections: set[tuple] = set()
+        self.first_request_time: float | None = None
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/ClientWebService/client.asmx/secured'
+
+    def start(self) -> 'StubSOAPServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _respond(self, request: bytes) -> tuple[int, bytes]:
+        if self.first_request_time is None:
+            self.first_request_time = time.time()
+        for method in self.calls:
+            if f'<{method} '.encode() in request or f'<{method}>'.encode() in request:
+                break
+        else:
+            return 400, _envelope('<s:Fault><s:Reason><s:Text>Unknown method</s:Text></s:Reason></s:Fault>')
+        self.calls[method] += 1
+
+        if method == 'GetConfig':
+            return 200, self.get_config_response
+        if method == 'GetCookie':
+            return 200, self.get_cookie_response
+        if method == 'GetExtendedUpdateInfo2':
+            if self.get_extended_update_info2_response is not None:
+                return 200, self.get_extended_update_info2_response
+            return 200, self._make_get_extended_update_info2_response(request)
+        if any(f'<EncryptedData>{cookie}</EncryptedData>'.encode() in request for cookie in self.expired_cookies):
+            return 500, _envelope(
+                '<s:Fault><s:Reason><s:Text>Cookie has expired</s:Text></s:Reason></s:Fault>'
+            )
+        cached_update_ids = re.search(rb'<OtherCachedUpdateIDs>(.*?)</OtherCachedUpdateIDs>', request)
+        if not cached_update_ids:
+            return 200, self.sync_updates_response
+        cached_update_ids = set(re.findall(rb'<int>(\d+)</int>', cached_update_ids[1]))
+        return 200, re.sub(
+            rb'<UpdateInfo><ID>(\d+)</ID>.*?</UpdateInfo>',
+            lambda match: b'' if match[1] in cached_update_ids else match[0],
+            self.sync_updates_response
+        )
+
+    @staticmethod
+    def _make_get_extended_update_info2_response(request: bytes) -> bytes:
+        expiry = int(time.time()) + 3600
+        file_locations = ''.join(
+            f'<FileLocation><FileDigest>{update_id}=</FileDigest>'
+            f'<Url>http://dl.delivery.mp.microsoft.com/filestreamingservice/files/{update_id}.blockmap</Url>'
+            '</FileLocation>'
+            f'<FileLocation><FileDigest>{update_id}</FileDigest>'
+            f'<Url>http://tlu.dl.delivery.mp.microsoft.com/filestreamingservice/files/{update_id}?P1={expiry}'
+            f'&amp;P2=404&amp;P3=2&amp;P4=c2lnbmF0dXJl</Url></FileLocation>'
+            for update_id in re.findall(r'<UpdateID>([^<]+)</UpdateID>', request.decode())
+        )
+        return _envelope(
+            f'<GetExtendedUpdateInfo2Response xmlns="{WUCLIENT}"><GetExtendedUpdateInfo2Result><FileLocations>'
+            f'{file_locations}</FileLocations></GetExtendedUpdateInfo2Result></GetExtendedUpdateInfo2Response>'
+        )
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                stub.connections.add(self.client_address)
+                status, data = stub._respond(self.rfile.read(int(self.headers['Content-Length'])))
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
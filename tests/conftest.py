@@ -0,0 +1,8 @@
+import os
+import sys
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_PATH, 'BedrockDatabaseBot'))
+# the local stand-ins for the SOAP service and the GitHub API
+sys.path.insert(0, os.path.join(ROOT_PATH, 'benchmarks'))
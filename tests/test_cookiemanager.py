@@ -0,0 +1,98 @@
+"""CookieManager refreshes against the stub SOAP service."""
+from datetime import datetime, timedelta, timezone
+import threading
+
+import pytest
+
+from stub_soap import StubSOAPServer
+from test_soap import ScriptedServer, FAULT_BODY, OK_BODY, WUCLIENT
+
+from cookiemanager import CookieManager
+from net.structs import Cookie
+from net import soap
+
+
+NEW_COOKIE = Cookie('Y29va2ll', '2099-01-01T00:00:00Z')
+GET_COOKIE_BODY = (
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body>'
+    f'<GetCookieResponse xmlns="{WUCLIENT}"><GetCookieResult><Expiration>2099-01-01T00:00:00Z</Expiration>'
+    '<EncryptedData>Y29va2ll</EncryptedData></GetCookieResult></GetCookieResponse></s:Body></s:Envelope>'
+).encode()
+
+
+def get_expiration(time_left: timedelta) -> str:
+    return (datetime.now(timezone.utc) + time_left).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+@pytest.fixture
+def stub():
+    stub = StubSOAPServer(b'').start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def cookie_path(tmp_path) -> str:
+    return str(tmp_path / 'last_cookie.json')
+
+
+def test_gets_a_cookie_once_and_reuses_it_after_a_restart(stub, cookie_path):
+    assert CookieManager(stub.url, cookie_path).get_cookie() == NEW_COOKIE
+    assert stub.calls['GetConfig'] == 1
+    assert stub.calls['GetCookie'] == 1
+
+    assert CookieManager(stub.url, cookie_path).get_cookie() == NEW_COOKIE
+    assert stub.calls['GetCookie'] == 1
+
+
+def test_refreshes_an_expired_cookie_right_away(stub, cookie_path):
+    cookie_manager = CookieManager(stub.url, cookie_path)
+    cookie_manager.set_cookie(Cookie('ZXhwaXJlZA==', get_expiration(-timedelta(minutes=1))))
+
+    assert cookie_manager.get_cookie() == NEW_COOKIE
+    assert stub.calls['GetCookie'] == 1
+
+
+def test_refreshes_a_cookie_about_to_expire_in_the_background(stub, cookie_path):
+    cookie_manager = CookieManager(stub.url, cookie_path, refresh_margin=timedelta(minutes=10))
+    expiring_cookie = Cookie('ZXhwaXJpbmc=', get_expiration(timedelta(minutes=5)))
+    cookie_manager.set_cookie(expiring_cookie)
+
+    # the current cookie is still used while the new one is requested
+    assert cookie_manager.get_cookie() == expiring_cookie
+    cookie_manager._refresh_thread.join(5)
+    assert cookie_manager.get_cookie() == NEW_COOKIE
+    assert stub.calls['GetCookie'] == 1
+
+
+def test_concurrent_refreshes_of_the_same_cookie_make_one_request(stub, cookie_path):
+    cookie_manager = CookieManager(stub.url, cookie_path)
+    stale_cookie = Cookie('c3RhbGU=', get_expiration(timedelta(minutes=5)))
+    cookie_manager.set_cookie(stale_cookie)
+
+    threads = [threading.Thread(target=cookie_manager.refresh, args=(stale_cookie,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert stub.calls['GetCookie'] == 1
+    assert cookie_manager.get_cookie() == NEW_COOKIE
+
+
+def test_gets_a_new_config_when_get_cookie_fails(cookie_path):
+    # GetConfig, a failing GetCookie, GetConfig again and GetCookie
+    server = ScriptedServer([(200, OK_BODY), (500, FAULT_BODY), (200, OK_BODY), (200, GET_COOKIE_BODY)])
+    try:
+        assert CookieManager(server.url, cookie_path).refresh(None) == NEW_COOKIE
+        assert len(server.requests) == 4
+    finally:
+        server.stop()
+
+
+def test_raises_when_the_refresh_fails_again(cookie_path):
+    server = ScriptedServer([(200, OK_BODY), (500, FAULT_BODY)])
+    try:
+        with pytest.raises(soap.SOAPError):
+            CookieManager(server.url, cookie_path).get_cookie()
+    finally:
+        server.stop()
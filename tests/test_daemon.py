@@ -0,0 +1,50 @@
+"""daemon.run() stopping on signals, with and without the signal handlers of the event loop."""
+import asyncio
+import signal
+
+import pytest
+
+import daemon
+
+
+POLICY = daemon.PollingPolicy(min_interval=0.01, base_interval=0.01, max_interval=0.01, release_window_interval=0.01)
+
+
+@pytest.fixture
+def loop():
+    default_handlers = {
+        signal_number: signal.getsignal(signal_number) for signal_number in (signal.SIGINT, signal.SIGTERM)
+    }
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+    for signal_number, handler in default_handlers.items():
+        signal.signal(signal_number, handler)
+
+
+def run_until_signal(loop: asyncio.AbstractEventLoop, signal_number: int, number_of_cycles: int) -> int:
+    """Runs the daemon with cycles that raise the signal in the given cycle, and returns how many cycles ran."""
+    cycles = []
+
+    def run_one_cycle() -> bool:
+        cycles.append(None)
+        if len(cycles) == number_of_cycles:
+            signal.raise_signal(signal_number)
+        return False
+
+    loop.run_until_complete(asyncio.wait_for(daemon.run(run_one_cycle, POLICY), 5))
+    return len(cycles)
+
+
+@pytest.mark.parametrize('signal_number', [signal.SIGINT, signal.SIGTERM])
+def test_stops_after_the_running_cycle(loop, signal_number):
+    assert run_until_signal(loop, signal_number, 3) == 3
+
+
+def test_falls_back_to_plain_signal_handlers(loop, monkeypatch):
+    def add_signal_handler(*args):
+        raise NotImplementedError
+
+    # like the event loops on Windows
+    monkeypatch.setattr(loop, 'add_signal_handler', add_signal_handler)
+    assert run_until_signal(loop, signal.SIGINT, 2) == 2
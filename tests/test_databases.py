@@ -0,0 +1,53 @@
+"""The versions exported by SQLiteDatabase and CompactDatabase against dbparser.run() on their update strings."""
+import pytest
+
+from test_dbparser import make_history
+
+from compactdatabase import CompactDatabase
+from sqlitedatabase import SQLiteDatabase
+import dbparser
+
+
+@pytest.fixture(params=['sqlite', 'compact'])
+def db(request, tmp_path):
+    db = SQLiteDatabase(str(tmp_path / 'bedrockdb.sqlite3')) if request.param == 'sqlite' else CompactDatabase()
+    yield db
+    db.close()
+
+
+def assert_exports_match_run(db):
+    version_dict_list = dbparser.run(db.release_strings, db.beta_strings, db.preview_strings)
+    assert db.export_versions() == version_dict_list
+    assert db.count_versioned_guids() == dbparser.count_guids(version_dict_list)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_exports_the_same_versions_as_run(db, seed):
+    release_strings, beta_strings, preview_strings = make_history(seed)
+    db.load(release_strings[:-40], beta_strings, preview_strings[:-40])
+    assert_exports_match_run(db)
+
+    update_result = db.update(release_strings[-40:], preview_strings[-40:])
+    assert update_result.added_release_strings == release_strings[-40:]
+    assert_exports_match_run(db)
+    assert db.release_strings == release_strings
+    assert db.preview_strings == preview_strings
+
+
+def test_rollback_undoes_the_update(db):
+    release_strings, beta_strings, preview_strings = make_history(0)
+    db.load(release_strings[:-40], beta_strings, preview_strings)
+    version_dict_list = db.export_versions()
+
+    assert db.update(release_strings[-40:], []).did_update
+    db.rollback()
+    assert db.export_versions() == version_dict_list
+    assert db.release_strings == release_strings[:-40]
+
+
+def test_merging_known_strings_adds_nothing(db):
+    release_strings, beta_strings, preview_strings = make_history(0)
+    db.load(release_strings, beta_strings, preview_strings)
+
+    assert not db.update(release_strings[-40:], preview_strings[-40:]).did_update
+    assert_exports_match_run(db)
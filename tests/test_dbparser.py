@@ -0,0 +1,59 @@
+"""dbparser.update() against full rebuilds with dbparser.run()."""
+import copy
+import random
+
+import pytest
+
+from _common import make_update_strings
+
+import dbparser
+
+
+def make_history(seed: int) -> tuple[list[str], list[str], list[str]]:
+    """Update strings shaped like the JSON files, with the kinds of lines that are left out of the versions list."""
+    release_strings = make_update_strings(600, 'release', seed=seed)
+    preview_strings = make_update_strings(300, 'preview', seed=seed)
+    release_strings[10:10] = [
+        # a neutral bundle, listed under its version without a GUID
+        '0c1d2e3f-4a5b-4c6d-8e7f-9a0b1c2d3e4f Microsoft.MinecraftUWP_1.0.0.7_neutral__8wekyb3d8bbwe',
+        '1d2e3f4a-5b6c-4d7e-8f9a-0b1c2d3e4f5a Microsoft.MinecraftUWP_1.0.0.70_x64__8wekyb3d8bbwe',
+        '2e3f4a5b-6c7d-4e8f-9a0b-1c2d3e4f5a6b Microsoft.MinecraftUWP_1.0.0.7_x64__8wekyb3d8bbwe.EAppx'
+    ]
+    # a GUID listed under two versions
+    preview_strings.append(
+        preview_strings[0].split()[0] + ' Microsoft.MinecraftWindowsBeta_1.0.0.71_x64__8wekyb3d8bbwe'
+    )
+    beta_strings = make_update_strings(60, 'beta', seed=seed)
+    return release_strings, beta_strings, preview_strings
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_update_gives_the_same_result_as_run(seed):
+    release_strings, beta_strings, preview_strings = make_history(seed)
+    rng = random.Random(seed)
+    release_split = rng.randrange(len(release_strings))
+    preview_split = rng.randrange(len(preview_strings))
+
+    version_dict_list = dbparser.run(release_strings[:release_split], beta_strings, preview_strings[:preview_split])
+    updated_version_dict_list = dbparser.update(
+        version_dict_list, release_strings[release_split:], preview_strings[preview_split:]
+    )
+    assert updated_version_dict_list == dbparser.run(release_strings, beta_strings, preview_strings)
+    assert dbparser.count_guids(updated_version_dict_list) == dbparser.count_guids(
+        dbparser.run(release_strings, beta_strings, preview_strings)
+    )
+
+
+def test_update_leaves_the_given_list_as_it_is():
+    release_strings, beta_strings, preview_strings = make_history(0)
+    version_dict_list = dbparser.run(release_strings[:-30], beta_strings, preview_strings[:-30])
+    original_version_dict_list = copy.deepcopy(version_dict_list)
+
+    dbparser.update(version_dict_list, release_strings[-30:], preview_strings[-30:])
+    assert version_dict_list == original_version_dict_list
+
+
+def test_update_skips_guids_that_are_already_listed():
+    release_strings, beta_strings, preview_strings = make_history(0)
+    version_dict_list = dbparser.run(release_strings, beta_strings, preview_strings)
+    assert dbparser.update(version_dict_list, release_strings[-30:], preview_strings[-30:]) == version_dict_list
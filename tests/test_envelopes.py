@@ -0,0 +1,71 @@
+"""The rendered envelopes must be the same bytes as the serialized element trees they replace."""
+from datetime import datetime
+from xml.etree.ElementTree import tostring, fromstring
+
+import pytest
+
+from net import envelope_factories
+from net.structs import Cookie
+
+
+URL = 'https://fe3cr.delivery.mp.microsoft.com/ClientWebService/client.asmx/secured'
+CATEGORY_IDS = ['d25480ca-36aa-46e6-b76b-39608d49558c', '188f32fc-5eaa-45a8-9f78-7dde4322d131']
+# values that have to be escaped, non-ASCII values and empty values, which serialize as self-closing elements
+TEXTS = ['2015-10-21T17:01:07.1472913Z', 'a & b <c> "d" \'e\'', 'é中🙂', '']
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2023, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(monkeypatch):
+    monkeypatch.setattr(envelope_factories, 'datetime', _FrozenDatetime)
+
+
+@pytest.mark.parametrize('url', [URL, URL + '?a=1&b=<2>', 'https://例え.jp/é', ''])
+def test_get_config(url):
+    assert envelope_factories.render_get_config_envelope(url) == \
+           tostring(envelope_factories.make_get_config_envelope(url))
+
+
+@pytest.mark.parametrize('url', [URL, ''])
+@pytest.mark.parametrize('config_last_change', TEXTS)
+def test_get_cookie(url, config_last_change):
+    assert envelope_factories.render_get_cookie_envelope(url, config_last_change) == \
+           tostring(envelope_factories.make_get_cookie_envelope(url, config_last_change))
+
+
+@pytest.mark.parametrize('encrypted_data', TEXTS)
+@pytest.mark.parametrize('expiration', ['2030-01-01T00:00:00Z', ''])
+@pytest.mark.parametrize('category_ids', [CATEGORY_IDS, ['é&<>'], [], ['']])
+@pytest.mark.parametrize('cached_update_ids', [None, [], [5], [5, 123456789]])
+def test_sync_updates(encrypted_data, expiration, category_ids, cached_update_ids):
+    cookie = Cookie(encrypted_data, expiration)
+    assert envelope_factories.render_sync_updates_envelope(URL, cookie, category_ids, cached_update_ids) == \
+           tostring(envelope_factories.make_sync_updates_envelope(URL, cookie, category_ids, cached_update_ids))
+
+
+@pytest.mark.parametrize('update_ids', [['a'], CATEGORY_IDS, ['é&<>', '中'], [], ['']])
+@pytest.mark.parametrize('with_revision_numbers', [False, True])
+def test_get_extended_update_info2(update_ids, with_revision_numbers):
+    revision_numbers = list(range(1, len(update_ids) + 1)) if with_revision_numbers else None
+    assert envelope_factories.render_get_extended_update_info2_envelope(URL, update_ids, revision_numbers) == \
+           tostring(envelope_factories.make_get_extended_update_info2_envelope(URL, update_ids, revision_numbers))
+
+
+def test_templates_are_reused_unchanged():
+    cookie = Cookie('c2VjcmV0', '2030-01-01T00:00:00Z')
+    first = envelope_factories.render_sync_updates_envelope(URL, cookie, CATEGORY_IDS, [1, 2])
+    envelope_factories.render_sync_updates_envelope('https://other', Cookie('é&', 'x'), ['<y>'], [3])
+    assert envelope_factories.render_sync_updates_envelope(URL, cookie, CATEGORY_IDS, [1, 2]) == first
+
+
+def test_rendered_values_round_trip():
+    cookie = Cookie('a & b <c> é中', '2030-01-01T00:00:00Z')
+    envelope = fromstring(envelope_factories.render_sync_updates_envelope(URL, cookie, CATEGORY_IDS, [7]))
+    assert envelope.findtext('.//{*}EncryptedData') == cookie.encrypted_data
+    assert [element.text for element in envelope.iterfind('.//{*}CategoryIdentifier/{*}Id')] == CATEGORY_IDS
+    assert [element.text for element in envelope.iterfind('.//{*}OtherCachedUpdateIDs/{*}int')] == ['7']
@@ -0,0 +1,105 @@
+"""RemoteRepositoryManager.update_files() against the in-memory GitHub API of the benchmarks."""
+import json
+
+import pytest
+
+from fake_github import FakeGitHub
+
+from githubbudget import BudgetPolicy, GitHubBudget
+from readcache import ReadCache
+import remoterepomanager
+
+
+FILES = {
+    'releases.json': json.dumps(['a', 'b'], indent=4),
+    'previews.json': json.dumps(['c'], indent=4),
+    'latest.json': json.dumps({'release': 'b'}, indent=4)
+}
+
+
+@pytest.fixture
+def fake_github():
+    fake_github = FakeGitHub(FILES).start()
+    yield fake_github
+    fake_github.stop()
+
+
+@pytest.fixture
+def manager(fake_github, tmp_path):
+    token_path = tmp_path / 'token.txt'
+    token_path.write_text('token')
+    return remoterepomanager.RemoteRepositoryManager(
+        fake_github.base_url, ReadCache(str(tmp_path / 'read_cache.json')),
+        # the fake has no secondary rate limits, so writes aren't spaced out
+        GitHubBudget(BudgetPolicy(write_interval=0)), str(token_path)
+    )
+
+
+def get_writes(fake_github: FakeGitHub) -> list[tuple[str, str]]:
+    return [(method, path.split('/BedrockDB/')[1]) for method, path in fake_github.calls if method != 'GET']
+
+
+def test_commits_all_files_at_once(fake_github, manager):
+    new_texts = dict(FILES, **{
+        'releases.json': json.dumps(['a', 'b', 'd'], indent=4),
+        'previews.json': json.dumps(['c', 'e'], indent=4),
+        'latest.json': json.dumps({'release': 'd'}, indent=4)
+    })
+    head = fake_github.head
+
+    assert manager.update_files(new_texts, 'd (Release)', replaceable_paths=['latest.json'])
+    assert get_writes(fake_github) == [('POST', 'git/trees'), ('POST', 'git/commits'), ('PATCH', 'git/refs/heads/main')]
+    assert fake_github.commits[fake_github.head] == {
+        'message': 'd (Release)', 'tree': fake_github.commits[fake_github.head]['tree'], 'parents': [head]
+    }
+    for path, text in new_texts.items():
+        assert fake_github.get_text(path) == text
+
+
+def test_unchanged_files_make_no_requests(fake_github, manager):
+    # the first call learns the blob SHAs from the base tree
+    assert manager.update_files(FILES, 'Nothing')
+    calls = len(fake_github.calls)
+    assert get_writes(fake_github) == []
+
+    assert manager.update_files(FILES, 'Nothing')
+    assert len(fake_github.calls) == calls
+
+
+def test_commits_nothing_if_any_file_is_invalid(fake_github, manager):
+    head = fake_github.head
+    new_texts = dict(FILES, **{
+        'releases.json': json.dumps(['a', 'b', 'd'], indent=4),
+        # shorter than before
+        'previews.json': json.dumps([], indent=4)
+    })
+
+    assert not manager.update_files(new_texts, 'd (Release)')
+    assert get_writes(fake_github) == []
+    assert fake_github.head == head
+    assert fake_github.get_text('releases.json') == FILES['releases.json']
+
+
+def test_replaceable_files_may_shrink_but_must_be_json(fake_github, manager):
+    assert manager.update_files(dict(FILES, **{'latest.json': '{}'}), 'Shrink', replaceable_paths=['latest.json'])
+    assert fake_github.get_text('latest.json') == '{}'
+
+    assert not manager.update_files(dict(FILES, **{'latest.json': '{'}), 'Break', replaceable_paths=['latest.json'])
+    assert fake_github.get_text('latest.json') == '{}'
+
+
+def test_creates_new_files(fake_github, manager):
+    new_texts = dict(FILES, **{'versions/release/1.20.json': json.dumps([{'name': '1.20.1.2'}], indent=4)})
+
+    assert manager.update_files(new_texts, 'Shards')
+    assert get_writes(fake_github) == [('POST', 'git/trees'), ('POST', 'git/commits'), ('PATCH', 'git/refs/heads/main')]
+    assert fake_github.get_text('versions/release/1.20.json') == new_texts['versions/release/1.20.json']
+    assert fake_github.get_text('releases.json') == FILES['releases.json']
+
+
+def test_committed_files_are_read_again(fake_github, manager):
+    assert manager.get_json('releases.json') == ['a', 'b']
+    assert manager.get_json('releases.json') == ['a', 'b']
+    assert manager.update_files(dict(FILES, **{'releases.json': json.dumps(['a', 'b', 'd'], indent=4)}), 'd')
+    # the committed file isn't served from the cache anymore
+    assert manager.get_json('releases.json') == ['a', 'b', 'd']
@@ -0,0 +1,149 @@
+"""net.soap.Transport against a local HTTP server that answers with scripted responses."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import socket
+import threading
+
+import pytest
+
+from net import soap
+from net.structs import Cookie
+import requester
+
+
+WUCLIENT = 'http://www.microsoft.com/SoftwareDistribution/Server/ClientWebService'
+OK_BODY = (
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body>'
+    f'<GetConfigResponse xmlns="{WUCLIENT}"><GetConfigResult><LastChange>2015-10-21T17:01:07.1472913Z</LastChange>'
+    '</GetConfigResult></GetConfigResponse></s:Body></s:Envelope>'
+).encode()
+FAULT_BODY = (
+    '<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body><s:Fault><s:Reason>'
+    '<s:Text>Cookie has expired</s:Text></s:Reason></s:Fault></s:Body></s:Envelope>'
+).encode()
+ENVELOPE = b'<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body /></s:Envelope>'
+
+
+class ScriptedServer:
+    """Answers the n-th request with the n-th of `responses`, and every later one with the last of them."""
+
+    def __init__(self, responses: list[tuple[int, bytes]], gzipped: bool = False):
+        self.responses = responses
+        self.gzipped = gzipped
+        self.requests: list[dict[str, str]] = []
+        self.connections: set[tuple] = set()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/ClientWebService/client.asmx/secured'
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                server.requests.append({name.lower(): value for name, value in self.headers.items()})
+                server.connections.add(self.client_address)
+                status, body = server.responses[min(len(server.requests), len(server.responses)) - 1]
+                self.send_response(status)
+                if server.gzipped:
+                    body = gzip.compress(body)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(responses: list[tuple[int, bytes]], gzipped: bool = False) -> ScriptedServer:
+        servers.append(ScriptedServer(responses, gzipped))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def transport():
+    transport = soap.Transport(connect_timeout=2, read_timeout=2, max_retries=2, backoff_factor=0)
+    yield transport
+    transport.close()
+
+
+def test_retries_transient_errors_then_succeeds(make_server, transport):
+    server = make_server([(503, b''), (502, b''), (200, OK_BODY)])
+    response = transport.post_envelope(server.url, ENVELOPE)
+    assert response.findtext('.//{*}LastChange') == '2015-10-21T17:01:07.1472913Z'
+    assert len(server.requests) == 3
+
+
+def test_does_not_retry_soap_faults(make_server, transport):
+    server = make_server([(500, FAULT_BODY), (200, OK_BODY)])
+    with pytest.raises(soap.SOAPError, match='Cookie has expired.'):
+        transport.post_envelope(server.url, ENVELOPE)
+    assert len(server.requests) == 1
+
+
+def test_gives_up_after_the_retry_limit(make_server, transport):
+    server = make_server([(503, b'')])
+    with pytest.raises(soap.SOAPTransportError, match='HTTP 503') as exc_info:
+        transport.post_envelope(server.url, ENVELOPE)
+    assert not isinstance(exc_info.value, soap.SOAPError)
+    assert len(server.requests) == 3
+
+
+def test_gives_up_when_the_service_cannot_be_reached(transport):
+    with socket.socket() as unused_socket:
+        unused_socket.bind(('127.0.0.1', 0))
+        port = unused_socket.getsockname()[1]
+    with pytest.raises(soap.SOAPTransportError):
+        transport.post_envelope(f'http://127.0.0.1:{port}/', ENVELOPE)
+
+
+def test_decompresses_gzip_responses(make_server, transport):
+    server = make_server([(200, OK_BODY)], gzipped=True)
+    assert transport.post_envelope(server.url, ENVELOPE).findtext('.//{*}LastChange')
+    assert b''.join(transport.post_envelope_streamed(server.url, ENVELOPE)) == OK_BODY
+    assert 'gzip' in server.requests[0]['accept-encoding']
+
+
+def test_reuses_the_connection(make_server, transport):
+    server = make_server([(503, b''), (200, OK_BODY)])
+    for _ in range(3):
+        transport.post_envelope(server.url, ENVELOPE)
+    assert len(server.requests) == 4
+    assert len(server.connections) == 1
+
+
+def test_requester_does_not_refresh_the_cookie_after_transport_errors(make_server, transport, monkeypatch, tmp_path):
+    server = make_server([(503, b'')])
+    monkeypatch.setattr(soap, '_default_transport', transport)
+    monkeypatch.setattr(requester, 'SECURED_URL', server.url)
+    for name in 'cookie_manager', 'sync_state_store', 'response_archive':
+        monkeypatch.setattr(requester, name, getattr(requester, name))
+    requester.configure(str(tmp_path), is_archiving=False)
+    requester.cookie_manager.set_cookie(Cookie('Y29va2ll', '2099-01-01T00:00:00Z'))
+
+    with pytest.raises(soap.SOAPTransportError):
+        requester.run([requester.CHANNELS['release']])
+    # only the SyncUpdates request and its retries, no GetConfig or GetCookie
+    assert len(server.requests) == 3
@@ -0,0 +1,144 @@
+"""URLResolver against a recorded-style GetExtendedUpdateInfo2 response, whose file locations are in no given order."""
+import os
+
+import pytest
+
+from stub_soap import StubSOAPServer
+
+from compactdatabase import CompactDatabase
+from net import envelope_factories
+from net.structs import UpdateInfo
+from sqlitedatabase import SQLiteDatabase
+from urlresolver import URLResolver
+
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'get_extended_update_info2_response.xml')
+PACKAGE_URL = 'http://tlu.dl.delivery.mp.microsoft.com/filestreamingservice/files/'
+# the updates in the order they're requested, which isn't the order of their file locations in the response
+UPDATE_INFOS = [
+    UpdateInfo(
+        'c3a1f6de-4f2b-4c1a-9f0e-7b8d9c0a1b2c', 'Microsoft.MinecraftUWP_1.20.1.2_x64__8wekyb3d8bbwe',
+        revision_number=1, file_digests=('Hd8pVY1tVQ3sAU+6WqdG1lKwyQ8=',)
+    ),
+    UpdateInfo(
+        '2e7d5b90-83a4-4e61-b2c7-5d0f9e8a7c6b', 'Microsoft.MinecraftUWP_1.20.1.2_x86__8wekyb3d8bbwe',
+        revision_number=3, file_digests=('kQx0VxJ7p4d6TgHfK2nC3mWnQ0A=',)
+    ),
+    UpdateInfo(
+        '9b4c8e21-6d3f-4a7b-8c5e-1f2a3b4c5d6e', 'Microsoft.MinecraftUWP_1.20.1.2_arm__8wekyb3d8bbwe',
+        revision_number=2, file_digests=('nUk7fQ0YmD8MeOQdqm8ZAvyNE2s=',)
+    )
+]
+EXPECTED_FILES = {
+    UPDATE_INFOS[0].update_id: '1c2d3e4f-5a6b-4c7d-8e9f-a0b1c2d3e4f5',
+    UPDATE_INFOS[1].update_id: '4e5f6a7b-8c9d-4e0f-a1b2-c3d4e5f6a7b8',
+    UPDATE_INFOS[2].update_id: '7f3a4d5c-9e61-4b02-8c3e-0a1d2e3f4b5c'
+}
+
+
+@pytest.fixture
+def stub():
+    with open(FIXTURE_PATH, 'rb') as f:
+        stub = StubSOAPServer(b'', get_extended_update_info2_response=f.read()).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def requested_revision_numbers(monkeypatch):
+    revision_numbers = []
+    render = envelope_factories.render_get_extended_update_info2_envelope
+
+    def render_and_record(url, update_ids, revision_numbers_=None):
+        revision_numbers.append(dict(zip(update_ids, revision_numbers_)))
+        return render(url, update_ids, revision_numbers_)
+
+    monkeypatch.setattr(envelope_factories, 'render_get_extended_update_info2_envelope', render_and_record)
+    return revision_numbers
+
+
+def assert_resolved(urls: dict[str, str]):
+    assert {guid: url.removeprefix(PACKAGE_URL).split('?')[0] for guid, url in urls.items()} == EXPECTED_FILES
+
+
+def test_matches_shuffled_file_locations_by_digest(stub, requested_revision_numbers):
+    assert_resolved(URLResolver(stub.url).resolve(UPDATE_INFOS))
+    assert stub.calls['GetExtendedUpdateInfo2'] == 1
+    assert requested_revision_numbers == [
+        {update_info.update_id: update_info.revision_number for update_info in UPDATE_INFOS}
+    ]
+
+
+def test_caches_urls(stub):
+    resolver = URLResolver(stub.url)
+    resolver.resolve(UPDATE_INFOS)
+    assert_resolved(resolver.resolve(update_info.update_id for update_info in UPDATE_INFOS))
+    assert stub.calls['GetExtendedUpdateInfo2'] == 1
+
+
+@pytest.mark.parametrize('make_db', [
+    lambda tmp_path: SQLiteDatabase(str(tmp_path / 'bedrockdb.sqlite3')),
+    lambda tmp_path: CompactDatabase()
+], ids=['sqlite', 'compact'])
+def test_batches_bare_guids_with_the_metadata_stored_at_sync_time(make_db, tmp_path, stub, requested_revision_numbers):
+    db = make_db(tmp_path)
+    db.update([str(update_info) for update_info in UPDATE_INFOS], [])
+    db.set_update_metadata(UPDATE_INFOS)
+    db.commit()
+
+    resolver = URLResolver(stub.url, get_update_infos=db.get_update_infos)
+    assert_resolved(resolver.resolve(update_info.update_id for update_info in UPDATE_INFOS))
+    assert stub.calls['GetExtendedUpdateInfo2'] == 1
+    assert requested_revision_numbers == [
+        {update_info.update_id: update_info.revision_number for update_info in UPDATE_INFOS}
+    ]
+    db.close()
+
+
+def test_metadata_outlives_the_sqlite_connection(tmp_path):
+    path = str(tmp_path / 'bedrockdb.sqlite3')
+    db = SQLiteDatabase(path)
+    db.update([str(update_info) for update_info in UPDATE_INFOS], [])
+    db.set_update_metadata(UPDATE_INFOS)
+    db.commit()
+    db.close()
+
+    db = SQLiteDatabase(path)
+    update_infos = db.get_update_infos([update_info.update_id for update_info in UPDATE_INFOS] + ['unknown'])
+    assert update_infos == UPDATE_INFOS
+    assert [(update_info.revision_number, update_info.file_digests) for update_info in update_infos] == [
+        (update_info.revision_number, update_info.file_digests) for update_info in UPDATE_INFOS
+    ]
+    db.close()
+
+
+def test_rolled_back_metadata_is_dropped(tmp_path):
+    for db in SQLiteDatabase(str(tmp_path / 'bedrockdb.sqlite3')), CompactDatabase():
+        db.update([str(UPDATE_INFOS[0])], [])
+        db.commit()
+        db.set_update_metadata(UPDATE_INFOS[:1])
+        db.rollback()
+        assert db.get_update_infos([UPDATE_INFOS[0].update_id])[0].file_digests == ()
+        db.close()
+
+
+def test_adds_the_metadata_columns_to_older_sqlite_files(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / 'bedrockdb.sqlite3')
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            'CREATE TABLE guid (id INTEGER PRIMARY KEY, slot TEXT NOT NULL, value TEXT NOT NULL, '
+            'package_moniker TEXT NOT NULL, version_id INTEGER, architecture_id INTEGER, '
+            'UNIQUE (slot, value, package_moniker))'
+        )
+        connection.execute(
+            "INSERT INTO guid (slot, value, package_moniker) VALUES ('release', ?, ?)",
+            (UPDATE_INFOS[0].update_id, UPDATE_INFOS[0].package_moniker)
+        )
+    connection.close()
+
+    db = SQLiteDatabase(path)
+    db.set_update_metadata(UPDATE_INFOS[:1])
+    assert db.get_update_infos([UPDATE_INFOS[0].update_id])[0].file_digests == UPDATE_INFOS[0].file_digests
+    db.close()